@@ -0,0 +1,29 @@
+import argparse
+import sys
+
+from src.benchmark import DEFAULT_BASELINE_PATH, run_benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite using synthetic media")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed slowdown before a stage counts as a regression (0.25 = 25%%)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per stage; the median is reported")
+    parser.add_argument('--results', help="Also write this run's results to the given JSON file")
+    parser.add_argument('--update-baseline', action='store_true', help="Overwrite the baseline with this run")
+    parser.add_argument('--stage', action='append', dest='stages',
+                        help="Only run stages whose name starts with this prefix (repeatable)")
+    args = parser.parse_args()
+
+    sys.exit(run_benchmarks(
+        baseline_path=args.baseline,
+        threshold=args.threshold,
+        repeat=args.repeat,
+        update_baseline=args.update_baseline,
+        results_path=args.results,
+        stages=args.stages,
+    ))
+
+if __name__ == "__main__":
+    main()
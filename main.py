@@ -1,89 +1,61 @@
-import os
-from src.video_processing import (
-    prepare_video_clips,
-    generate_music_video,
-    add_lyrics_overlay
-)
-from src.social_media import post_to_tiktok
-from src.audio_processing import transcribe_audio
+import argparse
+from src.pipeline import run_pipeline, publish_video
 from src.user_interface import get_user_input
-from src.utils import cleanup_files
-from src.config import YOUTUBE_API_KEY
 from src.config_manager import ConfigManager
+from src.daemon import DaemonClient, SUCCEEDED, serve
+from src.instrumentation import configure_tracer, tracer, traced_run
+from src.scheduler import configure_scheduler
+from src.transport import configure_transport
+from src.workspace import job_workspace
 
 def main():
-    # Load configuration
-    config_manager = ConfigManager()
-    
-    # Get user input based on configuration
-    input_data, audio_file = get_user_input(config_manager)
-    
-    # Add status message
-    print(f"Searching for '{input_data}' clips for audio file at '{audio_file}'...")
-    
-    # Prepare video clips (either from YouTube or manual input)
-    clips = prepare_video_clips(
-        config_manager,
-        prompt=input_data if config_manager.use_youtube_search else None,
-        video_paths=input_data if not config_manager.use_youtube_search else None,
-        api_key=YOUTUBE_API_KEY if config_manager.use_youtube_search else None
-    )
-    
-    print("Clips:", clips)
-    
-    # Generate music video
-    output_config = config_manager.get_output_config()
-    edited_video = generate_music_video(clips, audio_file, config_manager)
+    parser = argparse.ArgumentParser(description="Generate a music video from clips and audio")
+    parser.add_argument('--config', default='config.yaml', help="Path to the YAML configuration")
+    parser.add_argument('--serve', action='store_true', help="Run as a worker daemon that accepts jobs")
+    parser.add_argument('--local', action='store_true', help="Run in-process even if a daemon is available")
+    args = parser.parse_args()
     
-    final_video = edited_video
-    # Only process lyrics if enabled in config
-    if config_manager.enable_lyrics:
-        try:
-            # Get lyrics using Whisper
-            lyrics = transcribe_audio(audio_file)
-            
-            # Add lyrics overlay with configuration
-            final_video = add_lyrics_overlay(
-                edited_video, 
-                lyrics, 
-                config_manager.get_video_processing_config()
-            )
-        except Exception as e:
-            print(f"Warning: Lyrics processing failed: {str(e)}")
-            print("Continuing without lyrics overlay...")
-    
-    # First, ensure output directory exists
-    if not os.path.exists(config_manager.output_directory):
-        os.makedirs(config_manager.output_directory)
+    # Load configuration
+    config_manager = ConfigManager(args.config)
+    configure_scheduler(config_manager)
+    configure_transport(config_manager)
+    
+    if args.serve:
+        # The daemon writes one report per job instead of one for its whole lifetime
+        configure_tracer(config_manager)
+        serve(config_manager)
+        return
+    
+    # Downloads made while gathering input live in the job's workspace, which run_pipeline reuses
+    with traced_run(config_manager), job_workspace(config_manager):
+        # Get user input based on configuration
+        with tracer.span('user_input'):
+            input_data, audio_file = get_user_input(config_manager)
+        
+        client = DaemonClient.from_config(config_manager)
+        if not args.local and client.is_alive():
+            final_video_path = submit_to_daemon(client, config_manager, input_data, audio_file)
+            if final_video_path:
+                publish_video(config_manager, final_video_path, input_data)
+        else:
+            run_pipeline(config_manager, input_data, audio_file)
 
-    # Save final video
-    final_video_path = os.path.join(
-        config_manager.output_directory,
-        output_config.get('music_video_filename', 'generated_music_video.mp4')
-    )
-    try:
-        import shutil
-        if os.path.exists(final_video_path):
-            os.remove(final_video_path)  # Remove existing file if present
-        shutil.copy2(final_video, final_video_path)
-        print(f"Video forcefully copied to: {final_video_path}")
-    except Exception as e:
-        print(f"Error saving video to output directory: {str(e)}")
-        final_video_path = final_video  # Fallback to temp location
-    
-    # Post to TikTok only if configured to do so
-    if config_manager.should_post_to_social:
-        title = f"AI-generated music video for: {input_data if config_manager.use_youtube_search else 'custom clips'}"
-        success = post_to_tiktok(final_video_path, title)
-        if not success:
-            print("Failed to post video to TikTok")
-    else:
-        print(f"Video saved to: {final_video_path}")
+def submit_to_daemon(client: DaemonClient, config_manager: ConfigManager, input_data, audio_file: str):
+    """Run the job on a live daemon and copy every finished rendition to the output directory.
+
+    Returns the primary video's local path.
+    """
+    with tracer.span('daemon_job', category='http'):
+        job = client.submit(config_manager.config, input_data, audio_file)
+        print(f"Submitted job {job['id']} to worker daemon")
+        job = client.wait(job['id'])
+        if job['status'] != SUCCEEDED:
+            print(f"Daemon job {job['id']} {job['status']}: {job.get('error')}")
+            return None
         
-    # Cleanup temporary files
-    cleanup_files(
-        clips + [edited_video] if edited_video != final_video else [edited_video]
-    )
+        # The daemon names each rendition after its output profile, so the names carry over
+        paths = client.fetch_artifacts(job, config_manager.output_directory)
+        return paths[0] if paths else None
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from src.instrumentation import tracer
+from src.scheduler import scheduler
+
+# htdemucs and most analyzers work at 44.1 kHz stereo, so decode to that once
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_CHANNELS = 2
+_BYTES_PER_SAMPLE = 4  # float32
+
+
+class AudioAsset:
+    """A song decoded once to float32 PCM on disk and memory-mapped read-only.
+
+    samples has shape (frames, channels). Slices of it are views into the page cache,
+    so analyzers, separation and chunk export share one decode and parallel workers
+    mapping the same file share its memory.
+    """
+    def __init__(self, source_path: str, pcm_path: str, sample_rate: int, channels: int, frames: int):
+        self.source_path = source_path
+        self.pcm_path = pcm_path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames = frames
+        self._samples: Optional[np.memmap] = None
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+    @property
+    def samples(self) -> np.ndarray:
+        if self._samples is None:
+            self._samples = np.memmap(self.pcm_path, dtype=np.float32, mode='r',
+                                      shape=(self.frames, self.channels))
+        return self._samples
+
+    def _frame(self, seconds: Optional[float], default: int) -> int:
+        if seconds is None:
+            return default
+        return min(max(int(round(seconds * self.sample_rate)), 0), self.frames)
+
+    def view(self, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        """Zero-copy (frames, channels) view of [start, end) seconds"""
+        return self.samples[self._frame(start, 0):self._frame(end, self.frames)]
+
+    def iter_blocks(self, block_seconds: float = 10.0) -> Iterator[Tuple[float, np.ndarray]]:
+        """Yield (start_time, view) blocks so analyzers can stream the song with flat memory"""
+        block = max(1, int(block_seconds * self.sample_rate))
+        for offset in range(0, self.frames, block):
+            yield offset / self.sample_rate, self.samples[offset:offset + block]
+
+    def export(self, output_path: str, start: Optional[float] = None, end: Optional[float] = None,
+               sample_rate: Optional[int] = None, channels: Optional[int] = None,
+               codec: str = 'pcm_s16le', extra_args: Tuple[str, ...] = ()) -> str:
+        """Encode a slice of the buffer with ffmpeg, piping PCM from the memmap instead of re-decoding"""
+        segment = self.view(start, end)
+        with scheduler.acquire(scheduler.estimate_audio(len(segment) / self.sample_rate), 'audio_export') as grant:
+            cmd = [
+                'ffmpeg', '-y', '-v', 'error',
+                '-f', 'f32le', '-ar', str(self.sample_rate), '-ac', str(self.channels), '-i', 'pipe:0',
+                '-ar', str(sample_rate or self.sample_rate), '-ac', str(channels or self.channels),
+                '-c:a', codec, '-threads', str(grant.threads), *extra_args, output_path,
+            ]
+            with tracer.span('ffmpeg.audio_export', category='subprocess') as span:
+                process = tracer.popen(cmd, stdin=subprocess.PIPE)
+                try:
+                    # Row slices of a C-ordered memmap are contiguous, so this hands ffmpeg the mapped pages directly
+                    process.stdin.write(memoryview(segment).cast('B'))
+                except BrokenPipeError:
+                    pass
+                finally:
+                    process.stdin.close()
+                returncode = process.wait()
+                span.set(exit_code=returncode)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+        return output_path
+
+    def close(self):
+        # Drop the mapping; numpy unmaps once no views remain
+        self._samples = None
+
+
+def _source_key(source_path: str) -> Tuple[str, int, int]:
+    stat = os.stat(source_path)
+    return os.path.abspath(source_path), stat.st_size, int(stat.st_mtime_ns)
+
+
+def decode_audio(source_path: str, directory: str, sample_rate: int = DEFAULT_SAMPLE_RATE,
+                 channels: int = DEFAULT_CHANNELS) -> AudioAsset:
+    """Decode source_path to <directory>/<name>.f32 unless an up-to-date decode is already there"""
+    os.makedirs(directory, exist_ok=True)
+    key = _source_key(source_path)
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    path_hash = hashlib.sha1(key[0].encode('utf-8')).hexdigest()[:12]
+    base = os.path.join(directory, f"{name}-{path_hash}-{sample_rate}-{channels}")
+    pcm_path, meta_path = base + '.f32', base + '.json'
+
+    if os.path.exists(meta_path) and os.path.exists(pcm_path):
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('source') == list(key):
+            return AudioAsset(source_path, pcm_path, sample_rate, channels, meta['frames'])
+
+    with scheduler.acquire(scheduler.estimate_audio(), 'audio_decode') as grant:
+        cmd = [
+            'ffmpeg', '-y', '-v', 'error', '-i', source_path, '-vn',
+            '-f', 'f32le', '-acodec', 'pcm_f32le', '-ar', str(sample_rate), '-ac', str(channels),
+            '-threads', str(grant.threads), pcm_path,
+        ]
+        tracer.run(cmd, name='ffmpeg.decode_audio', check=True)
+
+    frames = os.path.getsize(pcm_path) // (_BYTES_PER_SAMPLE * channels)
+    with open(meta_path, 'w') as f:
+        json.dump({'source': list(key), 'sample_rate': sample_rate, 'channels': channels, 'frames': frames}, f)
+    return AudioAsset(source_path, pcm_path, sample_rate, channels, frames)
+
+
+def detect_beats(asset: AudioAsset, hop_seconds: float = 0.01, min_interval: float = 0.25,
+                 sensitivity: float = 1.5) -> np.ndarray:
+    """Onset times (seconds) where short-time energy jumps, streamed through the buffer block by block"""
+    hop = max(1, int(asset.sample_rate * hop_seconds))
+    block = hop * 1000
+    energies = []
+    for offset in range(0, asset.frames, block):
+        samples = asset.samples[offset:offset + block]
+        usable = len(samples) - len(samples) % hop
+        if not usable:
+            continue
+        mono = samples[:usable].mean(axis=1)
+        energies.append(np.sqrt(np.square(mono).reshape(-1, hop).mean(axis=1)))
+    if not energies:
+        return np.zeros(0)
+
+    energy = np.concatenate(energies)
+    flux = np.maximum(np.diff(energy, prepend=energy[:1]), 0)
+    if len(flux) < 3:
+        return np.zeros(0)
+    threshold = flux.mean() + sensitivity * flux.std()
+    middle = flux[1:-1]
+    peaks = np.nonzero((middle > flux[:-2]) & (middle >= flux[2:]) & (middle > threshold))[0] + 1
+
+    beats = []
+    for time in peaks * hop / asset.sample_rate:
+        if not beats or time - beats[-1] >= min_interval:
+            beats.append(time)
+    return np.asarray(beats)
+
+
+_assets: Dict[str, AudioAsset] = {}
+# Number of jobs currently using each asset, so concurrent daemon jobs on one song share it
+_asset_users: Dict[str, int] = {}
+# Decodes in progress; callers loading the same song wait on these instead of decoding it again
+_decoding: Dict[str, Future] = {}
+_assets_lock = threading.Lock()
+
+
+def load_audio_asset(source_path: str, directory: Optional[str] = None) -> AudioAsset:
+    """Decode a song once per process and register it so every stage can find the buffer.
+
+    The decode runs outside the registry lock, so loading one song never blocks other songs.
+    Each call must be paired with release_audio_asset() once the caller is done.
+    """
+    directory = directory or os.path.join(tempfile.gettempdir(), 'mvgen_audio')
+    path = os.path.abspath(source_path)
+    while True:
+        with _assets_lock:
+            asset = _assets.get(path)
+            if asset is not None and asset.frames > 0 and os.path.exists(asset.pcm_path):
+                _asset_users[path] = _asset_users.get(path, 0) + 1
+                return asset
+            pending = _decoding.get(path)
+            if pending is None:
+                pending = _decoding[path] = Future()
+                break
+        # Another caller is decoding this song; re-check the registry once it is done
+        pending.result()
+
+    try:
+        with tracer.span('decode_audio'):
+            asset = decode_audio(source_path, directory)
+        # Map it now: another job sharing the buffer keeps the pages if the decoding job's
+        # workspace (and with it the PCM file) is removed first
+        asset.samples
+    except BaseException as e:
+        with _assets_lock:
+            del _decoding[path]
+        pending.set_exception(e)
+        raise
+    with _assets_lock:
+        _assets[path] = asset
+        _asset_users[path] = _asset_users.get(path, 0) + 1
+        del _decoding[path]
+    pending.set_result(asset)
+    return asset
+
+
+def get_audio_asset(source_path: str) -> Optional[AudioAsset]:
+    """Return the decoded buffer for source_path if one was loaded, else None"""
+    with _assets_lock:
+        return _assets.get(os.path.abspath(source_path))
+
+
+def release_audio_asset(source_path: str, delete: bool = True):
+    """Drop one user of a decoded song; the last user forgets it and optionally removes its PCM file"""
+    path = os.path.abspath(source_path)
+    with _assets_lock:
+        users = _asset_users.get(path, 0) - 1
+        if users > 0:
+            _asset_users[path] = users
+            return
+        _asset_users.pop(path, None)
+        asset = _assets.pop(path, None)
+    if asset is None:
+        return
+    asset.close()
+    if delete:
+        for path in (asset.pcm_path, os.path.splitext(asset.pcm_path)[0] + '.json'):
+            if os.path.exists(path):
+                os.remove(path)
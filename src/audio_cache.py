@@ -0,0 +1,236 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from src.instrumentation import tracer
+from src.scheduler import scheduler
+
+_VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{6,64}$')
+_SOURCE_META = 'source.json'
+# Staging files older than this were left by a killed download or derivation
+_STALE_SECONDS = 3600
+
+
+def youtube_video_id(link: str) -> Optional[str]:
+    """Video ID of a youtube.com/watch, youtu.be, shorts or embed link (or of a bare ID)"""
+    link = link.strip()
+    if _VIDEO_ID.match(link):
+        return link
+    parts = urlsplit(link if '://' in link else f'https://{link}')
+    host = parts.netloc.lower()
+    if host.endswith('youtu.be'):
+        candidate = parts.path.strip('/').split('/')[0]
+    elif 'v' in parse_qs(parts.query):
+        candidate = parse_qs(parts.query)['v'][0]
+    else:
+        segments = [segment for segment in parts.path.split('/') if segment]
+        candidate = segments[1] if len(segments) > 1 and segments[0] in ('shorts', 'embed', 'live', 'v') else ''
+    return candidate if _VIDEO_ID.match(candidate) else None
+
+
+def download_bestaudio(link: str, directory: str) -> str:
+    """Download the original best audio stream into directory as source.<ext>, without transcoding"""
+    import yt_dlp
+
+    os.makedirs(directory, exist_ok=True)
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        'outtmpl': os.path.join(directory, 'source.%(ext)s'),
+        'noplaylist': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl, \
+            scheduler.acquire(scheduler.estimate_download(), 'yt-dlp'), \
+            tracer.span('yt-dlp.download_audio', category='download'):
+        info = ydl.extract_info(link, download=True)
+        return ydl.prepare_filename(info)
+
+
+def _entry_size(path: str) -> int:
+    total = 0
+    for entry in os.scandir(path):
+        try:
+            total += entry.stat().st_size if entry.is_file() else 0
+        except FileNotFoundError:
+            pass
+    return total
+
+
+class AudioCache:
+    """Songs kept between runs, one directory per YouTube video ID.
+
+    Each entry holds the original compressed stream exactly as downloaded plus every format
+    derived from it (the float32 analysis decode, the 16 kHz mono transcription input), so
+    a repeat run of the same song makes no network calls and no transcodes. Whole entries
+    are evicted least-recently-used above max_bytes, except those a job is holding.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._holds: Dict[str, int] = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self.sweep()
+
+    @classmethod
+    def from_config(cls, config_manager) -> Optional['AudioCache']:
+        settings = config_manager.snapshot.audio_cache
+        if not settings.enabled:
+            return None
+        return get_audio_cache(settings.directory, settings.max_size_mb * 1024 * 1024)
+
+    def entry(self, video_id: str) -> str:
+        return os.path.join(self.directory, video_id)
+
+    def owns(self, path: str) -> bool:
+        return os.path.abspath(path).startswith(self.directory + os.sep)
+
+    def entry_for(self, path: str) -> str:
+        """Entry directory of a cached source or derived file"""
+        return os.path.dirname(os.path.abspath(path))
+
+    def _touch(self, entry: str):
+        # The metadata file's mtime is the entry's last use, which eviction orders by
+        try:
+            os.utime(os.path.join(entry, _SOURCE_META))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def hold(self, path: str) -> Iterator[str]:
+        """Keep the entry of a cached file out of eviction while a job uses it"""
+        entry = self.entry_for(path)
+        with self._lock:
+            self._holds[entry] = self._holds.get(entry, 0) + 1
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                self._holds[entry] -= 1
+                if not self._holds[entry]:
+                    del self._holds[entry]
+
+    def source(self, video_id: str) -> Optional[str]:
+        """The cached original stream for video_id, if it was downloaded before"""
+        try:
+            with open(os.path.join(self.entry(video_id), _SOURCE_META)) as f:
+                path = os.path.join(self.entry(video_id), json.load(f)['filename'])
+        except (OSError, ValueError, KeyError):
+            return None
+        return path if os.path.exists(path) else None
+
+    def fetch(self, link: str) -> str:
+        """Path of the song's original stream, downloading it only on the first request"""
+        video_id = youtube_video_id(link)
+        if video_id is None:
+            raise ValueError(f"Cannot find a YouTube video ID in {link}")
+        cached = self.source(video_id)
+        if cached:
+            print(f"Using cached audio for {video_id}: {cached}")
+            self._touch(self.entry(video_id))
+            return cached
+
+        # Download next to the entry and publish it with a rename, so readers never see a partial file
+        staging = os.path.join(self.directory, f'.tmp-{uuid.uuid4().hex}')
+        try:
+            downloaded = download_bestaudio(link, staging)
+            entry = self.entry(video_id)
+            os.makedirs(entry, exist_ok=True)
+            filename = os.path.basename(downloaded)
+            os.replace(downloaded, os.path.join(entry, filename))
+            with open(os.path.join(staging, _SOURCE_META), 'w') as f:
+                json.dump({'video_id': video_id, 'link': link, 'filename': filename, 'downloaded_at': time.time()}, f)
+            os.replace(os.path.join(staging, _SOURCE_META), os.path.join(entry, _SOURCE_META))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        path = self.source(video_id)
+        with self.hold(path):
+            self.evict()
+        return path
+
+    def derived(self, source_path: str, name: str, produce: Callable[[str], None]) -> str:
+        """Cached file `name` next to a cached source, calling produce(output_path) to create it once"""
+        path = os.path.join(self.entry_for(source_path), name)
+        if os.path.exists(path):
+            self._touch(self.entry_for(source_path))
+            return path
+        extension = os.path.splitext(name)[1]
+        temporary = os.path.join(self.entry_for(source_path), f'.tmp-{uuid.uuid4().hex}{extension}')
+        try:
+            with tracer.span('audio_cache.derive', category='cache', output=name):
+                produce(temporary)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        self._touch(self.entry_for(source_path))
+        with self.hold(source_path):
+            self.evict()
+        return path
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        """(last use, size, path) of every entry, least recently used first"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and not entry.name.startswith('.tmp-'):
+                meta = os.path.join(entry.path, _SOURCE_META)
+                try:
+                    last_used = os.path.getmtime(meta if os.path.exists(meta) else entry.path)
+                    entries.append((last_used, _entry_size(entry.path), entry.path))
+                except FileNotFoundError:
+                    continue
+        return sorted(entries)
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._lock, tracer.span('audio_cache.evict', category='cache') as span:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path in self._holds:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                removed += 1
+            span.set(removed=removed, size=total)
+
+    def sweep(self) -> int:
+        """Remove staging files left behind by killed downloads and derivations; returns how many"""
+        cutoff = time.time() - _STALE_SECONDS
+        removed = 0
+        parents = [self.directory] + [entry.path for entry in os.scandir(self.directory)
+                                      if entry.is_dir() and not entry.name.startswith('.tmp-')]
+        for parent in parents:
+            for entry in os.scandir(parent):
+                try:
+                    if not entry.name.startswith('.tmp-') or entry.stat().st_mtime > cutoff:
+                        continue
+                    if entry.is_dir():
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+        if removed:
+            print(f"Removed {removed} stale audio cache staging files")
+        return removed
+
+
+@lru_cache(maxsize=None)
+def get_audio_cache(directory: str, max_bytes: int) -> AudioCache:
+    """One shared cache per directory for the whole process, so holds and eviction see every job"""
+    return AudioCache(directory, max_bytes)
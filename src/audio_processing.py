@@ -1,42 +1,70 @@
+import httpx
 from openai import OpenAI
-import subprocess
-import tempfile
 import os
 import json
-import httpx
+import shutil
+import functools
+import hashlib
+import importlib.metadata
+from src.instrumentation import tracer
+from src.scheduler import scheduler
+from src.audio_asset import get_audio_asset
+from src.workspace import current_workspace
+from src.audio_cache import AudioCache
+from src.transport import HttpxAdapter, transport
+
+# Whisper works on 16 kHz mono 16-bit PCM
+_WHISPER_BYTES_PER_SECOND = 16000 * 2
+# OpenAI rejects uploads above 25 MB
+_WHISPER_MAX_MB = 24
+SEPARATION_MODEL = 'htdemucs'
 
-def compress_audio(input_path: str, max_size_mb: int = 24) -> str:
+def compress_audio(input_path: str, max_size_mb: int = _WHISPER_MAX_MB) -> str:
     """Compress audio file to meet OpenAI's size limit"""
-    # Create temp file with .wav extension
-    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-        temp_path = temp_file.name
+    workspace = current_workspace()
+    asset = get_audio_asset(input_path)
+    size_hint = int(asset.duration * _WHISPER_BYTES_PER_SECOND) if asset is not None else 0
+    temp_path = workspace.path(suffix='.wav', hot=True, size_hint=size_hint)
     
-    # Convert and compress audio using ffmpeg, maintaining volume
-    cmd = f'ffmpeg -y -i "{input_path}" -ar 16000 -ac 1 -c:a pcm_s16le -filter:a "volume=1.0" "{temp_path}"'
-    subprocess.run(cmd, shell=True, check=True)
+    if asset is not None:
+        # Encode straight from the decoded buffer instead of decoding the file again
+        asset.export(temp_path, sample_rate=16000, channels=1)
+    else:
+        # Convert and compress audio using ffmpeg, maintaining volume
+        with scheduler.acquire(scheduler.estimate_audio(), 'compress_audio') as grant:
+            cmd = f'ffmpeg -y -i "{input_path}" -ar 16000 -ac 1 -c:a pcm_s16le -filter:a "volume=1.0" {grant.ffmpeg_args} "{temp_path}"'
+            tracer.run(cmd, name='ffmpeg.compress_audio', shell=True, check=True)
     
     # Check if file size is within limit
     size_mb = os.path.getsize(temp_path) / (1024 * 1024)
     if size_mb > max_size_mb:
         # If still too large, compress further but maintain volume
         bitrate = int((max_size_mb / size_mb) * 16000)
-        final_temp = temp_path + '_compressed.wav'
-        cmd = f'ffmpeg -y -i "{temp_path}" -ar {bitrate} -ac 1 -c:a pcm_s16le -filter:a "volume=1.0" "{final_temp}"'
-        subprocess.run(cmd, shell=True, check=True)
-        os.unlink(temp_path)  # Remove intermediate file
+        final_temp = workspace.path(suffix='_compressed.wav', hot=True)
+        with scheduler.acquire(scheduler.estimate_audio(), 'compress_audio') as grant:
+            cmd = f'ffmpeg -y -i "{temp_path}" -ar {bitrate} -ac 1 -c:a pcm_s16le -filter:a "volume=1.0" {grant.ffmpeg_args} "{final_temp}"'
+            tracer.run(cmd, name='ffmpeg.compress_audio', shell=True, check=True)
+        workspace.release(temp_path)  # Remove intermediate file
         return final_temp
     
     return temp_path
 
 def get_duration(file_path: str) -> float:
     """Get duration of audio file using ffprobe"""
+    asset = get_audio_asset(file_path)
+    if asset is not None:
+        return asset.duration
     cmd = f'ffprobe -v quiet -print_format json -show_format "{file_path}"'
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    result = tracer.run(cmd, name='ffprobe.duration', shell=True, capture_output=True, text=True)
     data = json.loads(result.stdout)
     return float(data['format']['duration'])
 
 def split_audio(file_path: str, chunk_size_mb: int = 24) -> list:
     """Split audio file into chunks using ffmpeg and compress each chunk"""
+    asset = get_audio_asset(file_path)
+    if asset is not None:
+        return _split_audio_asset(asset, chunk_size_mb)
+    
     # Get audio duration
     duration = get_duration(file_path)
     
@@ -46,30 +74,48 @@ def split_audio(file_path: str, chunk_size_mb: int = 24) -> list:
     
     chunks = []
     current_time = 0
+    workspace = current_workspace()
     
     while current_time < duration:
         # First create uncompressed chunk
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            chunk_path = temp_file.name
-            
-            # Extract chunk
-            cmd = f'ffmpeg -y -i "{file_path}" -ss {current_time} -t {chunk_duration} "{chunk_path}"'
-            subprocess.run(cmd, shell=True, check=True)
-            
-            # Compress the chunk
-            compressed_chunk = compress_audio(chunk_path)
-            chunks.append(compressed_chunk)
-            
-            # Clean up uncompressed chunk
-            os.unlink(chunk_path)
-            
-            current_time += chunk_duration
+        chunk_path = workspace.path(suffix='.wav', hot=True, size_hint=chunk_size_mb * 1024 * 1024)
+        
+        # Extract chunk
+        with scheduler.acquire(scheduler.estimate_audio(chunk_duration), 'split_audio') as grant:
+            cmd = f'ffmpeg -y -i "{file_path}" -ss {current_time} -t {chunk_duration} {grant.ffmpeg_args} "{chunk_path}"'
+            tracer.run(cmd, name='ffmpeg.split_audio', shell=True, check=True)
+        
+        # Compress the chunk
+        compressed_chunk = compress_audio(chunk_path)
+        chunks.append(compressed_chunk)
+        
+        # Clean up uncompressed chunk
+        workspace.release(chunk_path)
+        
+        current_time += chunk_duration
+    
+    return chunks
+
+def _split_audio_asset(asset, chunk_size_mb: int) -> list:
+    """Export 16 kHz mono chunks directly from the decoded buffer, one encode per chunk"""
+    chunk_duration = chunk_size_mb * 1024 * 1024 / _WHISPER_BYTES_PER_SECOND
+    chunks = []
+    current_time = 0
+    workspace = current_workspace()
+    
+    while current_time < asset.duration:
+        chunk_path = workspace.path(suffix='.wav', hot=True, size_hint=chunk_size_mb * 1024 * 1024)
+        chunks.append(asset.export(
+            chunk_path, current_time, current_time + chunk_duration, sample_rate=16000, channels=1
+        ))
+        current_time += chunk_duration
     
     return chunks
 
 def transcribe_chunk(client: OpenAI, chunk_path: str) -> str:
     """Transcribe a single audio chunk"""
-    with open(chunk_path, "rb") as file:
+    with open(chunk_path, "rb") as file, \
+            tracer.span('http.openai.transcribe', category='http', model='whisper-1'):
         transcript = client.audio.transcriptions.create(
             model="whisper-1",
             file=file,
@@ -77,83 +123,137 @@ def transcribe_chunk(client: OpenAI, chunk_path: str) -> str:
         )
     return transcript
 
-def transcribe_audio(audio_path: str) -> str:
-    """Transcribe audio file using OpenAI Whisper API"""
+@functools.lru_cache(maxsize=None)
+def get_openai_client() -> OpenAI:
+    """Create the OpenAI client once per process; its requests go through the shared transport.
+
+    The transport applies the retry policy, so the SDK's own retries are turned off.
+    """
+    return OpenAI(
+        http_client=httpx.Client(transport=HttpxAdapter(transport, span_name='http.openai')),
+        max_retries=0
+    )
+
+def transcribe_audio(audio_path: str, config_manager=None) -> str:
+    """Transcribe audio file and return the lyrics as text"""
+    from src.transcription import segments_to_text
+    return segments_to_text(transcribe_segments(audio_path, config_manager))
+
+def transcribe_segments(audio_path: str, config_manager=None) -> list:
+    """Transcribe audio file into timestamped segments using the configured backend"""
+    from src.transcription import get_transcription_backend
     print(f"Starting transcription process for: {audio_path}")
     
-    # Create a basic httpx client without proxy configuration
-    http_client = httpx.Client()
-    
-    # Initialize OpenAI client with the custom http client
-    client = OpenAI(
-        http_client=http_client
-    )
+    backend = get_transcription_backend(config_manager)
+    language = config_manager.transcription_language if config_manager else 'en'
     
+    compressed_audio = None
     try:
-        # First isolate vocals
-        vocals_path = isolate_vocals(audio_path)
-        print(f"Vocals isolated to: {vocals_path}")
-        
-        # Compress the vocals
-        compressed_audio = compress_audio(vocals_path)
-        print(f"Compressed vocals created at: {compressed_audio}")
+        compressed_audio = vocals_for_transcription(audio_path, config_manager)
         
         try:
-            print("Attempting direct transcription of vocals...")
-            with open(compressed_audio, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    file=audio_file,
-                    model="whisper-1",
-                    response_format="text",
-                    language="en",
-                    prompt="This is an English song with lyrics"
-                )
-                print(f"Transcription successful. Length: {len(transcript)} characters")
-                print(f"First 100 characters: {transcript[:100]}")
-                return transcript
+            print(f"Attempting transcription of vocals with the {backend.name} backend...")
+            segments = backend.transcribe(
+                compressed_audio,
+                language=language,
+                prompt="This is an English song with lyrics"
+            )
+            print(f"Transcription successful. Segments: {len(segments)}")
+            if segments:
+                print(f"First segment: {segments[0]['text'][:100]}")
+            return segments
         except Exception as e:
             print(f"Transcription error: {str(e)}")
             raise
     finally:
-        # Clean up temporary files
-        for file_path in [vocals_path, compressed_audio]:
-            if 'file_path' in locals() and os.path.exists(file_path):
-                try:
-                    os.unlink(file_path)
-                except Exception as e:
-                    print(f"Warning: Could not delete temporary file {file_path}: {e}")
-        # Close the http client
-        http_client.close()
+        # Release the intermediate early (cached vocals stay); the job's workspace removes anything left over
+        if compressed_audio:
+            current_workspace().release(compressed_audio)
+
+def vocals_for_transcription(audio_path: str, config_manager=None) -> str:
+    """Isolated vocals as 16 kHz mono WAV, kept with the song when it came from the audio cache"""
+    cache = AudioCache.from_config(config_manager) if config_manager else None
+    if cache is not None and cache.owns(audio_path):
+        return cache.derived(
+            audio_path, _vocals_name(),
+            lambda output_path: shutil.move(_isolate_and_compress(audio_path), output_path)
+        )
+    return _isolate_and_compress(audio_path)
+
+def _vocals_name() -> str:
+    """Cached vocals filename, fingerprinted by the separation model and compression settings"""
+    try:
+        demucs_version = importlib.metadata.version('demucs')
+    except importlib.metadata.PackageNotFoundError:
+        demucs_version = None
+    settings = json.dumps({
+        'model': SEPARATION_MODEL,
+        'demucs': demucs_version,
+        'sample_rate': 16000,
+        'channels': 1,
+        'codec': 'pcm_s16le',
+        'max_size_mb': _WHISPER_MAX_MB,
+    }, sort_keys=True)
+    return f"vocals-{hashlib.sha256(settings.encode('utf-8')).hexdigest()[:16]}.wav"
+
+def _isolate_and_compress(audio_path: str) -> str:
+    # First isolate vocals
+    vocals_path = isolate_vocals(audio_path)
+    print(f"Vocals isolated to: {vocals_path}")
+    try:
+        # Compress the vocals
+        compressed_audio = compress_audio(vocals_path)
+    finally:
+        current_workspace().release(vocals_path)
+    print(f"Compressed vocals created at: {compressed_audio}")
+    return compressed_audio
+
+@functools.lru_cache(maxsize=None)
+def load_separation_model(name: str = SEPARATION_MODEL):
+    """Load the demucs model once per process; later calls reuse the warm model"""
+    import torch
+    from demucs.pretrained import get_model
+    
+    model = get_model(name)
+    model.cuda() if torch.cuda.is_available() else model.cpu()
+    model.eval()
+    return model
 
 def isolate_vocals(input_path: str) -> str:
     """Extract vocals from audio file using demucs"""
     print("Isolating vocals from audio...")
     import torch
     import torchaudio
-    from demucs.pretrained import get_model
     from demucs.apply import apply_model
     import numpy as np
     
-    # Create temp file for vocals
-    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-        vocals_path = temp_file.name
-    
-    # Load model
-    model = get_model('htdemucs')
-    model.cuda() if torch.cuda.is_available() else model.cpu()
+    model = load_separation_model()
     
-    # Load audio
-    wav, sr = torchaudio.load(input_path)
+    # Load audio, reusing the decoded buffer when it is already at the model's rate
+    asset = get_audio_asset(input_path)
+    if asset is not None and asset.sample_rate == model.samplerate:
+        import warnings
+        with warnings.catch_warnings():
+            # The memmap is read-only; torch only warns because it can't prove nobody writes to it
+            warnings.simplefilter('ignore', UserWarning)
+            wav, sr = torch.from_numpy(asset.samples.T), asset.sample_rate
+    else:
+        wav, sr = torchaudio.load(input_path)
     wav = wav.cuda() if torch.cuda.is_available() else wav
     
     # Separate stems
     ref = wav.mean(0)
     wav = (wav - ref.mean()) / ref.std()
-    sources = apply_model(model, wav.unsqueeze(0), progress=True)[0]
+    cost = scheduler.estimate_separation(wav.shape[-1] / sr)
+    with scheduler.acquire(cost, 'demucs') as grant, tracer.span('demucs.separate', category='model'):
+        # Keep demucs within its share instead of grabbing every core
+        torch.set_num_threads(grant.threads)
+        sources = apply_model(model, wav.unsqueeze(0), progress=True)[0]
     sources = sources * ref.std() + ref.mean()
     
-    # Get vocals and save
+    # Get vocals and save; torchaudio writes 32-bit float WAV
     vocals = sources[model.sources.index('vocals')]
+    vocals_path = current_workspace().path(suffix='.wav', hot=True, size_hint=vocals.numel() * 4)
     torchaudio.save(vocals_path, vocals.cpu(), sr)
     
     return vocals_path
\ No newline at end of file
@@ -0,0 +1,345 @@
+import functools
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import yaml
+
+from src.instrumentation import Tracer
+from src.workspace import current_workspace
+
+DEFAULT_BASELINE_PATH = os.path.join('benchmarks', 'baseline.json')
+
+# (name, width, height, seconds) - covers landscape, portrait, square and 4:3 sources
+VIDEO_CASES = [
+    ('landscape_1080p_4s', 1920, 1080, 4),
+    ('portrait_1080p_4s', 1080, 1920, 4),
+    ('square_720_4s', 720, 720, 4),
+    ('sd_4x3_8s', 640, 480, 8),
+]
+
+# (name, seconds) - a sine melody mixed with pink noise so the encoders have real work
+AUDIO_CASES = [
+    ('song_15s', 15),
+    ('song_60s', 60),
+]
+
+
+def generate_video(path: str, width: int, height: int, seconds: float, fps: int = 30) -> str:
+    """Render a synthetic clip with a test pattern and a tone using ffmpeg lavfi"""
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={fps}:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest', path,
+    ]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def generate_audio(path: str, seconds: float) -> str:
+    """Render a synthetic song-like WAV track (tone plus noise) using ffmpeg lavfi"""
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:beep_factor=4:duration={seconds}:sample_rate=44100',
+        '-f', 'lavfi', '-i', f'anoisesrc=color=pink:amplitude=0.1:duration={seconds}:sample_rate=44100',
+        '-filter_complex', '[0:a][1:a]amix=inputs=2,aformat=channel_layouts=stereo',
+        '-c:a', 'pcm_s16le', path,
+    ]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+class _StubTikTokHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the TikTok init/upload/status endpoints"""
+    # Keep-alive, like the real endpoints, so pooled clients reuse their connection
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _drain(self):
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+    def do_POST(self):
+        self._drain()
+        host, port = self.server.server_address[:2]
+        if self.path.startswith('/init'):
+            self._reply({'data': {'publish_id': 'bench', 'upload_url': f'http://{host}:{port}/upload'}})
+        else:
+            self._reply({'data': {'status': 'success'}})
+
+    def do_PUT(self):
+        self._drain()
+        self._reply({})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """Run a stub HTTP server on an ephemeral localhost port in a background thread"""
+    def __init__(self, handler=_StubTikTokHandler):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+
+def _write_config(path: str, output_directory: str) -> str:
+    config = {
+        'video_source': {'method': 'file_paths'},
+        'audio_source': {'method': 'file'},
+        'video_processing': {'enable_lyrics': False},
+        'output': {
+            'music_video_filename': 'benchmark_video.mp4',
+            'output_directory': output_directory,
+            'post_to_social': False,
+        },
+    }
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f)
+    return path
+
+
+class BenchmarkRunner:
+    """Times pipeline stages against synthetic media and collects median results"""
+    def __init__(self, work_directory: str, repeat: int = 3):
+        self.work_directory = work_directory
+        self.repeat = repeat
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def measure(self, name: str, func: Callable[[], Any], requires: Sequence[str] = ('ffmpeg',),
+                setup: Optional[Callable[[], Any]] = None,
+                teardown: Optional[Callable[[], Any]] = None) -> Optional[Dict[str, Any]]:
+        """Run func `repeat` times and record median wall/CPU time and peak RSS.
+
+        The stage is skipped only when a tool in `requires` is not installed; any error while
+        it runs is recorded as a failure. setup and teardown run once, outside the timing.
+        """
+        missing = [tool for tool in requires if shutil.which(tool) is None]
+        if missing:
+            print(f"Benchmark {name} skipped: {', '.join(missing)} not installed")
+            self.results[name] = {'skipped': f"{', '.join(missing)} not installed"}
+            return None
+
+        tracer = Tracer(enabled=True, output_directory=self.work_directory)
+        try:
+            if setup is not None:
+                setup()
+            try:
+                for _ in range(self.repeat):
+                    with tracer.span(name):
+                        func()
+            finally:
+                if teardown is not None:
+                    teardown()
+        except Exception as e:
+            print(f"Benchmark {name} failed: {str(e)}")
+            self.results[name] = {'failed': f"{type(e).__name__}: {e}"}
+            return None
+
+        spans = [record for record in tracer.records if record['name'] == name]
+        result = {
+            'wall_time': statistics.median(span['wall_time'] for span in spans),
+            'cpu_time': statistics.median(span['cpu_time'] for span in spans),
+            'peak_rss': max(span['peak_rss'] for span in spans),
+            'runs': len(spans),
+        }
+        self.results[name] = result
+        print(f"{name}: {result['wall_time']:.3f}s wall, {result['cpu_time']:.3f}s cpu")
+        return result
+
+    def run(self, stages: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Generate media and time every stage (or only those whose name starts with a prefix in `stages`)"""
+        # Offline runs need placeholder credentials so src.config can be imported
+        for name in ('TIKTOK_API_KEY', 'TIKTOK_API_SECRET', 'YOUTUBE_API_KEY', 'OPENAI_API_KEY'):
+            os.environ.setdefault(name, 'benchmark')
+
+        from src.audio_asset import load_audio_asset, release_audio_asset
+        from src.audio_processing import compress_audio, split_audio
+        from src.config_manager import ConfigManager
+        from src.video_processing import add_lyrics_overlay, generate_music_video, normalize_clip
+
+        def wanted(name):
+            return not stages or any(name.startswith(prefix) for prefix in stages)
+
+        media_dir = os.path.join(self.work_directory, 'media')
+        os.makedirs(media_dir, exist_ok=True)
+
+        videos = {}
+        for name, width, height, seconds in VIDEO_CASES:
+            videos[name] = generate_video(os.path.join(media_dir, f'{name}.mp4'), width, height, seconds)
+        songs = {}
+        for name, seconds in AUDIO_CASES:
+            songs[name] = generate_audio(os.path.join(media_dir, f'{name}.wav'), seconds)
+
+        normalized = []
+        for name, path in videos.items():
+            output_path = os.path.join(media_dir, f'normalized_{name}.mp4')
+            if wanted(f'normalize_clip.{name}'):
+                self.measure(f'normalize_clip.{name}', lambda: normalize_clip(path, output_path))
+            if os.path.exists(output_path):
+                normalized.append(output_path)
+
+        decoded_dir = os.path.join(self.work_directory, 'decoded')
+        for name, path in songs.items():
+            # The pipeline decodes the song once before these stages run, so time them on the loaded buffer
+            load = functools.partial(load_audio_asset, path, decoded_dir)
+            release = functools.partial(release_audio_asset, path)
+            if wanted(f'compress_audio.{name}'):
+                self.measure(f'compress_audio.{name}', lambda: _discard(compress_audio(path)),
+                             setup=load, teardown=release)
+            if wanted(f'split_audio.{name}'):
+                # Force several chunks so the split path is actually exercised
+                self.measure(f'split_audio.{name}', lambda: _discard(*split_audio(path, chunk_size_mb=1)),
+                             setup=load, teardown=release)
+
+        config_manager = ConfigManager(_write_config(
+            os.path.join(self.work_directory, 'config.yaml'),
+            os.path.join(self.work_directory, 'output'),
+        ))
+        clips = normalized or list(videos.values())
+        rendered = None
+        if wanted('generate_music_video'):
+            song = songs[AUDIO_CASES[0][0]]
+            if self.measure('generate_music_video', lambda: generate_music_video(clips, song, config_manager)):
+                rendered = os.path.join(config_manager.output_directory, 'benchmark_video.mp4')
+
+        overlay_source = rendered if rendered and os.path.exists(rendered) else clips[0]
+        if wanted('add_lyrics_overlay'):
+            overlay_config = dict(config_manager.get_video_processing_config())
+            overlay_config['final_video_filename'] = os.path.join(self.work_directory, 'overlay.mp4')
+            self.measure('add_lyrics_overlay', lambda: add_lyrics_overlay(
+                overlay_source, 'benchmark lyrics line one\nbenchmark lyrics line two', overlay_config))
+
+        if wanted('upload'):
+            from src.social_media import TikTokAPI
+            with StubServer() as stub:
+                api = TikTokAPI()
+                api.access_token = 'benchmark'
+                api.post_url = f'{stub.url}/init'
+                api.status_url = f'{stub.url}/status'
+                self.measure('upload', lambda: api.post_video(overlay_source, 'benchmark'), requires=())
+
+        return self.results
+
+
+def _discard(*paths):
+    for path in paths:
+        if path:
+            current_workspace().release(path)
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                        threshold: float = 0.25, min_delta: float = 0.05,
+                        stages: Optional[List[str]] = None) -> List[str]:
+    """Return a message for every stage whose median wall time regressed past the threshold.
+
+    A stage regresses when it is slower than baseline * (1 + threshold) and also slower by
+    at least `min_delta` seconds, so sub-second noise does not fail the run. A baselined stage
+    (among those selected by the `stages` prefixes) that failed or was not measured also fails.
+    """
+    regressions = []
+    for name, base in sorted(baseline.items()):
+        if 'wall_time' not in base or name in results:
+            continue
+        if not stages or any(name.startswith(prefix) for prefix in stages):
+            regressions.append(f"{name}: not measured (baseline {base['wall_time']:.3f}s)")
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if not base or 'wall_time' not in base:
+            continue
+        if 'wall_time' not in result:
+            reason = result.get('failed') or result.get('skipped')
+            regressions.append(f"{name}: no measurement ({reason}), baseline {base['wall_time']:.3f}s")
+            continue
+        limit = base['wall_time'] * (1 + threshold)
+        delta = result['wall_time'] - base['wall_time']
+        if result['wall_time'] > limit and delta >= min_delta:
+            regressions.append(
+                f"{name}: {result['wall_time']:.3f}s vs baseline {base['wall_time']:.3f}s "
+                f"(+{delta / base['wall_time']:.0%}, threshold {threshold:.0%})"
+            )
+    return regressions
+
+
+def load_baseline(path: str) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f).get('stages', {})
+
+
+def save_results(path: str, results: Dict[str, Dict[str, Any]]):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'stages': results}, f, indent=2, sort_keys=True)
+
+
+def run_benchmarks(baseline_path: str = DEFAULT_BASELINE_PATH, threshold: float = 0.25, repeat: int = 3,
+                   update_baseline: bool = False, results_path: Optional[str] = None,
+                   stages: Optional[List[str]] = None) -> int:
+    """Run the suite and compare with the stored baseline. Returns a process exit code."""
+    if shutil.which('ffmpeg') is None:
+        print("Error: ffmpeg is required to generate synthetic media")
+        return 2
+
+    work_directory = tempfile.mkdtemp(prefix='mvbench_')
+    try:
+        results = BenchmarkRunner(work_directory, repeat=repeat).run(stages)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    if results_path:
+        save_results(results_path, results)
+
+    if update_baseline:
+        save_results(baseline_path, results)
+        print(f"Baseline written to: {baseline_path}")
+        return 0
+
+    baseline = load_baseline(baseline_path)
+    if not baseline:
+        print(f"No baseline at {baseline_path}; run with --update-baseline to create one")
+        return 0
+
+    regressions = compare_to_baseline(results, baseline, threshold, stages=stages)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if regressions:
+        return 1
+    print("No regressions against baseline")
+    return 0
@@ -0,0 +1,480 @@
+import bisect
+import dataclasses
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Tuple
+
+
+class ConfigError(ValueError):
+    """Raised when config.yaml does not match the schema"""
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Invalid configuration:\n  " + "\n  ".join(errors))
+
+
+# Validators take (value, path) and return the normalized value or raise _Invalid
+
+class _Invalid(Exception):
+    pass
+
+
+def _bool(value, path):
+    if not isinstance(value, bool):
+        raise _Invalid(f"{path} must be true or false, got {value!r}")
+    return value
+
+
+def _int(min_value=None, max_value=None):
+    def check(value, path):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise _Invalid(f"{path} must be an integer, got {value!r}")
+        if min_value is not None and value < min_value:
+            raise _Invalid(f"{path} must be >= {min_value}, got {value}")
+        if max_value is not None and value > max_value:
+            raise _Invalid(f"{path} must be <= {max_value}, got {value}")
+        return value
+    return check
+
+
+def _number(min_value=None, max_value=None):
+    def check(value, path):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise _Invalid(f"{path} must be a number, got {value!r}")
+        if min_value is not None and value < min_value:
+            raise _Invalid(f"{path} must be >= {min_value}, got {value}")
+        if max_value is not None and value > max_value:
+            raise _Invalid(f"{path} must be <= {max_value}, got {value}")
+        return float(value)
+    return check
+
+
+def _str(optional=False):
+    def check(value, path):
+        if value is None and optional:
+            return None
+        if not isinstance(value, str):
+            raise _Invalid(f"{path} must be a string, got {value!r}")
+        return value
+    return check
+
+
+def _choice(*options):
+    def check(value, path):
+        if value not in options:
+            raise _Invalid(f"{path} must be one of {', '.join(options)}, got {value!r}")
+        return value
+    return check
+
+
+def _str_list(value, path):
+    if value is None:
+        return ()
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise _Invalid(f"{path} must be a list of strings, got {value!r}")
+    return tuple(value)
+
+
+def _list(value, path):
+    if value is None:
+        return ()
+    if not isinstance(value, list):
+        raise _Invalid(f"{path} must be a list, got {value!r}")
+    return _frozen(value)
+
+
+def _setting(default, check):
+    return field(default=default, metadata={'check': check})
+
+
+@dataclass(frozen=True, slots=True)
+class VideoSourceConfig:
+    method: str = _setting('youtube_search', _choice('youtube_search', 'youtube_links', 'file_paths', 'combination'))
+    max_youtube_results: int = _setting(5, _int(1, 50))
+    prompt: str = _setting(None, _str(optional=True))
+    youtube_links: Tuple[str, ...] = _setting((), _str_list)
+    file_paths: Tuple[str, ...] = _setting((), _str_list)
+    sources: Tuple[Any, ...] = _setting((), _list)
+    audio_file: str = _setting(None, _str(optional=True))
+
+
+@dataclass(frozen=True, slots=True)
+class AudioSourceConfig:
+    method: str = _setting('file', _choice('file', 'youtube'))
+    file_path: str = _setting(None, _str(optional=True))
+    youtube_link: str = _setting(None, _str(optional=True))
+
+
+@dataclass(frozen=True, slots=True)
+class VideoProcessingConfig:
+    enable_lyrics: bool = _setting(False, _bool)
+    fontsize: int = _setting(24, _int(1))
+    text_color: str = _setting('white', _str())
+    text_position: str = _setting('bottom', _choice('top', 'bottom', 'center'))
+    renderer: str = _setting('mvgen', _choice('mvgen', 'native'))
+    render_width: int = _setting(1080, _int(2))
+    render_height: int = _setting(1920, _int(2))
+    render_fps: int = _setting(30, _int(1, 120))
+    beats_per_cut: int = _setting(2, _int(1, 64))
+    variant_seed: int = _setting(0, _int(0))
+
+
+@dataclass(frozen=True, slots=True)
+class OutputConfig:
+    music_video_filename: str = _setting('generated_music_video.mp4', _str())
+    final_video_filename: str = _setting('final_video.mp4', _str())
+    output_directory: str = _setting('./output', _str())
+    post_to_social: bool = _setting(False, _bool)
+
+
+@dataclass(frozen=True, slots=True)
+class InstrumentationConfig:
+    enabled: bool = _setting(False, _bool)
+    output_directory: str = _setting('./traces', _str())
+    profile: bool = _setting(False, _bool)
+
+
+@dataclass(frozen=True, slots=True)
+class DaemonConfig:
+    host: str = _setting('127.0.0.1', _str())
+    port: int = _setting(8765, _int(0, 65535))
+    socket_path: str = _setting('', _str(optional=True))
+    workers: int = _setting(2, _int(1))
+    max_queued: int = _setting(8, _int(0))
+    artifact_directory: str = _setting('./daemon_artifacts', _str())
+    retention_seconds: float = _setting(3600, _number(0))
+
+
+@dataclass(frozen=True, slots=True)
+class TranscriptionConfig:
+    backend: str = _setting('openai', _choice('openai', 'local'))
+    language: str = _setting('en', _str(optional=True))
+    openai_model: str = _setting('whisper-1', _str())
+    model: str = _setting('small', _str())
+    compute_type: str = _setting('int8', _choice('int8', 'int8_float32', 'int8_float16', 'int16', 'float16', 'float32'))
+    threads: int = _setting(4, _int(1))
+    batch_size: int = _setting(8, _int(1))
+    max_batch_jobs: int = _setting(4, _int(1))
+    batch_window: float = _setting(0.05, _number(0, 10))
+
+
+@dataclass(frozen=True, slots=True)
+class ResourcesConfig:
+    cpu_threads: int = _setting(0, _int(0))
+    memory_mb: int = _setting(0, _int(0))
+
+
+@dataclass(frozen=True, slots=True)
+class DedupeConfig:
+    enabled: bool = _setting(True, _bool)
+    thumbnail_distance: int = _setting(6, _int(0, 63))
+    frame_distance: int = _setting(10, _int(0, 63))
+    frame_samples: int = _setting(8, _int(1, 64))
+    match_ratio: float = _setting(0.6, _number(0, 1))
+    title_similarity: float = _setting(0.8, _number(0, 1))
+
+
+@dataclass(frozen=True, slots=True)
+class EffectsConfig:
+    contrast: float = _setting(1.0, _number(0, 4))
+    brightness: float = _setting(0.0, _number(-1, 1))
+    gamma: float = _setting(1.0, _number(0.1, 5))
+    warmth: float = _setting(0.0, _number(-1, 1))
+    beat_flash: float = _setting(0.0, _number(0, 1))
+    beat_zoom: float = _setting(0.0, _number(0, 0.5))
+    workers: int = _setting(2, _int(0, 64))
+    batch_frames: int = _setting(8, _int(1, 256))
+
+
+@dataclass(frozen=True, slots=True)
+class SegmentCacheConfig:
+    enabled: bool = _setting(True, _bool)
+    directory: str = _setting('./cache/segments', _str())
+    max_size_mb: int = _setting(2048, _int(1))
+
+
+@dataclass(frozen=True, slots=True)
+class LibraryConfig:
+    enabled: bool = _setting(True, _bool)
+    database: str = _setting('./cache/library.sqlite', _str())
+    min_duration: float = _setting(0.0, _number(0))
+    max_aspect: float = _setting(0.0, _number(0))
+    min_motion: float = _setting(0.0, _number(0, 1))
+    max_clips: int = _setting(0, _int(0))
+
+
+@dataclass(frozen=True, slots=True)
+class RateControlConfig:
+    mode: str = _setting('capped_crf', _choice('capped_crf', 'two_pass', 'bitrate'))
+    max_size_mb: float = _setting(250.0, _number(1))
+    crf: int = _setting(20, _int(0, 51))
+    bitrate: str = _setting('8000k', _str())
+    preset: str = _setting('medium', _choice(
+        'ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow'))
+    audio_bitrate_kbps: int = _setting(128, _int(32, 512))
+    passlog_directory: str = _setting('./cache/passlogs', _str())
+
+
+@dataclass(frozen=True, slots=True)
+class WorkspaceConfig:
+    directory: str = _setting('', _str())
+    memory_directory: str = _setting('/dev/shm', _str())
+    memory_mb: int = _setting(512, _int(0))
+    disk_quota_mb: int = _setting(20480, _int(0))
+
+
+@dataclass(frozen=True, slots=True)
+class TransportConfig:
+    timeout: float = _setting(30.0, _number(0.1))
+    connect_timeout: float = _setting(10.0, _number(0.1))
+    retries: int = _setting(3, _int(0, 10))
+    backoff: float = _setting(0.5, _number(0))
+    max_connections: int = _setting(32, _int(1))
+    per_host: int = _setting(8, _int(1))
+    http2: bool = _setting(True, _bool)
+
+
+@dataclass(frozen=True, slots=True)
+class AudioCacheConfig:
+    enabled: bool = _setting(True, _bool)
+    directory: str = _setting('./cache/audio', _str())
+    max_size_mb: int = _setting(4096, _int(1))
+
+
+@dataclass(frozen=True, slots=True)
+class RhythmPattern:
+    timestamp: float
+    pattern: str
+
+
+@dataclass(frozen=True, slots=True)
+class OutputProfile:
+    name: str
+    width: int
+    height: int
+    filename: str
+
+    @property
+    def aspect(self) -> float:
+        return self.width / self.height
+
+
+_RHYTHM_PATTERN = re.compile(r'^1/(1|2|4|8|16|32)$')
+_PROFILE_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+SECTIONS = {
+    'video_source': VideoSourceConfig,
+    'audio_source': AudioSourceConfig,
+    'video_processing': VideoProcessingConfig,
+    'output': OutputConfig,
+    'instrumentation': InstrumentationConfig,
+    'daemon': DaemonConfig,
+    'transcription': TranscriptionConfig,
+    'resources': ResourcesConfig,
+    'dedupe': DedupeConfig,
+    'effects': EffectsConfig,
+    'segment_cache': SegmentCacheConfig,
+    'library': LibraryConfig,
+    'rate_control': RateControlConfig,
+    'workspace': WorkspaceConfig,
+    'transport': TransportConfig,
+    'audio_cache': AudioCacheConfig,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class ConfigSnapshot:
+    """Validated, immutable view of config.yaml with derived structures precomputed"""
+    video_source: VideoSourceConfig
+    audio_source: AudioSourceConfig
+    video_processing: VideoProcessingConfig
+    output: OutputConfig
+    instrumentation: InstrumentationConfig
+    daemon: DaemonConfig
+    transcription: TranscriptionConfig
+    resources: ResourcesConfig
+    dedupe: DedupeConfig
+    effects: EffectsConfig
+    segment_cache: SegmentCacheConfig
+    library: LibraryConfig
+    rate_control: RateControlConfig
+    workspace: WorkspaceConfig
+    transport: TransportConfig
+    audio_cache: AudioCacheConfig
+    rhythm_patterns: Tuple[RhythmPattern, ...]
+    # Extra renditions (e.g. 9:16, 1:1, 16:9) rendered in the same run; the first is the primary video
+    output_profiles: Tuple[OutputProfile, ...]
+    # Sorted timestamps of rhythm_patterns, for bisect lookups
+    rhythm_timestamps: Tuple[float, ...]
+    # Read-only plain-dict view of each section with defaults filled in
+    sections: Mapping[str, Mapping[str, Any]]
+    # Stable sha256 of each section, for cache and checkpoint keys
+    fingerprints: Mapping[str, str]
+
+    def pattern_at(self, timestamp: float, default: str = '1/4') -> str:
+        """Rhythm pattern active at `timestamp` (the last one starting at or before it)"""
+        index = bisect.bisect_right(self.rhythm_timestamps, timestamp)
+        return self.rhythm_patterns[index - 1].pattern if index else default
+
+    def fingerprint(self, *names: str) -> str:
+        """Combined fingerprint of the named sections, or of the whole config if none are given"""
+        names = names or tuple(sorted(self.fingerprints))
+        return hashlib.sha256('|'.join(self.fingerprints[name] for name in names).encode('utf-8')).hexdigest()
+
+
+def _fingerprint(value) -> str:
+    canonical = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _frozen(value):
+    """Read-only copy of a config value: lists become tuples and mappings become MappingProxyType"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_frozen(item) for item in value)
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _frozen(item) for key, item in value.items()})
+    return value
+
+
+def _plain(value):
+    """JSON-serializable copy of a frozen config value, for fingerprints"""
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    return value
+
+
+def _compile_section(name: str, cls, raw, errors: List[str]):
+    if raw is None:
+        raw = {}
+    if not isinstance(raw, dict):
+        errors.append(f"{name} must be a mapping, got {raw!r}")
+        return cls()
+    known = {f.name: f for f in dataclasses.fields(cls)}
+    for key in raw:
+        if key not in known:
+            errors.append(f"{name}.{key} is not a recognised setting (expected one of: {', '.join(known)})")
+    values = {}
+    for key, spec in known.items():
+        if key not in raw:
+            continue
+        try:
+            values[key] = spec.metadata['check'](raw[key], f"{name}.{key}")
+        except _Invalid as e:
+            errors.append(str(e))
+    return cls(**values)
+
+
+def _compile_rhythm_patterns(raw, errors: List[str]) -> Tuple[RhythmPattern, ...]:
+    if raw is None:
+        return ()
+    if not isinstance(raw, list):
+        errors.append(f"rhythm_patterns must be a list, got {raw!r}")
+        return ()
+    patterns = []
+    for index, item in enumerate(raw):
+        path = f"rhythm_patterns[{index}]"
+        if not isinstance(item, dict):
+            errors.append(f"{path} must be a mapping with timestamp and pattern")
+            continue
+        try:
+            timestamp = _number(0)(item.get('timestamp', 0), f"{path}.timestamp")
+            pattern = _str()(item.get('pattern', '1/4'), f"{path}.pattern")
+        except _Invalid as e:
+            errors.append(str(e))
+            continue
+        if not _RHYTHM_PATTERN.match(pattern):
+            errors.append(f"{path}.pattern must look like 1/4, 1/8 or 1/16, got {pattern!r}")
+            continue
+        patterns.append(RhythmPattern(timestamp, pattern))
+    return tuple(sorted(patterns, key=lambda p: p.timestamp))
+
+
+def _compile_output_profiles(raw, output: OutputConfig, errors: List[str]) -> Tuple[OutputProfile, ...]:
+    if raw is None:
+        return ()
+    if not isinstance(raw, list):
+        errors.append(f"output_profiles must be a list, got {raw!r}")
+        return ()
+    stem, extension = os.path.splitext(output.music_video_filename)
+    profiles, names = [], set()
+    for index, item in enumerate(raw):
+        path = f"output_profiles[{index}]"
+        if not isinstance(item, dict):
+            errors.append(f"{path} must be a mapping with name, width and height")
+            continue
+        unknown = set(item) - {'name', 'width', 'height', 'filename'}
+        if unknown:
+            errors.append(f"{path}.{sorted(unknown)[0]} is not a recognised setting (expected one of: name, width, height, filename)")
+        try:
+            name = _str()(item.get('name'), f"{path}.name")
+            width = _int(2, 8192)(item.get('width'), f"{path}.width")
+            height = _int(2, 8192)(item.get('height'), f"{path}.height")
+            filename = _str(optional=True)(item.get('filename'), f"{path}.filename")
+        except _Invalid as e:
+            errors.append(str(e))
+            continue
+        if not _PROFILE_NAME.match(name) or name in names:
+            errors.append(f"{path}.name must be unique and use only letters, digits, - and _, got {name!r}")
+            continue
+        if width % 2 or height % 2:
+            errors.append(f"{path} width and height must be even for yuv420p, got {width}x{height}")
+            continue
+        names.add(name)
+        if not filename:
+            # The first profile is the primary video and keeps the configured filename
+            filename = output.music_video_filename if not profiles else f"{stem}_{name}{extension or '.mp4'}"
+        profiles.append(OutputProfile(name, width, height, filename))
+    return tuple(profiles)
+
+
+def compile_config(raw: Dict[str, Any]) -> ConfigSnapshot:
+    """Validate a loaded config.yaml and build its immutable snapshot.
+
+    All problems are collected and raised together as a single ConfigError.
+    """
+    if raw is None:
+        raw = {}
+    if not isinstance(raw, dict):
+        raise ConfigError([f"configuration must be a mapping, got {raw!r}"])
+
+    errors: List[str] = []
+    for key in raw:
+        if key not in SECTIONS and key not in ('rhythm_patterns', 'output_profiles'):
+            errors.append(f"{key} is not a recognised section")
+
+    compiled = {name: _compile_section(name, cls, raw.get(name), errors) for name, cls in SECTIONS.items()}
+    rhythm_patterns = _compile_rhythm_patterns(raw.get('rhythm_patterns'), errors)
+    output_profiles = _compile_output_profiles(raw.get('output_profiles'), compiled['output'], errors)
+
+    audio_source = compiled['audio_source']
+    if audio_source.method == 'youtube' and not audio_source.youtube_link:
+        errors.append("audio_source.youtube_link is required when audio_source.method is youtube")
+
+    if errors:
+        raise ConfigError(errors)
+
+    # Sections are frozen all the way down, so readers share them and they cannot drift from their fingerprints
+    sections = {}
+    for name, section in compiled.items():
+        sections[name] = _frozen({f.name: getattr(section, f.name) for f in dataclasses.fields(section)})
+    sections['rhythm_patterns'] = _frozen({
+        'patterns': [{'timestamp': p.timestamp, 'pattern': p.pattern} for p in rhythm_patterns]
+    })
+    sections['output_profiles'] = _frozen({
+        'profiles': [dataclasses.asdict(profile) for profile in output_profiles]
+    })
+    fingerprints = {name: _fingerprint(_plain(values)) for name, values in sections.items()}
+
+    return ConfigSnapshot(
+        rhythm_patterns=rhythm_patterns,
+        output_profiles=output_profiles,
+        rhythm_timestamps=tuple(p.timestamp for p in rhythm_patterns),
+        sections=MappingProxyType(sections),
+        fingerprints=MappingProxyType(fingerprints),
+        **compiled
+    )
@@ -1,37 +1,55 @@
 import yaml
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Dict, Any, Mapping
 import os
+import copy
+from src.config_compiler import compile_config, ConfigSnapshot
 
 class ConfigManager:
     def __init__(self, config_path: str = "config.yaml"):
         with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+            self._load(yaml.safe_load(f))
     
-    def get_video_source_config(self) -> Dict[str, Any]:
-        return self.config.get('video_source', {})
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> 'ConfigManager':
+        """Build a manager from an already-loaded config (e.g. a job sent to the daemon)"""
+        manager = cls.__new__(cls)
+        manager._load(copy.deepcopy(config))
+        return manager
+    
+    def _load(self, config: Dict[str, Any]):
+        # Validate once up front so bad values fail before any work starts
+        self.config = config or {}
+        self.snapshot: ConfigSnapshot = compile_config(self.config)
+        self._video_processing_config = MappingProxyType(dict(
+            self.snapshot.sections['video_processing'],
+            final_video_filename=self.snapshot.output.final_video_filename
+        ))
+    
+    def fingerprint(self, *sections: str) -> str:
+        """Stable hash of the given config sections (or all of them) for cache keys"""
+        return self.snapshot.fingerprint(*sections)
+    
+    def get_video_source_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['video_source']
     
     @property
     def video_source_method(self) -> str:
-        return self.get_video_source_config().get('method', 'youtube_search')
+        return self.snapshot.video_source.method
     
     @property
     def youtube_links(self) -> list:
-        return self.get_video_source_config().get('youtube_links', [])
+        return list(self.snapshot.video_source.youtube_links)
     
     @property
     def file_paths(self) -> list:
-        return self.get_video_source_config().get('file_paths', [])
+        return list(self.snapshot.video_source.file_paths)
     
-    def get_video_processing_config(self) -> Dict[str, Any]:
-        return {
-            'fontsize': self.config.get('video_processing', {}).get('fontsize', 24),
-            'text_color': self.config.get('video_processing', {}).get('text_color', 'white'),
-            'text_position': self.config.get('video_processing', {}).get('text_position', 'bottom'),
-            'final_video_filename': self.config.get('output', {}).get('final_video_filename', 'final_video.mp4')
-        }
+    def get_video_processing_config(self) -> Mapping[str, Any]:
+        return self._video_processing_config
     
-    def get_output_config(self) -> Dict[str, Any]:
-        return self.config.get('output', {})
+    def get_output_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['output']
     
     @property
     def use_youtube_search(self) -> bool:
@@ -40,15 +58,15 @@ class ConfigManager:
     
     @property
     def max_youtube_results(self) -> int:
-        return self.get_video_source_config().get('max_youtube_results', 5)
+        return self.snapshot.video_source.max_youtube_results
     
     @property
     def prompt(self) -> str:
-        return self.get_video_source_config().get('prompt')
+        return self.snapshot.video_source.prompt
     
     @property
     def audio_file(self) -> str:
-        return self.get_video_source_config().get('audio_file')
+        return self.snapshot.video_source.audio_file
     
     @property
     def has_predefined_input(self) -> bool:
@@ -57,49 +75,159 @@ class ConfigManager:
             return bool(self.prompt)
         return bool(self.youtube_links or self.file_paths)
     
-    def get_audio_source_config(self) -> Dict[str, Any]:
-        return self.config.get('audio_source', {})
+    def get_audio_source_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['audio_source']
     
     @property
     def audio_source_method(self) -> str:
-        return self.get_audio_source_config().get('method', 'file')
+        return self.snapshot.audio_source.method
     
     @property
     def audio_file_path(self) -> str:
-        return self.get_audio_source_config().get('file_path')
+        return self.snapshot.audio_source.file_path
     
     @property
     def audio_youtube_link(self) -> str:
-        return self.get_audio_source_config().get('youtube_link')
+        return self.snapshot.audio_source.youtube_link
     
     @property
     def output_directory(self) -> str:
-        return self.config.get('output', {}).get('output_directory', './output')
+        return self.snapshot.output.output_directory
     
     @property
     def should_post_to_social(self) -> bool:
-        return self.config.get('output', {}).get('post_to_social', False)
+        return self.snapshot.output.post_to_social
     
     @property
     def combined_sources(self) -> list:
         """Get combined video sources from config"""
-        return self.get_video_source_config().get('sources', [])
+        return list(self.snapshot.video_source.sources)
     
     @property
-    def rhythm_patterns(self) -> list:
-        """Get rhythm patterns from config"""
-        patterns = self.config.get('rhythm_patterns', [])
-        return sorted(patterns, key=lambda x: x.get('timestamp', 0))
+    def rhythm_patterns(self) -> tuple:
+        """Get rhythm patterns from config, sorted by timestamp"""
+        return self.snapshot.rhythm_patterns
+    
+    @property
+    def output_profiles(self) -> tuple:
+        """Renditions rendered in one run (empty = a single video at the render size)"""
+        return self.snapshot.output_profiles
     
     def get_pattern_at_timestamp(self, timestamp: float) -> str:
         """Get the rhythm pattern active at a given timestamp"""
-        patterns = self.rhythm_patterns
-        for pattern in reversed(patterns):
-            if timestamp >= pattern.get('timestamp', 0):
-                return pattern.get('pattern', '1/4')
-        return '1/4'  # Default to quarter notes
+        return self.snapshot.pattern_at(timestamp, default='1/4')  # Default to quarter notes
     
     @property
     def enable_lyrics(self) -> bool:
         """Check if lyrics processing is enabled"""
-        return self.config.get('video_processing', {}).get('enable_lyrics', False)
\ No newline at end of file
+        return self.snapshot.video_processing.enable_lyrics
+    
+    @property
+    def renderer(self) -> str:
+        """Music video renderer: mvgen, or the native cut-plan renderer backed by the segment cache"""
+        return self.snapshot.video_processing.renderer
+    
+    def get_instrumentation_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['instrumentation']
+    
+    @property
+    def tracing_enabled(self) -> bool:
+        """Check if per-stage tracing is enabled"""
+        return self.snapshot.instrumentation.enabled
+    
+    @property
+    def tracing_output_directory(self) -> str:
+        return self.snapshot.instrumentation.output_directory
+    
+    @property
+    def tracing_profile(self) -> bool:
+        """Check if a cProfile dump should be written per stage"""
+        return self.snapshot.instrumentation.profile
+    
+    def get_daemon_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['daemon']
+    
+    @property
+    def daemon_host(self) -> str:
+        return self.snapshot.daemon.host
+    
+    @property
+    def daemon_port(self) -> int:
+        return self.snapshot.daemon.port
+    
+    @property
+    def daemon_socket_path(self) -> str:
+        """Unix socket path; when set the daemon listens there instead of host:port"""
+        return self.snapshot.daemon.socket_path or ''
+    
+    @property
+    def daemon_workers(self) -> int:
+        return self.snapshot.daemon.workers
+    
+    @property
+    def daemon_max_queued(self) -> int:
+        return self.snapshot.daemon.max_queued
+    
+    @property
+    def daemon_artifact_directory(self) -> str:
+        return self.snapshot.daemon.artifact_directory
+    
+    @property
+    def daemon_retention_seconds(self) -> float:
+        return self.snapshot.daemon.retention_seconds
+    
+    def get_transcription_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['transcription']
+    
+    @property
+    def transcription_backend(self) -> str:
+        return self.snapshot.transcription.backend
+    
+    @property
+    def transcription_language(self) -> str:
+        return self.snapshot.transcription.language
+    
+    def get_resources_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['resources']
+    
+    @property
+    def resource_cpu_threads(self) -> int:
+        """CPU threads shared by all heavy tasks (0 = all cores)"""
+        return self.snapshot.resources.cpu_threads
+    
+    @property
+    def resource_memory_mb(self) -> int:
+        """Memory budget in MB shared by all heavy tasks (0 = physical memory)"""
+        return self.snapshot.resources.memory_mb
+    
+    def get_library_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['library']
+    
+    def get_rate_control_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['rate_control']
+    
+    @property
+    def max_video_bytes(self) -> int:
+        """Byte budget every finished video is encoded to fit"""
+        return int(self.snapshot.rate_control.max_size_mb * 1024 * 1024)
+    
+    def get_workspace_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['workspace']
+    
+    def get_transport_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['transport']
+    
+    def get_audio_cache_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['audio_cache']
+    
+    def get_effects_config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections['effects']
+    
+    @property
+    def effects_workers(self) -> int:
+        """Processes applying frame effects (0 = in the render thread)"""
+        return self.snapshot.effects.workers
+    
+    @property
+    def effects_batch_frames(self) -> int:
+        return self.snapshot.effects.batch_frames
\ No newline at end of file
@@ -0,0 +1,213 @@
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.audio_asset import get_audio_asset
+from src.instrumentation import tracer
+from src.scheduler import scheduler
+from src.segment_cache import SegmentCache, content_hash, segment_key
+
+# Intermediate segments are stream-copied into the final video, so encode them once at high quality
+SEGMENT_VIDEO_ARGS = ('-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p')
+
+
+@dataclass(frozen=True)
+class Cut:
+    """One shot of the edit: `frames` output frames taken from `source` starting at `start` seconds"""
+    source: str
+    start: float
+    frames: int
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    """Size and framerate every segment of one rendition is normalized to"""
+    width: int
+    height: int
+    fps: int
+    name: str = 'main'
+
+    def key(self) -> Tuple:
+        return ('center-crop', self.width, self.height, self.fps)
+
+
+def estimate_beat_length(beats: Sequence[float], default: float = 0.5) -> float:
+    """Seconds per beat from onset times, folded into 60-200 BPM"""
+    if len(beats) < 4:
+        return default
+    interval = float(np.median(np.diff(np.asarray(beats, dtype=np.float64))))
+    if interval <= 0:
+        return default
+    while interval < 0.3:
+        interval *= 2
+    while interval > 1.0:
+        interval /= 2
+    return interval
+
+
+def plan_cuts(sources: Sequence[Tuple[str, float]], song_duration: float, beat_length: float,
+              pattern_at: Callable[[float], str], fps: int, beats_per_cut: int = 2, seed: int = 0) -> List[Cut]:
+    """Cut the song into shots following the rhythm pattern active at each point.
+
+    A shot lasts beats_per_cut notes of the active pattern (1/4 = one beat). Boundaries are
+    placed on the output frame grid so lengths never drift. Trim starts are snapped to
+    multiples of the shot length, so re-cuts and other seeds land on the same slices and
+    can reuse their cached segments.
+    """
+    if not sources:
+        raise ValueError("No video clips provided for music video generation")
+    rng = random.Random(seed)
+    total_frames = max(1, round(song_duration * fps))
+    cuts: List[Cut] = []
+    order: List[int] = []
+    previous = None
+    frame = 0
+    while frame < total_frames:
+        t = frame / fps
+        denominator = int(pattern_at(t).split('/')[1])
+        length = beat_length * 4 / denominator * beats_per_cut
+        end = min(total_frames, max(frame + 1, round((t + length) * fps)))
+        frames = end - frame
+
+        if not order:
+            order = list(range(len(sources)))
+            rng.shuffle(order)
+            if len(order) > 1 and order[-1] == previous:
+                order[0], order[-1] = order[-1], order[0]
+        index = order.pop()
+        previous = index
+
+        path, duration = sources[index]
+        usable = duration - frames / fps
+        slots = int(usable // length) + 1 if usable > 0 else 1
+        cuts.append(Cut(path, round(rng.randrange(slots) * length, 3), frames))
+        frame = end
+    return cuts
+
+
+def _segment_filter(crop: str, profile: RenderProfile) -> str:
+    return ','.join(f for f in (
+        crop,
+        f'scale={profile.width}:{profile.height}',
+        'setsar=1',
+        f'fps={profile.fps}',
+        # Short sources hold their last frame instead of ending the shot early
+        'tpad=stop=-1:stop_mode=clone',
+    ) if f)
+
+
+def _segment_command(cut: Cut, targets: Sequence[Tuple[RenderProfile, str, str]], threads: int) -> List[str]:
+    """One ffmpeg decoding the slice once and splitting it into a crop/scale/encode branch per profile"""
+    if len(targets) == 1:
+        graph = f'[0:v]{_segment_filter(targets[0][1], targets[0][0])}[out0]'
+    else:
+        branches = ''.join(f'[in{i}]' for i in range(len(targets)))
+        graph = ';'.join([f'[0:v]split={len(targets)}{branches}'] + [
+            f'[in{i}]{_segment_filter(crop, profile)}[out{i}]' for i, (profile, crop, _) in enumerate(targets)
+        ])
+    cmd = ['ffmpeg', '-y', '-v', 'error', '-ss', f'{cut.start:.3f}', '-i', cut.source, '-filter_complex', graph]
+    for i, (_, _, path) in enumerate(targets):
+        cmd += ['-map', f'[out{i}]', '-frames:v', str(cut.frames), *SEGMENT_VIDEO_ARGS, '-threads', str(threads), path]
+    return cmd
+
+
+def render_cut_plan(cuts: Sequence[Cut], audio_file: str, outputs: Sequence[Tuple[RenderProfile, str]],
+                    crops: Dict[str, Dict[str, str]], work_directory: str,
+                    cache: Optional[SegmentCache] = None) -> List[str]:
+    """Render every shot for every output profile and join each profile's shots with the song.
+
+    outputs pairs each profile with its output path; crops[source][profile.name] is the ffmpeg
+    crop filter that fits a source to that profile's aspect. Each unique shot is decoded once
+    and split into the profiles that are not cached yet; the joins are stream copies. Cached
+    segments are held until the joins finish, so concurrent jobs cannot evict them.
+    """
+    profiles = [profile for profile, _ in outputs]
+    widest = max(profile.width for profile in profiles)
+    cost = scheduler.estimate_video(widest, sum(profile.height for profile in profiles), 2)
+    hashes = {source: content_hash(source) for source in {cut.source for cut in cuts}}
+    unique = list(dict.fromkeys(cuts))
+    keys = {
+        (cut, profile.name): segment_key(hashes[cut.source], cut.start, cut.frames, profile.key(), SEGMENT_VIDEO_ARGS)
+        for cut in unique for profile in profiles
+    }
+
+    held: List[str] = []
+    rendered: List[str] = []
+
+    def render_segments(cut: Cut) -> Dict[str, str]:
+        paths, targets = {}, []
+        for profile in profiles:
+            key = keys[(cut, profile.name)]
+            cached = cache.get(key, hold=True) if cache is not None else None
+            if cached:
+                paths[profile.name] = cached
+                held.append(cached)
+            else:
+                path = cache.temp_path() if cache is not None else os.path.join(work_directory, f'segment_{key[:16]}.mp4')
+                targets.append((profile, crops[cut.source][profile.name], path))
+        if not targets:
+            return paths
+        try:
+            with scheduler.acquire(cost, 'render_segment') as grant:
+                tracer.run(_segment_command(cut, targets, grant.threads), name='ffmpeg.render_segment', check=True)
+            for profile, _, path in targets:
+                if cache is not None:
+                    path = cache.put(keys[(cut, profile.name)], path, hold=True)
+                    held.append(path)
+                paths[profile.name] = path
+                rendered.append(path)
+        finally:
+            if cache is not None:
+                for _, _, path in targets:
+                    if os.path.exists(path):
+                        os.remove(path)
+        return paths
+
+    try:
+        workers = max(1, scheduler.cpu_threads // cost.threads)
+        with tracer.span('render_segments', segments=len(cuts), unique=len(unique), profiles=len(profiles)) as span, \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            segments = dict(zip(unique, pool.map(render_segments, unique)))
+            if cache is not None:
+                # The cache is shared by every job, so count this plan's hits and renders here
+                hits = len(held) - len(rendered)
+                span.set(cache_hits=hits, cache_misses=len(rendered))
+                print(f"Segment cache: {hits} hits, {len(rendered)} renders")
+
+        _join_segments(cuts, segments, audio_file, outputs, work_directory)
+    finally:
+        if cache is not None:
+            cache.release(held)
+    if cache is not None:
+        cache.evict()
+    return [output_path for _, output_path in outputs]
+
+
+def _join_segments(cuts: Sequence[Cut], segments: Dict[Cut, Dict[str, str]], audio_file: str,
+                   outputs: Sequence[Tuple[RenderProfile, str]], work_directory: str):
+    # Encode the song once; every rendition copies the same audio stream
+    audio_path = os.path.join(work_directory, 'audio.m4a')
+    asset = get_audio_asset(audio_file)
+    if asset is not None:
+        # Encode from the already decoded buffer instead of decoding the song again
+        asset.export(audio_path, codec='aac')
+    else:
+        with scheduler.acquire(scheduler.estimate_audio(), 'encode_audio') as grant:
+            tracer.run(['ffmpeg', '-y', '-v', 'error', '-i', audio_file, '-vn', '-c:a', 'aac',
+                        '-threads', str(grant.threads), audio_path], name='ffmpeg.encode_audio', check=True)
+
+    for profile, output_path in outputs:
+        list_path = os.path.join(work_directory, f'segments_{profile.name}.txt')
+        with open(list_path, 'w') as f:
+            for cut in cuts:
+                path = os.path.abspath(segments[cut][profile.name]).replace("'", "'\\''")
+                f.write(f"file '{path}'\n")
+        cmd = [
+            'ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path, '-i', audio_path,
+            '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', '-shortest', output_path,
+        ]
+        tracer.run(cmd, name='ffmpeg.join_segments', check=True)
@@ -0,0 +1,460 @@
+import http.client
+import json
+import os
+import shutil
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from src.config_manager import ConfigManager
+from src.instrumentation import tracer
+from src.utils import JobCancelled
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Path-valued config settings as (section, key); the daemon may run in another working directory
+PATH_SETTINGS = (
+    ('video_source', 'file_paths'),
+    ('video_source', 'audio_file'),
+    ('audio_source', 'file_path'),
+    ('output', 'output_directory'),
+    ('instrumentation', 'output_directory'),
+    ('daemon', 'artifact_directory'),
+    ('segment_cache', 'directory'),
+    ('library', 'database'),
+    ('rate_control', 'passlog_directory'),
+    ('workspace', 'directory'),
+    ('workspace', 'memory_directory'),
+    ('audio_cache', 'directory'),
+)
+
+
+class AdmissionError(Exception):
+    """Raised when the daemon's queue is full and a job cannot be accepted"""
+
+
+def absolutize_paths(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of config with every relative path setting resolved against the current directory.
+
+    Empty values keep their meaning (e.g. workspace.directory "" is the system temp directory).
+    """
+    config = dict(config)
+    for section, key in PATH_SETTINGS:
+        values = config.get(section)
+        if not isinstance(values, dict) or not values.get(key):
+            continue
+        value = values[key]
+        config[section] = dict(values)
+        if isinstance(value, list):
+            config[section][key] = [os.path.abspath(path) if path else path for path in value]
+        else:
+            config[section][key] = os.path.abspath(value)
+    return config
+
+
+class Job:
+    """A submitted pipeline run and its current state"""
+    def __init__(self, config: Dict[str, Any], input_data, audio_file: str):
+        self.id = uuid.uuid4().hex
+        self.config = config
+        self.input_data = input_data
+        self.audio_file = audio_file
+        self.status = QUEUED
+        # Every rendition the job produced; the first is the primary video
+        self.artifacts: List[str] = []
+        # Indexes of artifacts the client has downloaded (and that have been deleted)
+        self.fetched: set = set()
+        # Set by the runner; removed once every artifact is fetched or the job expires
+        self.artifact_directory: Optional[str] = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def artifact(self) -> Optional[str]:
+        return self.artifacts[0] if self.artifacts else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'artifact': self.artifact,
+            'artifacts': [os.path.basename(path) for path in self.artifacts],
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobManager:
+    """Runs jobs on a bounded worker pool and rejects submissions beyond max_queued.
+
+    Finished jobs are forgotten, and their artifacts deleted, retention seconds after they finish.
+    """
+    def __init__(self, workers: int = 2, max_queued: int = 8, runner=None, retention: float = 3600):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.runner = runner or _run_job
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mv-worker')
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def _pending(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == QUEUED)
+
+    def _expire(self):
+        """Drop finished jobs older than the retention window; call with the lock held"""
+        cutoff = time.time() - self.retention
+        for job in list(self.jobs.values()):
+            if job.status in FINISHED_STATES and job.finished_at is not None and job.finished_at < cutoff:
+                del self.jobs[job.id]
+                if job.artifact_directory:
+                    shutil.rmtree(job.artifact_directory, ignore_errors=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._expire()
+            return {
+                'workers': self.workers,
+                'queued': self._pending(),
+                'running': sum(1 for job in self.jobs.values() if job.status == RUNNING),
+                'max_queued': self.max_queued,
+            }
+
+    def submit(self, config: Dict[str, Any], input_data, audio_file: str) -> Job:
+        with self._lock:
+            self._expire()
+            if self._pending() >= self.max_queued:
+                raise AdmissionError(f"Queue is full ({self.max_queued} jobs waiting)")
+            job = Job(config, input_data, audio_file)
+            self.jobs[job.id] = job
+        job.future = self.executor.submit(self._execute, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._expire()
+            return self.jobs.get(job_id)
+
+    def artifact_fetched(self, job: Job, index: int):
+        """Delete an artifact the client has downloaded, and the job's directory once all of them are"""
+        with self._lock:
+            job.fetched.add(index)
+            done = len(job.fetched) == len(job.artifacts)
+        try:
+            os.remove(job.artifacts[index])
+        except OSError:
+            pass
+        if done and job.artifact_directory:
+            shutil.rmtree(job.artifact_directory, ignore_errors=True)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued job immediately, or ask a running job to stop at its next stage"""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.finished_at = time.time()
+            job.status = CANCELLED
+        return job
+
+    def _execute(self, job: Job):
+        if job.cancel_event.is_set():
+            job.finished_at = time.time()
+            job.status = CANCELLED
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            with tracer.job(job.id), tracer.span('job', job_id=job.id):
+                result = self.runner(job)
+            job.artifacts = [result] if isinstance(result, str) else list(result)
+            status = SUCCEEDED
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            status = FAILED
+        # A finished status is only visible once finished_at is set, so expiry never sees None
+        job.finished_at = time.time()
+        job.status = status
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            job.cancel_event.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_job(job: Job) -> List[str]:
+    from src.pipeline import run_pipeline
+    from src.video_processing import profile_outputs
+
+    # Keep each job's artifact separate; the client copies it to its own output directory
+    config = dict(job.config)
+    config['output'] = dict(config.get('output') or {})
+    job.artifact_directory = os.path.join(ConfigManager.from_dict(job.config).daemon_artifact_directory, job.id)
+    config['output']['output_directory'] = job.artifact_directory
+    config_manager = ConfigManager.from_dict(config)
+    primary = run_pipeline(
+        config_manager,
+        job.input_data,
+        job.audio_file,
+        cancel_event=job.cancel_event,
+        publish=False,
+    )
+    # Every output profile is an artifact, so the client can fetch each rendition
+    variants = [path for _, path in profile_outputs(config_manager)[1:] if os.path.exists(path)]
+    return [primary] + variants
+
+
+def warm_up(config_manager: ConfigManager):
+    """Import the heavy libraries and load models once so jobs don't pay for it"""
+    with tracer.span('daemon.warm_up'):
+        import yt_dlp  # noqa: F401
+        from src import video_processing  # noqa: F401
+        from src.audio_processing import get_openai_client, load_separation_model
+        from src.transcription import LocalWhisperBackend, get_transcription_backend
+
+        if config_manager.enable_lyrics:
+            try:
+                get_openai_client()
+                load_separation_model()
+                backend = get_transcription_backend(config_manager)
+                if isinstance(backend, LocalWhisperBackend):
+                    backend._load_engine()
+            except Exception as e:
+                print(f"Warning: could not preload transcription models: {str(e)}")
+
+
+class _JobRequestHandler(BaseHTTPRequestHandler):
+    manager: JobManager = None
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_or_404(self, job_id: str) -> Optional[Job]:
+        job = self.manager.get(job_id)
+        if job is None:
+            self._send_json(404, {'error': f"Unknown job {job_id}"})
+        return job
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        if parts == ['health']:
+            self._send_json(200, dict(self.manager.stats(), status='ok'))
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self._job_or_404(parts[1])
+            if job:
+                self._send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'artifact':
+            job = self._job_or_404(parts[1])
+            if job:
+                self._send_artifact(job, 0)
+        elif len(parts) == 4 and parts[0] == 'jobs' and parts[2] == 'artifacts' and parts[3].isdigit():
+            job = self._job_or_404(parts[1])
+            if job:
+                self._send_artifact(job, int(parts[3]))
+        else:
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        parts = self.path.strip('/').split('/')
+        if parts == ['jobs']:
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                # Reject invalid configs up front instead of failing inside a worker
+                ConfigManager.from_dict(payload['config'])
+                job = self.manager.submit(payload['config'], payload.get('input'), payload['audio_file'])
+            except AdmissionError as e:
+                self._send_json(503, {'error': str(e)})
+                return
+            except (KeyError, ValueError) as e:
+                self._send_json(400, {'error': f"Invalid job request: {str(e)}"})
+                return
+            self._send_json(202, job.to_dict())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+            job = self.manager.cancel(parts[1])
+            if job is None:
+                self._send_json(404, {'error': f"Unknown job {parts[1]}"})
+            else:
+                self._send_json(200, job.to_dict())
+        else:
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def _send_artifact(self, job: Job, index: int):
+        path = job.artifacts[index] if index < len(job.artifacts) else None
+        if job.status != SUCCEEDED or not path or not os.path.exists(path):
+            self._send_json(409, {'error': f"Job {job.id} has no artifact {index} (status: {job.status})"})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile)
+        # Only reached once the whole file was written to the client
+        self.manager.artifact_fetched(job, index)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects an (host, port) client address
+        return request, ('local', 0)
+
+
+def make_server(manager: JobManager, host: str = '127.0.0.1', port: int = 8765, socket_path: str = ''):
+    """Create the job API server on a Unix socket if socket_path is set, otherwise on host:port"""
+    handler = type('JobRequestHandler', (_JobRequestHandler,), {'manager': manager})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return _UnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(config_manager: ConfigManager):
+    """Run the worker daemon until interrupted"""
+    manager = JobManager(config_manager.daemon_workers, config_manager.daemon_max_queued,
+                         retention=config_manager.daemon_retention_seconds)
+    warm_up(config_manager)
+    tracer.write_reports('daemon-warm_up')
+    server = make_server(manager, config_manager.daemon_host, config_manager.daemon_port,
+                         config_manager.daemon_socket_path)
+    location = config_manager.daemon_socket_path or f"{config_manager.daemon_host}:{config_manager.daemon_port}"
+    print(f"Worker daemon listening on {location} with {manager.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down worker daemon...")
+    finally:
+        server.server_close()
+        manager.shutdown()
+        if config_manager.daemon_socket_path and os.path.exists(config_manager.daemon_socket_path):
+            os.remove(config_manager.daemon_socket_path)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DaemonClient:
+    """Client for the worker daemon's job API"""
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, socket_path: str = '', timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config_manager: ConfigManager) -> 'DaemonClient':
+        return cls(config_manager.daemon_host, config_manager.daemon_port, config_manager.daemon_socket_path)
+
+    def _connection(self, timeout: Optional[float] = None) -> http.client.HTTPConnection:
+        timeout = timeout or self.timeout
+        if self.socket_path:
+            return _UnixHTTPConnection(self.socket_path, timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _request(self, method: str, path: str, payload=None, timeout: Optional[float] = None):
+        connection = self._connection(timeout)
+        try:
+            body = json.dumps(payload) if payload is not None else None
+            headers = {'Content-Type': 'application/json'} if body else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = json.loads(response.read() or b'{}')
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise RuntimeError(f"Daemon returned {response.status}: {data.get('error')}")
+        return data
+
+    def is_alive(self) -> bool:
+        """Check whether a daemon is listening, with a short timeout"""
+        try:
+            return self._request('GET', '/health', timeout=1).get('status') == 'ok'
+        except (OSError, RuntimeError, ValueError):
+            return False
+
+    def submit(self, config: Dict[str, Any], input_data, audio_file: str) -> Dict[str, Any]:
+        """Queue a job; relative paths in config and audio_file are resolved here, not in the daemon's directory"""
+        payload = {'config': absolutize_paths(config), 'input': input_data, 'audio_file': os.path.abspath(audio_file)}
+        return self._request('POST', '/jobs', payload)
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        return self._request('POST', f'/jobs/{job_id}/cancel')
+
+    def wait(self, job_id: str, poll_interval: float = 2.0) -> Dict[str, Any]:
+        """Poll until the job finishes; cancel it if the caller is interrupted"""
+        try:
+            while True:
+                job = self.status(job_id)
+                if job['status'] in FINISHED_STATES:
+                    return job
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            self.cancel(job_id)
+            raise
+
+    def fetch_artifacts(self, job: Dict[str, Any], directory: str) -> List[str]:
+        """Download every rendition of a finished job into directory; the primary video comes first"""
+        return [
+            self.fetch_artifact(job['id'], os.path.join(directory, name), index)
+            for index, name in enumerate(job.get('artifacts') or [])
+        ]
+
+    def fetch_artifact(self, job_id: str, destination: str, index: int = 0) -> str:
+        """Download one of a finished job's videos (the primary one by default) to destination"""
+        connection = self._connection()
+        try:
+            connection.request('GET', f'/jobs/{job_id}/artifacts/{index}')
+            response = connection.getresponse()
+            if response.status != 200:
+                error = json.loads(response.read() or b'{}').get('error')
+                raise RuntimeError(f"Could not fetch artifact for job {job_id}: {error}")
+            os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+            with open(destination, 'wb') as f:
+                shutil.copyfileobj(response, f)
+        finally:
+            connection.close()
+        return destination
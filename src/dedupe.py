@@ -0,0 +1,206 @@
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from src.audio_processing import get_duration
+from src.instrumentation import tracer
+
+# Words that differ between re-uploads of the same footage
+_TITLE_NOISE = {
+    'official', 'video', 'hd', '4k', '1080p', '720p', 'full', 'clip', 'clips', 'reupload',
+    'new', 'the', 'a', 'an', 'of', 'and', 'in', 'at', 'ft', 'feat',
+}
+
+# SWAR popcount masks
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Vectorized bit count of a uint64 array"""
+    shape = np.shape(values)
+    # Work on a 1-d array so the wrap-around multiply below stays an array op (no scalar overflow warnings)
+    x = np.array(values, dtype=np.uint64, ndmin=1).ravel()
+    x -= (x >> np.uint64(1)) & _M1
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return ((x * _H01) >> np.uint64(56)).astype(np.uint8).reshape(shape)
+
+
+def hamming(a, b) -> np.ndarray:
+    """Hamming distance between uint64 hashes (broadcasts)"""
+    return popcount64(np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64)))
+
+
+def dhash(frames: np.ndarray) -> np.ndarray:
+    """64-bit difference hashes for a batch of 8x9 grayscale frames, shape (n, 8, 9) -> (n,)"""
+    frames = np.asarray(frames)
+    bits = frames[:, :, 1:] > frames[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(frames), 64), axis=1)
+    return packed.view('>u8').ravel().astype(np.uint64)
+
+
+def _gray_thumbnails(cmd: List[str], data: Optional[bytes] = None) -> np.ndarray:
+    """Run ffmpeg scaling every frame to 9x8 gray and return them as an (n, 8, 9) array"""
+    result = tracer.run(cmd, name='ffmpeg.dedupe_frames', input=data, capture_output=True, check=True)
+    raw = np.frombuffer(result.stdout, dtype=np.uint8)
+    return raw[:len(raw) - len(raw) % 72].reshape(-1, 8, 9)
+
+
+def image_hash(data: bytes) -> Optional[int]:
+    """dHash of an encoded image (e.g. a JPEG thumbnail)"""
+    frames = _gray_thumbnails([
+        'ffmpeg', '-v', 'error', '-i', 'pipe:0',
+        '-vf', 'scale=9:8:flags=area,format=gray', '-frames:v', '1', '-f', 'rawvideo', 'pipe:1',
+    ], data)
+    return int(dhash(frames)[0]) if len(frames) else None
+
+
+def video_frame_hashes(path: str, samples: int = 8) -> np.ndarray:
+    """dHashes of `samples` frames spread evenly over the video"""
+    duration = max(get_duration(path), 0.1)
+    frames = _gray_thumbnails([
+        'ffmpeg', '-v', 'error', '-i', path,
+        '-vf', f'fps={samples / duration},scale=9:8:flags=area,format=gray',
+        '-frames:v', str(samples), '-f', 'rawvideo', 'pipe:1',
+    ])
+    return dhash(frames) if len(frames) else np.zeros(0, dtype=np.uint64)
+
+
+class HashIndex:
+    """Index of 64-bit hashes supporting "everything within max_distance bits" lookups.
+
+    Hashes are split into max_distance + 1 bands. Two hashes within max_distance bits must
+    agree exactly on at least one band (pigeonhole), so candidates come from band lookups
+    and only those are verified with a vectorized popcount.
+    """
+    def __init__(self, max_distance: int = 10):
+        self.max_distance = max_distance
+        bands = min(max_distance + 1, 64)
+        edges = np.linspace(0, 64, bands + 1).astype(int)
+        self._bands = [(int(lo), int(hi)) for lo, hi in zip(edges[:-1], edges[1:])]
+        self._tables: List[Dict[int, List[int]]] = [defaultdict(list) for _ in self._bands]
+        self.hashes: List[int] = []
+        self.owners: List[Hashable] = []
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _keys(self, value: int):
+        for lo, hi in self._bands:
+            yield (value >> lo) & ((1 << (hi - lo)) - 1)
+
+    def add(self, value: int, owner: Hashable):
+        position = len(self.hashes)
+        self.hashes.append(int(value))
+        self.owners.append(owner)
+        for table, key in zip(self._tables, self._keys(int(value))):
+            table[key].append(position)
+
+    def query(self, value: int, max_distance: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        """Return (owner, distance) for every stored hash within max_distance of value"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        candidates = set()
+        for table, key in zip(self._tables, self._keys(int(value))):
+            candidates.update(table.get(key, ()))
+        if not candidates:
+            return []
+        positions = np.fromiter(candidates, dtype=np.int64)
+        stored = np.array([self.hashes[p] for p in positions], dtype=np.uint64)
+        distances = hamming(stored, np.uint64(value))
+        close = distances <= max_distance
+        return [(self.owners[p], int(d)) for p, d in zip(positions[close], distances[close])]
+
+
+def normalize_title(title: str) -> frozenset:
+    words = re.findall(r'[a-z0-9]+', (title or '').lower())
+    return frozenset(word for word in words if word not in _TITLE_NOISE)
+
+
+class Deduplicator:
+    """Drops re-uploads of the same footage, first from search metadata and then from frames"""
+    def __init__(self, thumbnail_distance: int = 6, frame_distance: int = 10,
+                 frame_samples: int = 8, match_ratio: float = 0.6, title_similarity: float = 0.8):
+        self.thumbnail_distance = thumbnail_distance
+        self.frame_distance = frame_distance
+        self.frame_samples = frame_samples
+        self.match_ratio = match_ratio
+        self.title_similarity = title_similarity
+        self.thumbnails = HashIndex(thumbnail_distance)
+        self.frames = HashIndex(frame_distance)
+        self._titles: List[Tuple[frozenset, float, str]] = []
+
+    @classmethod
+    def from_config(cls, config_manager) -> Optional['Deduplicator']:
+        settings = config_manager.snapshot.dedupe
+        if not settings.enabled:
+            return None
+        return cls(settings.thumbnail_distance, settings.frame_distance,
+                   settings.frame_samples, settings.match_ratio, settings.title_similarity)
+
+    def _same_metadata(self, title_words: frozenset, duration: float) -> Optional[str]:
+        if not title_words:
+            return None
+        for words, other_duration, video_id in self._titles:
+            if abs(duration - other_duration) > 1.5:
+                continue
+            overlap = len(title_words & words) / len(title_words | words)
+            if overlap >= self.title_similarity:
+                return video_id
+        return None
+
+    def filter_candidates(self, candidates: List[dict], fetch_thumbnail=None) -> List[dict]:
+        """Keep search results whose title/duration and thumbnail don't match an earlier result.
+
+        Candidates are dicts with id, title, duration and thumbnail_url. fetch_thumbnail(url)
+        returns image bytes; thumbnails that can't be fetched are simply not compared.
+        """
+        kept = []
+        for candidate in candidates:
+            title_words = normalize_title(candidate.get('title'))
+            duration = float(candidate.get('duration') or 0)
+            duplicate_of = self._same_metadata(title_words, duration)
+
+            thumbnail = None
+            if duplicate_of is None and fetch_thumbnail and candidate.get('thumbnail_url'):
+                try:
+                    thumbnail = image_hash(fetch_thumbnail(candidate['thumbnail_url']))
+                except Exception as e:
+                    print(f"Warning: could not hash thumbnail for {candidate['id']}: {str(e)}")
+                if thumbnail is not None:
+                    matches = self.thumbnails.query(thumbnail)
+                    if matches:
+                        duplicate_of = min(matches, key=lambda match: match[1])[0]
+
+            if duplicate_of is not None:
+                print(f"Skipping {candidate['id']}: looks like a re-upload of {duplicate_of}")
+                continue
+            self._titles.append((title_words, duration, candidate['id']))
+            if thumbnail is not None:
+                self.thumbnails.add(thumbnail, candidate['id'])
+            kept.append(candidate)
+        return kept
+
+    def duplicate_of(self, clip_id: Hashable, path: str) -> Optional[Hashable]:
+        """Hash sampled frames of a downloaded clip; return the clip it duplicates or register it"""
+        with tracer.span('dedupe.frame_hashes', clip=str(clip_id)):
+            hashes = video_frame_hashes(path, self.frame_samples)
+        if not len(hashes):
+            return None
+
+        votes = Counter()
+        for value in hashes:
+            # One vote per earlier clip that has any frame close to this one
+            votes.update({owner for owner, _ in self.frames.query(int(value))})
+        if votes:
+            owner, count = votes.most_common(1)[0]
+            if count / len(hashes) >= self.match_ratio:
+                return owner
+
+        for value in hashes:
+            self.frames.add(int(value), clip_id)
+        return None
@@ -0,0 +1,496 @@
+import math
+import os
+import queue
+import subprocess
+import threading
+import traceback
+from multiprocessing import get_context, shared_memory
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.instrumentation import tracer
+
+_CHANNELS = 3  # rgb24
+# Elements per LUT pass; a multiple of 3 so every chunk starts on a red sample
+_LUT_CHUNK = 3 * (1 << 16)
+# Pipe buffer requested from the kernel for decoder/encoder pipes (Linux F_SETPIPE_SZ)
+_PIPE_SIZE = 1 << 20
+_F_SETPIPE_SZ = 1031
+
+# Constant quality for intermediate encodes; finished videos are sized by src.rate_control
+DEFAULT_VIDEO_ARGS = ('-c:v', 'libx264', '-preset', 'medium', '-crf', '20', '-pix_fmt', 'yuv420p')
+DEFAULT_AUDIO_ARGS = ('-c:a', 'aac')
+
+
+class Effect:
+    """An in-place transform of a batch of frames shaped (n, height, width, 3) uint8.
+
+    setup() runs once in each worker before any frames arrive and is where tables and
+    scratch buffers are allocated, so apply() never allocates per frame.
+    """
+    def setup(self, width: int, height: int, fps: float):
+        pass
+
+    def apply(self, frames: np.ndarray, first_frame: int, fps: float):
+        raise NotImplementedError
+
+    def __getstate__(self):
+        # Workers rebuild tables and scratch buffers in setup(), so only ship the settings
+        return {key: value for key, value in self.__dict__.items() if not key.startswith('_')}
+
+
+class _LutEffect(Effect):
+    """Base for effects that are a per-channel lookup table over pixel values"""
+    def setup(self, width: int, height: int, fps: float):
+        # Offsets into a (3 * 256,) table so one np.take handles all three channels
+        self._offsets = (np.arange(_LUT_CHUNK, dtype=np.intp) % _CHANNELS) * 256
+        self._index = np.empty(_LUT_CHUNK, dtype=np.intp)
+
+    def _apply_lut(self, flat: np.ndarray, lut: np.ndarray):
+        for start in range(0, flat.size, _LUT_CHUNK):
+            part = flat[start:start + _LUT_CHUNK]
+            index = self._index[:part.size]
+            np.add(part, self._offsets[:part.size], out=index)
+            np.take(lut, index, out=part, mode='clip')
+
+
+class ColorGrade(_LutEffect):
+    """Contrast, brightness, gamma and warmth baked into one lookup table"""
+    def __init__(self, contrast: float = 1.0, brightness: float = 0.0, gamma: float = 1.0, warmth: float = 0.0):
+        self.contrast = contrast
+        self.brightness = brightness
+        self.gamma = gamma
+        self.warmth = warmth
+
+    @property
+    def is_identity(self) -> bool:
+        return (self.contrast, self.brightness, self.gamma, self.warmth) == (1.0, 0.0, 1.0, 0.0)
+
+    def table(self) -> np.ndarray:
+        x = np.arange(256, dtype=np.float64) / 255
+        x = np.clip((x - 0.5) * self.contrast + 0.5 + self.brightness, 0, 1) ** (1 / self.gamma)
+        gains = np.array([1 + self.warmth, 1.0, 1 - self.warmth])
+        return np.clip(np.round(np.outer(gains, x) * 255), 0, 255).astype(np.uint8)
+
+    def setup(self, width: int, height: int, fps: float):
+        super().setup(width, height, fps)
+        self._lut = self.table().ravel()
+
+    def apply(self, frames: np.ndarray, first_frame: int, fps: float):
+        self._apply_lut(frames.reshape(-1), self._lut)
+
+
+def _beat_envelope(beats: np.ndarray, frame: int, fps: float, decay: float) -> float:
+    """1.0 on a beat, decaying exponentially until the next one"""
+    t = frame / fps
+    index = int(np.searchsorted(beats, t, side='right')) - 1
+    if index < 0:
+        return 0.0
+    return math.exp(-(t - beats[index]) / decay)
+
+
+class BeatFlash(_LutEffect):
+    """Brightens frames towards white on every beat"""
+    levels = 16
+
+    def __init__(self, beats: Sequence[float], strength: float = 0.3, decay: float = 0.12):
+        self.beats = np.asarray(sorted(beats), dtype=np.float64)
+        self.strength = strength
+        self.decay = decay
+
+    def setup(self, width: int, height: int, fps: float):
+        super().setup(width, height, fps)
+        values = np.arange(256, dtype=np.float64)
+        amounts = np.linspace(0, self.strength, self.levels)[:, None]
+        luts = np.round(values + (255 - values) * amounts).astype(np.uint8)
+        self._luts = np.tile(luts, (1, _CHANNELS))
+
+    def apply(self, frames: np.ndarray, first_frame: int, fps: float):
+        for offset, frame in enumerate(frames):
+            level = int(round(_beat_envelope(self.beats, first_frame + offset, fps, self.decay) * (self.levels - 1)))
+            if level:
+                self._apply_lut(frame.reshape(-1), self._luts[level])
+
+
+class BeatZoom(Effect):
+    """Punches in towards the centre on every beat (nearest-neighbour, precomputed index maps)"""
+    levels = 8
+
+    def __init__(self, beats: Sequence[float], amount: float = 0.05, decay: float = 0.15):
+        self.beats = np.asarray(sorted(beats), dtype=np.float64)
+        self.amount = amount
+        self.decay = decay
+
+    def setup(self, width: int, height: int, fps: float):
+        self._rows, self._cols = [], []
+        for level in range(self.levels):
+            scale = 1 + self.amount * level / (self.levels - 1)
+            self._rows.append(self._index_map(height, scale))
+            self._cols.append(self._index_map(width, scale))
+        self._scratch = np.empty((height, width, _CHANNELS), dtype=np.uint8)
+
+    @staticmethod
+    def _index_map(size: int, scale: float) -> np.ndarray:
+        centre = (size - 1) / 2
+        return np.clip(np.round(centre + (np.arange(size) - centre) / scale), 0, size - 1).astype(np.intp)
+
+    def apply(self, frames: np.ndarray, first_frame: int, fps: float):
+        for offset, frame in enumerate(frames):
+            level = int(round(_beat_envelope(self.beats, first_frame + offset, fps, self.decay) * (self.levels - 1)))
+            if level:
+                np.take(frame, self._rows[level], axis=0, out=self._scratch, mode='clip')
+                np.take(self._scratch, self._cols[level], axis=1, out=frame, mode='clip')
+
+
+class Overlay(Effect):
+    """Alpha-blends an RGBA image at (x, y) for frames between start and end seconds"""
+    def __init__(self, image: np.ndarray, x: int, y: int, start: float = 0.0, end: Optional[float] = None):
+        self.image = np.ascontiguousarray(image, dtype=np.uint8)
+        self.x = int(x)
+        self.y = int(y)
+        self.start = start
+        self.end = end
+
+    def setup(self, width: int, height: int, fps: float):
+        # Clip the image to the frame once
+        x0, y0 = max(self.x, 0), max(self.y, 0)
+        x1 = min(self.x + self.image.shape[1], width)
+        y1 = min(self.y + self.image.shape[0], height)
+        self._region = (slice(y0, y1), slice(x0, x1))
+        image = self.image[y0 - self.y:y1 - self.y, x0 - self.x:x1 - self.x]
+        # Alpha scaled to 0..256 so blending is a multiply, add and shift in uint16
+        alpha = image[..., 3:4].astype(np.uint16)
+        alpha += alpha >> 7
+        self._inverse = 256 - alpha
+        self._premultiplied = image[..., :3].astype(np.uint16) * alpha
+        self._scratch = np.empty(self._premultiplied.shape, dtype=np.uint16)
+        self._visible = self._scratch.size > 0
+
+    def apply(self, frames: np.ndarray, first_frame: int, fps: float):
+        if not self._visible:
+            return
+        for offset, frame in enumerate(frames):
+            t = (first_frame + offset) / fps
+            if t < self.start or (self.end is not None and t >= self.end):
+                continue
+            region = frame[self._region]
+            np.multiply(region, self._inverse, out=self._scratch)
+            np.add(self._scratch, self._premultiplied, out=self._scratch)
+            np.right_shift(self._scratch, 8, out=self._scratch)
+            np.copyto(region, self._scratch, casting='unsafe')
+
+
+def _load_font(fontsize: int):
+    from PIL import ImageFont
+    for name in ('Arial.ttf', 'arial.ttf', 'DejaVuSans.ttf', 'LiberationSans-Regular.ttf'):
+        try:
+            return ImageFont.truetype(name, fontsize)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=fontsize)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def render_text(text: str, fontsize: int, color: str, max_width: int) -> np.ndarray:
+    """Render word-wrapped, centred text to an RGBA array (replaces ImageMagick TextClip)"""
+    from PIL import Image, ImageDraw
+
+    font = _load_font(fontsize)
+    measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    lines = []
+    for paragraph in text.splitlines() or ['']:
+        line = ''
+        for word in paragraph.split():
+            candidate = f'{line} {word}'.strip()
+            if line and measure.textlength(candidate, font=font) > max_width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+
+    line_height = int(fontsize * 1.25)
+    width = max(1, max_width)
+    image = Image.new('RGBA', (width, max(1, line_height * len(lines))), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for row, line in enumerate(lines):
+        x = (width - measure.textlength(line, font=font)) / 2
+        draw.text((x, row * line_height), line, font=font, fill=color)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def text_overlay(text: str, frame_width: int, frame_height: int, fontsize: int = 24,
+                 color: str = 'white', position: str = 'bottom') -> Overlay:
+    """Overlay with the text wrapped to 80% of the frame width, placed like the old TextClip"""
+    image = render_text(text, fontsize, color, int(frame_width * 0.8))
+    x = (frame_width - image.shape[1]) // 2
+    if position == 'bottom':
+        y = int(frame_height * 0.8)
+    elif position == 'top':
+        y = int(frame_height * 0.1)
+    else:
+        y = (frame_height - image.shape[0]) // 2
+    return Overlay(image, x, y)
+
+
+def _enlarge_pipe(stream):
+    try:
+        import fcntl
+        fcntl.fcntl(stream.fileno(), _F_SETPIPE_SZ, _PIPE_SIZE)
+    except (ImportError, OSError, ValueError):
+        pass
+
+
+def _read_into(stream, view: memoryview) -> int:
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+def _write_all(stream, view: memoryview):
+    written = 0
+    while written < len(view):
+        written += stream.write(view[written:])
+
+
+def _apply_effects(effects, frames: np.ndarray, first_frame: int, fps: float):
+    for effect in effects:
+        effect.apply(frames, first_frame, fps)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        # Workers must not unlink the ring when they exit; the parent owns it (Python 3.13+)
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker(shm_name: str, shape: Tuple[int, ...], effects, fps: float, tasks, done):
+    """Worker process: apply effects in place to ring slots as their indices arrive"""
+    shm = _attach(shm_name)
+    ring = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        for effect in effects:
+            effect.setup(shape[3], shape[2], fps)
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            sequence, slot, first_frame, count = task
+            try:
+                _apply_effects(effects, ring[slot, :count], first_frame, fps)
+                done.put((sequence, slot, count, None))
+            except Exception:
+                done.put((sequence, slot, count, traceback.format_exc()))
+    finally:
+        del ring
+        shm.close()
+
+
+_END = -1
+
+
+class FrameEngine:
+    """Streams raw frames from an ffmpeg decoder through NumPy effects into an ffmpeg encoder.
+
+    Frames are read straight into a ring of preallocated batches in shared memory. Batches
+    are processed in place by worker processes (or by the reader thread when workers is 0)
+    and written to the encoder in order, so nothing is allocated per frame and decode,
+    effects and encode all run concurrently.
+    """
+    def __init__(self, width: int, height: int, fps: float, effects: Sequence[Effect] = (),
+                 workers: int = 0, batch_frames: int = 8, ring_slots: int = 0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.effects = list(effects)
+        self.workers = max(0, workers)
+        self.batch_frames = max(1, batch_frames)
+        # Enough slots that every worker has a batch while one is read and one is written
+        self.ring_slots = ring_slots or self.workers + 2
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.width * self.height * _CHANNELS
+
+    @property
+    def ring_bytes(self) -> int:
+        return self.ring_slots * self.batch_frames * self.frame_bytes
+
+    def process(self, decoder_cmd: List[str], encoder_cmd: List[str]) -> int:
+        """Run decoder -> effects -> encoder and return the number of frames written"""
+        shape = (self.ring_slots, self.batch_frames, self.height, self.width, _CHANNELS)
+        shm = shared_memory.SharedMemory(create=True, size=self.ring_bytes)
+        ring = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        processes = []
+        decoder = encoder = None
+        try:
+            if self.workers:
+                context = get_context('spawn')
+                tasks, done = context.Queue(), context.Queue()
+                for _ in range(self.workers):
+                    process = context.Process(target=_worker, daemon=True,
+                                              args=(shm.name, shape, self.effects, self.fps, tasks, done))
+                    process.start()
+                    processes.append(process)
+            else:
+                tasks, done = None, queue.Queue()
+                for effect in self.effects:
+                    effect.setup(self.width, self.height, self.fps)
+
+            decoder = tracer.popen(decoder_cmd, stdout=subprocess.PIPE, bufsize=0)
+            encoder = tracer.popen(encoder_cmd, stdin=subprocess.PIPE, bufsize=0)
+            _enlarge_pipe(decoder.stdout)
+            _enlarge_pipe(encoder.stdin)
+
+            free = queue.Queue()
+            for slot in range(self.ring_slots):
+                free.put(slot)
+            stop = threading.Event()
+            reader = threading.Thread(target=self._read, daemon=True,
+                                      args=(decoder.stdout, ring, free, tasks, done, stop))
+            reader.start()
+            try:
+                frames = self._write(encoder.stdin, ring, free, done, processes)
+            except BaseException:
+                stop.set()
+                decoder.kill()
+                raise
+            finally:
+                reader.join()
+                encoder.stdin.close()
+
+            decoder_code, encoder_code = decoder.wait(), encoder.wait()
+            if decoder_code != 0:
+                raise subprocess.CalledProcessError(decoder_code, decoder_cmd)
+            if encoder_code != 0:
+                raise subprocess.CalledProcessError(encoder_code, encoder_cmd)
+            return frames
+        finally:
+            for process in processes:
+                tasks.put(None)
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            for child in (decoder, encoder):
+                if child is not None and child.poll() is None:
+                    child.kill()
+                    child.wait()
+            del ring
+            shm.close()
+            shm.unlink()
+
+    def _read(self, stream, ring, free, tasks, done, stop):
+        """Reader thread: fill free slots from the decoder and hand them to the effects"""
+        sequence = first_frame = 0
+        try:
+            while not stop.is_set():
+                try:
+                    slot = free.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                filled = _read_into(stream, memoryview(ring[slot]).cast('B'))
+                count = filled // self.frame_bytes
+                if not count:
+                    break
+                if tasks is not None:
+                    tasks.put((sequence, slot, first_frame, count))
+                else:
+                    _apply_effects(self.effects, ring[slot, :count], first_frame, self.fps)
+                    done.put((sequence, slot, count, None))
+                sequence += 1
+                first_frame += count
+                if count < self.batch_frames:
+                    break
+            done.put((_END, sequence, 0, None))
+        except Exception:
+            done.put((_END, sequence, 0, traceback.format_exc()))
+
+    def _write(self, stream, ring, free, done, processes) -> int:
+        """Write processed batches to the encoder in decode order, returning slots to the ring"""
+        pending = {}
+        next_sequence = frames = 0
+        total = None
+        while total is None or next_sequence < total:
+            try:
+                sequence, slot, count, error = done.get(timeout=1.0)
+            except queue.Empty:
+                if any(not process.is_alive() for process in processes):
+                    raise RuntimeError("A frame worker exited unexpectedly")
+                continue
+            if error:
+                raise RuntimeError(f"Frame processing failed:\n{error}")
+            if sequence == _END:
+                total = slot
+                continue
+            pending[sequence] = (slot, count)
+            while next_sequence in pending:
+                slot, count = pending.pop(next_sequence)
+                _write_all(stream, memoryview(ring[slot, :count]).cast('B'))
+                free.put(slot)
+                next_sequence += 1
+                frames += count
+        return frames
+
+
+def decoder_command(input_path: str, width: int, height: int, fps: float,
+                    video_filter: Optional[str] = None, threads: int = 1) -> List[str]:
+    """ffmpeg reading input_path and writing width x height rgb24 frames at fps to stdout"""
+    filters = [f for f in (video_filter, f'fps={fps}', f'scale={width}:{height}') if f]
+    return [
+        'ffmpeg', '-v', 'error', '-threads', str(threads), '-i', input_path, '-an',
+        '-vf', ','.join(filters), '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1',
+    ]
+
+
+def encoder_command(output_path: str, width: int, height: int, fps: float, audio_source: Optional[str] = None,
+                    threads: int = 1, video_args: Sequence[str] = DEFAULT_VIDEO_ARGS,
+                    audio_args: Sequence[str] = DEFAULT_AUDIO_ARGS) -> List[str]:
+    """ffmpeg encoding rgb24 frames from stdin, taking audio (if any) from audio_source"""
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:0',
+    ]
+    if audio_source:
+        cmd += ['-i', audio_source, '-map', '0:v:0', '-map', '1:a:0?', *audio_args]
+    return cmd + [*video_args, '-threads', str(threads), output_path]
+
+
+def render_video(input_path: str, output_path: str, width: int, height: int, fps: float,
+                 effects: Sequence[Effect] = (), video_filter: Optional[str] = None, threads: int = 1,
+                 workers: int = 0, batch_frames: int = 8, video_args: Sequence[str] = DEFAULT_VIDEO_ARGS,
+                 audio_args: Sequence[str] = DEFAULT_AUDIO_ARGS) -> str:
+    """Re-encode input_path at width x height / fps, applying effects to the raw frames.
+
+    Geometry (video_filter, fps, scale) is done by ffmpeg while decoding. Without effects
+    the frames never leave ffmpeg: a single process runs the native filters and encoder.
+    """
+    name = os.path.basename(input_path)
+    if not effects:
+        filters = [f for f in (video_filter, f'fps={fps}', f'scale={width}:{height}') if f]
+        cmd = [
+            'ffmpeg', '-y', '-v', 'error', '-i', input_path, '-vf', ','.join(filters),
+            '-map', '0:v:0', '-map', '0:a:0?', *audio_args, *video_args, '-threads', str(threads), output_path,
+        ]
+        tracer.run(cmd, name='ffmpeg.render', check=True)
+        return output_path
+
+    engine = FrameEngine(width, height, fps, effects, workers=workers, batch_frames=batch_frames)
+    with tracer.span('frame_engine.render', category='subprocess', source=name,
+                     effects=[type(effect).__name__ for effect in effects], workers=workers) as span:
+        frames = engine.process(
+            decoder_command(input_path, width, height, fps, video_filter, threads=max(1, threads // 2)),
+            encoder_command(output_path, width, height, fps, audio_source=input_path, threads=threads,
+                            video_args=video_args, audio_args=audio_args),
+        )
+        span.set(frames=frames)
+    return output_path
@@ -0,0 +1,419 @@
+import contextvars
+import cProfile
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+_MAXRSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+# ru_inblock/ru_oublock count 512-byte blocks
+_BLOCK_SIZE = 512
+# Per-thread CPU and block IO counters (Linux only)
+_RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', None)
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+# Seconds between RSS samples while spans are open
+_RSS_INTERVAL = 0.05
+
+# Job whose spans are being recorded on this thread; set by Tracer.job()
+_current_job: contextvars.ContextVar = contextvars.ContextVar('tracer_job', default=None)
+
+# What each per-span metric measures, written into the summary
+METRICS = {
+    'cpu_time': "CPU seconds of the span's own thread plus the subprocesses it ran; "
+                "work handed to other threads is counted in their spans",
+    'process_cpu_time': "CPU seconds of the whole process and its reaped children while the span was open; "
+                        "includes concurrent spans and worker processes",
+    'peak_rss': "Subprocess spans: the child's own peak RSS. Other spans: the highest process RSS sampled "
+                "while the span was open, which includes memory held by concurrent spans",
+    'bytes_read': "Block IO read by the span's own thread plus its subprocesses (process-wide where "
+                  "per-thread counters are unavailable)",
+    'bytes_written': "Block IO written by the span's own thread plus its subprocesses (process-wide where "
+                     "per-thread counters are unavailable)",
+}
+
+
+class _NullSpan:
+    """Span returned when tracing is disabled; does nothing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _usage_snapshot() -> Dict[str, float]:
+    """Capture the calling thread's CPU and block IO, plus the process-wide CPU"""
+    times = os.times()
+    snapshot = {
+        'cpu': time.thread_time(),
+        'process_cpu': times.user + times.system + times.children_user + times.children_system,
+        'bytes_read': 0,
+        'bytes_written': 0,
+    }
+    if resource is not None:
+        own = resource.getrusage(_RUSAGE_THREAD if _RUSAGE_THREAD is not None else resource.RUSAGE_SELF)
+        snapshot['bytes_read'] = own.ru_inblock * _BLOCK_SIZE
+        snapshot['bytes_written'] = own.ru_oublock * _BLOCK_SIZE
+    return snapshot
+
+
+def _current_rss() -> int:
+    """Resident set size of this process right now, or 0 where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MeteredPopen(subprocess.Popen):
+    """Popen that reaps its child with wait4() and hands the child's own rusage to on_exit"""
+    def __init__(self, *args, on_exit: Optional[Callable[[Any], None]] = None, **kwargs):
+        self._on_exit = on_exit
+        super().__init__(*args, **kwargs)
+
+    def _try_wait(self, wait_flags):
+        if not hasattr(os, 'wait4'):
+            return super()._try_wait(wait_flags)
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # Reaped elsewhere (e.g. SIGCHLD is ignored); report success like Popen does
+            return self.pid, 0
+        if pid == self.pid and self._on_exit is not None:
+            self._on_exit(rusage)
+        return pid, status
+
+
+def _run(popen: Callable[..., subprocess.Popen], cmd, input=None, capture_output: bool = False,
+         timeout: Optional[float] = None, check: bool = False, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run() on a Popen factory, so the child can be reaped with its rusage"""
+    if input is not None:
+        kwargs['stdin'] = subprocess.PIPE
+    if capture_output:
+        kwargs['stdout'] = kwargs['stderr'] = subprocess.PIPE
+    with popen(cmd, **kwargs) as process:
+        try:
+            stdout, stderr = process.communicate(input, timeout=timeout)
+        except BaseException:
+            process.kill()
+            raise
+        returncode = process.wait()
+    if check and returncode:
+        raise subprocess.CalledProcessError(returncode, process.args, stdout, stderr)
+    return subprocess.CompletedProcess(process.args, returncode, stdout, stderr)
+
+
+class _Span:
+    """An active trace span that records metrics when it exits"""
+    def __init__(self, tracer: 'Tracer', name: str, category: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.profiler: Optional[cProfile.Profile] = None
+        self.peak_rss = 0
+        # Usage of subprocesses reaped while the span was open on its thread
+        self.child_cpu = 0.0
+        self.child_peak_rss = 0
+        self.child_bytes_read = 0
+        self.child_bytes_written = 0
+
+    def set(self, **args):
+        """Attach extra key/value pairs to the span (e.g. exit codes)"""
+        self.args.update(args)
+
+    def observe_rss(self, rss: int):
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+
+    def add_child(self, rusage):
+        self.child_cpu += rusage.ru_utime + rusage.ru_stime
+        self.child_peak_rss = max(self.child_peak_rss, rusage.ru_maxrss * _MAXRSS_SCALE)
+        self.child_bytes_read += rusage.ru_inblock * _BLOCK_SIZE
+        self.child_bytes_written += rusage.ru_oublock * _BLOCK_SIZE
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if self.tracer.profile and self.category == 'stage' and not stack:
+            self.profiler = cProfile.Profile()
+        stack.append(self)
+        self.observe_rss(_current_rss())
+        self.tracer._open(self)
+        self.start_usage = _usage_snapshot()
+        self.start = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler is not None:
+            self.profiler.disable()
+        end = time.perf_counter()
+        end_usage = _usage_snapshot()
+        self.observe_rss(_current_rss())
+        self.tracer._close(self)
+        self.tracer._stack().pop()
+
+        if exc_type is not None:
+            self.args['error'] = f"{exc_type.__name__}: {exc}"
+        record = {
+            'name': self.name,
+            'category': self.category,
+            'start': self.start - self.tracer.origin,
+            'wall_time': end - self.start,
+            'cpu_time': end_usage['cpu'] - self.start_usage['cpu'] + self.child_cpu,
+            'process_cpu_time': end_usage['process_cpu'] - self.start_usage['process_cpu'],
+            'peak_rss': self.child_peak_rss if self.category == 'subprocess' else self.peak_rss,
+            'bytes_read': end_usage['bytes_read'] - self.start_usage['bytes_read'] + self.child_bytes_read,
+            'bytes_written': end_usage['bytes_written'] - self.start_usage['bytes_written'] + self.child_bytes_written,
+            'thread_id': threading.get_ident(),
+            'args': self.args,
+        }
+        job_id = _current_job.get()
+        if job_id is not None:
+            record['job_id'] = job_id
+        if self.profiler is not None:
+            record['profile'] = self.tracer._dump_profile(self.name, self.profiler)
+        self.tracer._record(record)
+        return False
+
+
+class Tracer:
+    """Records per-stage timing and resource usage and exports it as JSON and Chrome trace events.
+
+    When disabled, span() returns a shared no-op object and run() is a plain subprocess.run().
+    """
+    def __init__(self, enabled: bool = False, output_directory: str = './traces', profile: bool = False):
+        self.configure(enabled, output_directory, profile)
+
+    def configure(self, enabled: bool, output_directory: str = './traces', profile: bool = False):
+        """(Re)configure the tracer in place so existing imports see the change"""
+        self.enabled = enabled
+        self.output_directory = output_directory
+        self.profile = profile
+        self.origin = time.perf_counter()
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profile_ids = itertools.count()
+        self._open_spans: set = set()
+        self._sampler: Optional[threading.Thread] = None
+        # Start offset of every job currently inside job()
+        self._jobs: Dict[str, float] = {}
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _open(self, span: _Span):
+        with self._lock:
+            self._open_spans.add(span)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_rss, name='tracer-rss', daemon=True)
+                self._sampler.start()
+
+    def _close(self, span: _Span):
+        with self._lock:
+            self._open_spans.discard(span)
+
+    def _sample_rss(self):
+        """Sampler thread: feed the process RSS to every open span until none are left"""
+        while True:
+            with self._lock:
+                spans = list(self._open_spans)
+                if not spans:
+                    self._sampler = None
+                    return
+            rss = _current_rss()
+            for span in spans:
+                span.observe_rss(rss)
+            time.sleep(_RSS_INTERVAL)
+
+    def _child_exited(self, rusage):
+        # Subprocess usage counts towards every span open on the thread that reaped it
+        for span in self._stack():
+            span.add_child(rusage)
+
+    def popen(self, cmd, **kwargs) -> subprocess.Popen:
+        """subprocess.Popen() whose child's CPU, peak RSS and IO are added to the open spans when it is reaped"""
+        if not self.enabled:
+            return subprocess.Popen(cmd, **kwargs)
+        return MeteredPopen(cmd, on_exit=self._child_exited, **kwargs)
+
+    def _record(self, record: Dict[str, Any]):
+        with self._lock:
+            self.records.append(record)
+
+    def _dump_profile(self, name: str, profiler: cProfile.Profile) -> str:
+        profile_dir = os.path.join(self.output_directory, 'profiles')
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{name}-{next(self._profile_ids)}.prof")
+        profiler.dump_stats(path)
+        return path
+
+    def span(self, name: str, category: str = 'stage', **args):
+        """Context manager that records a span around a block of work"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    @contextmanager
+    def job(self, job_id: str, prefix: str = 'job'):
+        """Write a report for one job of a long-running process and drop its records afterwards.
+
+        Spans opened on the job's thread are tagged with job_id. Untagged spans from other threads
+        (shared workers) are included when they overlap the job, and are dropped once no running
+        job can still claim them.
+        """
+        if not self.enabled:
+            yield
+            return
+        token = _current_job.set(job_id)
+        start = time.perf_counter() - self.origin
+        with self._lock:
+            self._jobs[job_id] = start
+        try:
+            yield
+        finally:
+            _current_job.reset(token)
+            end = time.perf_counter() - self.origin
+            with self._lock:
+                del self._jobs[job_id]
+                oldest = min(self._jobs.values(), default=end)
+                records, kept = [], []
+                for record in self.records:
+                    tag = record.get('job_id')
+                    overlaps = record['start'] < end and record['start'] + record['wall_time'] > start
+                    if tag == job_id or (tag is None and overlaps):
+                        records.append(record)
+                    if tag != job_id and not (tag is None and record['start'] + record['wall_time'] <= oldest):
+                        kept.append(record)
+                self.records = kept
+            self.write_reports(f"{prefix}-{job_id}", records)
+
+    def run(self, cmd, name: Optional[str] = None, **kwargs) -> subprocess.CompletedProcess:
+        """subprocess.run() wrapper that records the call and its exit code"""
+        if not self.enabled:
+            return subprocess.run(cmd, **kwargs)
+        if name is None:
+            program = cmd.split()[0] if isinstance(cmd, str) else cmd[0]
+            name = os.path.basename(str(program))
+        with self.span(name, category='subprocess') as span:
+            try:
+                result = _run(self.popen, cmd, **kwargs)
+            except subprocess.CalledProcessError as e:
+                span.set(exit_code=e.returncode)
+                raise
+            span.set(exit_code=result.returncode)
+            return result
+
+    def summary(self, records: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Aggregate recorded spans (all of them by default) by name"""
+        if records is None:
+            with self._lock:
+                records = list(self.records)
+        totals: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            entry = totals.setdefault(record['name'], {
+                'category': record['category'],
+                'count': 0,
+                'wall_time': 0.0,
+                'cpu_time': 0.0,
+                'process_cpu_time': 0.0,
+                'peak_rss': 0,
+                'bytes_read': 0,
+                'bytes_written': 0,
+                'exit_codes': [],
+            })
+            entry['count'] += 1
+            entry['wall_time'] += record['wall_time']
+            entry['cpu_time'] += record['cpu_time']
+            entry['process_cpu_time'] += record['process_cpu_time']
+            entry['peak_rss'] = max(entry['peak_rss'], record['peak_rss'])
+            entry['bytes_read'] += record['bytes_read']
+            entry['bytes_written'] += record['bytes_written']
+            if 'exit_code' in record['args']:
+                entry['exit_codes'].append(record['args']['exit_code'])
+        return {'metrics': METRICS, 'stages': totals, 'spans': records}
+
+    def chrome_trace(self, records: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Convert recorded spans to the Chrome trace-event format (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        if records is None:
+            with self._lock:
+                records = list(self.records)
+        events = []
+        for record in records:
+            args = dict(record['args'])
+            for key in ('cpu_time', 'process_cpu_time', 'peak_rss', 'bytes_read', 'bytes_written'):
+                args[key] = record[key]
+            events.append({
+                'name': record['name'],
+                'cat': record['category'],
+                'ph': 'X',
+                'ts': record['start'] * 1e6,
+                'dur': record['wall_time'] * 1e6,
+                'pid': pid,
+                'tid': record['thread_id'],
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_reports(self, prefix: str = 'run', records: Optional[List[Dict[str, Any]]] = None) -> Optional[tuple]:
+        """Write <prefix>-summary.json and <prefix>-trace.json to the output directory"""
+        if not self.enabled:
+            return None
+        os.makedirs(self.output_directory, exist_ok=True)
+        summary_path = os.path.join(self.output_directory, f"{prefix}-summary.json")
+        trace_path = os.path.join(self.output_directory, f"{prefix}-trace.json")
+        with open(summary_path, 'w') as f:
+            json.dump(self.summary(records), f, indent=2, default=str)
+        with open(trace_path, 'w') as f:
+            json.dump(self.chrome_trace(records), f, default=str)
+        print(f"Trace summary written to: {summary_path}")
+        print(f"Chrome trace written to: {trace_path}")
+        return summary_path, trace_path
+
+
+# Process-wide tracer; configure it via tracer.configure() so all modules share it
+tracer = Tracer()
+
+
+def configure_tracer(config_manager) -> Tracer:
+    """Configure the shared tracer from config"""
+    tracer.configure(
+        config_manager.tracing_enabled,
+        config_manager.tracing_output_directory,
+        config_manager.tracing_profile,
+    )
+    return tracer
+
+
+@contextmanager
+def traced_run(config_manager, prefix: str = 'run'):
+    """Configure the shared tracer from config and write reports when the block exits"""
+    configure_tracer(config_manager)
+    try:
+        yield tracer
+    finally:
+        tracer.write_reports(prefix)
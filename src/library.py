@@ -0,0 +1,269 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from src.instrumentation import tracer
+from src.scheduler import TaskCost, scheduler
+from src.segment_cache import content_hash
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v', '.mkv', '.webm', '.avi')
+# Frames per second sampled for the motion feature, and their size
+_MOTION_FPS = 4
+_MOTION_SIZE = (64, 36)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS clips (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    aspect REAL NOT NULL,
+    fps REAL NOT NULL,
+    codec TEXT,
+    content_hash TEXT,
+    motion REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS clips_duration ON clips (duration);
+CREATE INDEX IF NOT EXISTS clips_aspect ON clips (aspect);
+CREATE INDEX IF NOT EXISTS clips_motion ON clips (motion);
+CREATE INDEX IF NOT EXISTS clips_content_hash ON clips (content_hash);
+'''
+
+
+@dataclass(frozen=True)
+class ClipRecord:
+    path: str
+    size: int
+    mtime_ns: int
+    duration: float
+    width: int
+    height: int
+    aspect: float
+    fps: float
+    codec: Optional[str]
+    content_hash: Optional[str]
+    motion: Optional[float]
+    indexed_at: float
+
+    def as_probe(self) -> dict:
+        """Same shape as video_processing.probe_video"""
+        return {'width': self.width, 'height': self.height, 'fps': self.fps, 'duration': self.duration}
+
+
+_COLUMNS = ', '.join(f.name for f in fields(ClipRecord))
+
+
+def probe_clip(path: str) -> dict:
+    """Duration, resolution, fps and codec of a clip from one ffprobe call"""
+    cmd = [
+        'ffprobe', '-v', 'quiet', '-print_format', 'json', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,r_frame_rate,codec_name:format=duration', path,
+    ]
+    result = tracer.run(cmd, name='ffprobe.library', capture_output=True, text=True)
+    data = json.loads(result.stdout or '{}')
+    stream = (data.get('streams') or [{}])[0]
+    rate = stream.get('r_frame_rate', '0/1').split('/')
+    return {
+        'width': int(stream.get('width', 0)),
+        'height': int(stream.get('height', 0)),
+        'fps': float(rate[0]) / float(rate[1]) if len(rate) == 2 and float(rate[1]) else 0.0,
+        'codec': stream.get('codec_name'),
+        'duration': float(data.get('format', {}).get('duration', 0)),
+    }
+
+
+def motion_score(path: str) -> float:
+    """Mean absolute change between consecutive low-res gray frames, 0 (static) to 1"""
+    width, height = _MOTION_SIZE
+    cmd = [
+        'ffmpeg', '-v', 'error', '-threads', '1', '-i', path, '-an',
+        '-vf', f'fps={_MOTION_FPS},scale={width}:{height}:flags=area,format=gray',
+        '-f', 'rawvideo', 'pipe:1',
+    ]
+    result = tracer.run(cmd, name='ffmpeg.motion', capture_output=True, check=True)
+    frames = np.frombuffer(result.stdout, dtype=np.uint8)
+    frames = frames[:len(frames) - len(frames) % (width * height)].reshape(-1, height * width)
+    if len(frames) < 2:
+        return 0.0
+    changes = np.abs(np.diff(frames.astype(np.int16), axis=0))
+    return float(changes.mean() / 255)
+
+
+def iter_video_files(paths: Iterable[str]) -> Iterable[str]:
+    """Expand directories (recursively) into the video files they contain"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, directories, files in os.walk(path):
+                directories.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(VIDEO_EXTENSIONS) and not name.startswith('.'):
+                        yield os.path.abspath(os.path.join(root, name))
+        elif path:
+            yield os.path.abspath(path)
+
+
+class ClipLibrary:
+    """SQLite index of local clips, refreshed incrementally by (size, mtime).
+
+    Each clip is probed and analyzed once; later scans only stat the files, and clip
+    selection runs as an indexed query instead of opening every file.
+    """
+    def __init__(self, database: str, workers: int = 0, analyze_motion: bool = True):
+        directory = os.path.dirname(os.path.abspath(database))
+        os.makedirs(directory, exist_ok=True)
+        self.database = database
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.analyze_motion = analyze_motion
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _row(self, path: str) -> Optional[ClipRecord]:
+        with self._lock:
+            row = self._connection.execute(f'SELECT {_COLUMNS} FROM clips WHERE path = ?', (path,)).fetchone()
+        return ClipRecord(*row) if row else None
+
+    def _analyze(self, path: str, stat: os.stat_result) -> Optional[ClipRecord]:
+        with scheduler.acquire(TaskCost(1, 64), 'library.index'), tracer.span('library.analyze', category='library'):
+            info = probe_clip(path)
+            if not info['width'] or not info['height']:
+                print(f"Warning: Skipping file without a video stream: {path}")
+                return None
+            motion = None
+            if self.analyze_motion:
+                try:
+                    motion = motion_score(path)
+                except Exception as e:
+                    print(f"Warning: could not measure motion for {path}: {str(e)}")
+            return ClipRecord(
+                path=path, size=stat.st_size, mtime_ns=int(stat.st_mtime_ns),
+                duration=info['duration'], width=info['width'], height=info['height'],
+                aspect=info['width'] / info['height'], fps=info['fps'], codec=info['codec'],
+                content_hash=content_hash(path), motion=motion, indexed_at=time.time(),
+            )
+
+    def _store(self, records: Sequence[ClipRecord]):
+        placeholders = ', '.join('?' for _ in fields(ClipRecord))
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f'INSERT OR REPLACE INTO clips ({_COLUMNS}) VALUES ({placeholders})',
+                [tuple(getattr(record, f.name) for f in fields(ClipRecord)) for record in records]
+            )
+
+    def scan(self, paths: Sequence[str]) -> dict:
+        """Index every video under paths; unchanged files are skipped and deleted ones dropped"""
+        with tracer.span('library.scan', category='library') as span:
+            with self._lock:
+                known = {path: (size, mtime_ns) for path, size, mtime_ns
+                         in self._connection.execute('SELECT path, size, mtime_ns FROM clips')}
+            seen, stale = set(), []
+            roots = []
+            for path in paths:
+                if os.path.isdir(path):
+                    roots.append(os.path.join(os.path.abspath(path), ''))
+            for path in iter_video_files(paths):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                seen.add(path)
+                if known.get(path) != (stat.st_size, int(stat.st_mtime_ns)):
+                    stale.append((path, stat))
+
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                records = [record for record in pool.map(lambda item: self._analyze(*item), stale) if record]
+            self._store(records)
+
+            # Files that disappeared from a scanned directory leave the index too
+            removed = [path for path in known
+                       if path not in seen and any(path.startswith(root) for root in roots)]
+            with self._lock, self._connection:
+                self._connection.executemany('DELETE FROM clips WHERE path = ?', [(path,) for path in removed])
+
+            stats = {'files': len(seen), 'indexed': len(records), 'unchanged': len(seen) - len(stale), 'removed': len(removed)}
+            span.set(**stats)
+        print(f"Clip library: {stats['files']} files, {stats['indexed']} newly indexed, {stats['removed']} removed")
+        return stats
+
+    def lookup(self, path: str) -> Optional[ClipRecord]:
+        """Indexed record for a file if it is still up to date (a stat, no probing)"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        record = self._row(path)
+        if record and (record.size, record.mtime_ns) == (stat.st_size, int(stat.st_mtime_ns)):
+            return record
+        return None
+
+    def query(self, paths: Optional[Iterable[str]] = None, min_duration: Optional[float] = None,
+              max_duration: Optional[float] = None, max_aspect: Optional[float] = None,
+              min_aspect: Optional[float] = None, min_motion: Optional[float] = None,
+              min_height: Optional[int] = None, codec: Optional[str] = None,
+              order_by: str = 'path', limit: Optional[int] = None) -> List[ClipRecord]:
+        """Indexed clips matching every given condition.
+
+        paths restricts results to those files and directories. Portrait-friendly clips are
+        max_aspect=1.0 (width / height); "high motion" is roughly min_motion=0.08.
+        """
+        conditions, values = [], []
+        for column, operator, value in (
+            ('duration', '>=', min_duration), ('duration', '<=', max_duration),
+            ('aspect', '<=', max_aspect), ('aspect', '>=', min_aspect),
+            ('motion', '>=', min_motion), ('height', '>=', min_height), ('codec', '=', codec),
+        ):
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                values.append(value)
+        if paths is not None:
+            scopes = []
+            for path in paths:
+                path = os.path.abspath(path)
+                if os.path.isdir(path):
+                    # Prefix match on the primary key, still an index range scan
+                    prefix = os.path.join(path, '')
+                    scopes.append('(path >= ? AND path < ?)')
+                    values.extend([prefix, prefix + '\U0010ffff'])
+                else:
+                    scopes.append('path = ?')
+                    values.append(path)
+            conditions.append('(' + (' OR '.join(scopes) or '0') + ')')
+        if order_by not in ('path', 'duration', 'motion', 'indexed_at'):
+            raise ValueError(f"Cannot order clips by {order_by}")
+        direction = ' DESC' if order_by == 'motion' else ''
+        sql = f'SELECT {_COLUMNS} FROM clips'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY {order_by}{direction}'
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        with self._lock:
+            return [ClipRecord(*row) for row in self._connection.execute(sql, values)]
+
+
+@lru_cache(maxsize=None)
+def get_library(database: str) -> ClipLibrary:
+    """One shared library per database file for the whole process"""
+    return ClipLibrary(database)
+
+
+def library_from_config(config_manager) -> Optional[ClipLibrary]:
+    settings = config_manager.snapshot.library
+    return get_library(settings.database) if settings.enabled else None
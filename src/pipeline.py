@@ -0,0 +1,189 @@
+import contextlib
+import os
+import shutil
+import threading
+from typing import Optional
+from src.video_processing import (
+    prepare_video_clips,
+    generate_music_video,
+    add_lyrics_overlay,
+    apply_effects,
+    build_effects,
+    fit_to_size,
+    profile_outputs
+)
+from src.audio_processing import transcribe_audio
+from src.utils import check_cancelled, JobCancelled
+from src.config_manager import ConfigManager
+from src.instrumentation import tracer
+from src.audio_asset import load_audio_asset, release_audio_asset
+from src.audio_cache import AudioCache
+from src.rate_control import RateControl
+from src.workspace import Workspace, job_workspace
+
+def run_pipeline(config_manager: ConfigManager, input_data, audio_file: str,
+                 cancel_event: Optional[threading.Event] = None, publish: bool = True) -> str:
+    """Run clip preparation, generation and lyrics overlay and return the saved video path.
+
+    cancel_event is checked between stages so a daemon job can be cancelled cooperatively.
+    With publish=False the caller is responsible for posting the returned video.
+    """
+    # Every intermediate lives in the job's workspace, which is removed however the job ends
+    with job_workspace(config_manager) as workspace:
+        # Decode the song once; duration, chunking, compression and separation read this buffer.
+        # Cached songs keep their decode next to the original stream for the next run; other
+        # decodes are job intermediates
+        cache = AudioCache.from_config(config_manager)
+        cached = cache is not None and cache.owns(audio_file)
+        with cache.hold(audio_file) if cached else contextlib.nullcontext():
+            load_audio_asset(audio_file, cache.entry_for(audio_file) if cached else workspace.directory('audio'))
+            try:
+                return _run_stages(config_manager, input_data, audio_file, workspace, cancel_event, publish)
+            finally:
+                release_audio_asset(audio_file, delete=not cached)
+                if cached:
+                    cache.evict()
+
+def _run_stages(config_manager: ConfigManager, input_data, audio_file: str, workspace: Workspace,
+                cancel_event: Optional[threading.Event], publish: bool) -> str:
+    # Add status message
+    print(f"Searching for '{input_data}' clips for audio file at '{audio_file}'...")
+    
+    # Prepare video clips (either from YouTube or manual input)
+    with tracer.span('prepare_video_clips'):
+        from src.config import YOUTUBE_API_KEY
+        clips = prepare_video_clips(
+            config_manager,
+            prompt=input_data if config_manager.use_youtube_search else None,
+            video_paths=input_data if not config_manager.use_youtube_search else None,
+            api_key=YOUTUBE_API_KEY if config_manager.use_youtube_search else None
+        )
+    
+    print("Clips:", clips)
+    check_cancelled(cancel_event)
+    workspace.check_quota()
+    
+    # Generate music video
+    with tracer.span('generate_music_video'):
+        edited_video = generate_music_video(clips, audio_file, config_manager)
+    
+    # Color grade and beat effects are applied in the same frame pass as the lyrics
+    effects = build_effects(config_manager, audio_file)
+    video_config = dict(config_manager.get_video_processing_config())
+    video_config['final_video_filename'] = workspace.path(video_config['final_video_filename'])
+    rate_control = RateControl.from_config(config_manager)
+    engine_options = {
+        'workers': config_manager.effects_workers,
+        'batch_frames': config_manager.effects_batch_frames,
+        'rate_control': rate_control,
+    }
+    
+    final_video = edited_video
+    lyrics = None
+    # Only process lyrics if enabled in config
+    if config_manager.enable_lyrics:
+        check_cancelled(cancel_event)
+        try:
+            # Get lyrics using Whisper
+            with tracer.span('transcribe_audio'):
+                lyrics = transcribe_audio(audio_file, config_manager)
+            
+            check_cancelled(cancel_event)
+            # Add lyrics overlay with configuration
+            with tracer.span('add_lyrics_overlay'):
+                final_video = add_lyrics_overlay(
+                    edited_video, 
+                    lyrics, 
+                    video_config,
+                    effects,
+                    **engine_options
+                )
+        except JobCancelled:
+            raise
+        except Exception as e:
+            print(f"Warning: Lyrics processing failed: {str(e)}")
+            print("Continuing without lyrics overlay...")
+    
+    if effects and final_video == edited_video:
+        check_cancelled(cancel_event)
+        with tracer.span('apply_effects'):
+            final_video = apply_effects(
+                edited_video,
+                effects,
+                video_config['final_video_filename'],
+                **engine_options
+            )
+    
+    if config_manager.output_profiles:
+        check_cancelled(cancel_event)
+        with tracer.span('finish_variants'):
+            finish_variants(config_manager, lyrics, effects, engine_options)
+    
+    # First, ensure output directory exists
+    if not os.path.exists(config_manager.output_directory):
+        os.makedirs(config_manager.output_directory)
+
+    # Save final video; with output profiles the first one is the primary video
+    final_video_path = profile_outputs(config_manager)[0][1]
+    try:
+        # The native renderer already writes into the output directory
+        if os.path.abspath(final_video) != os.path.abspath(final_video_path):
+            if os.path.exists(final_video_path):
+                os.remove(final_video_path)  # Remove existing file if present
+            shutil.copy2(final_video, final_video_path)
+            print(f"Video forcefully copied to: {final_video_path}")
+    except Exception as e:
+        # The render lives in the job's workspace and goes away with it, so this is fatal
+        print(f"Error saving video to output directory: {str(e)}")
+        raise
+    
+    # Every rendition must fit the byte budget before anything is uploaded
+    check_cancelled(cancel_event)
+    with tracer.span('fit_to_size'):
+        for path in [final_video_path] + [variant for _, variant in profile_outputs(config_manager)[1:]]:
+            if os.path.exists(path):
+                fit_to_size(path, rate_control)
+    
+    if publish:
+        publish_video(config_manager, final_video_path, input_data)
+    
+    # Downloaded clips and renders are removed with the workspace; local clips are the user's own
+    return final_video_path
+
+def finish_variants(config_manager: ConfigManager, lyrics: Optional[str], effects: list, engine_options: dict):
+    """Burn the same lyrics and effects into the extra output profiles, in place"""
+    video_config = config_manager.get_video_processing_config()
+    for _, variant in profile_outputs(config_manager)[1:]:
+        if not os.path.exists(variant):
+            continue
+        stem, extension = os.path.splitext(variant)
+        temporary = f'{stem}.partial{extension}'
+        try:
+            if lyrics:
+                result = add_lyrics_overlay(variant, lyrics, {**video_config, 'final_video_filename': temporary},
+                                            effects, **engine_options)
+            elif effects:
+                result = apply_effects(variant, effects, temporary, **engine_options)
+            else:
+                continue
+            if result != variant:
+                os.replace(result, variant)
+            print(f"Finished output profile: {variant}")
+        except Exception as e:
+            print(f"Warning: could not finish {variant}: {str(e)}")
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+def publish_video(config_manager: ConfigManager, final_video_path: str, input_data):
+    """Post the finished video to TikTok if configured, otherwise report where it was saved"""
+    # Post to TikTok only if configured to do so
+    if config_manager.should_post_to_social:
+        from src.social_media import post_to_tiktok
+        title = f"AI-generated music video for: {input_data if config_manager.use_youtube_search else 'custom clips'}"
+        with tracer.span('post_to_tiktok'):
+            success = post_to_tiktok(final_video_path, title, config_manager.max_video_bytes)
+        if not success:
+            print("Failed to post video to TikTok")
+    else:
+        print(f"Video saved to: {final_video_path}")
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from src.instrumentation import tracer
+from src.segment_cache import content_hash
+
+# Share of the byte budget kept back for container overhead and rate control error
+_SIZE_MARGIN = 0.04
+# Lowest video bitrate a budget is allowed to ask for, in bits per second
+_MIN_VIDEO_BITRATE = 64_000
+# Quality of the encodes feeding a two-pass final encode; they are re-encoded once more
+_MEZZANINE_CRF = '18'
+
+
+def target_bitrate(max_bytes: int, duration: float, audio_bitrate: int) -> int:
+    """Video bits per second that fit duration seconds of video plus audio into max_bytes"""
+    if duration <= 0:
+        raise ValueError(f"Cannot size an encode for a duration of {duration}s")
+    total = max_bytes * 8 * (1 - _SIZE_MARGIN) / duration
+    return max(_MIN_VIDEO_BITRATE, int(total - audio_bitrate))
+
+
+@dataclass(frozen=True)
+class RateControl:
+    """How finished videos are encoded so they land just under a byte budget.
+
+    capped_crf encodes at constant quality but caps the rate at the budget's bitrate, so
+    simple content comes out small and complex content cannot overshoot. two_pass encodes
+    the earlier stages at high quality and fits the finished video with a two-pass encode
+    whose first-pass statistics are cached by content. bitrate is the old fixed rate.
+    """
+    mode: str = 'capped_crf'
+    max_bytes: int = 250 * 1024 * 1024
+    crf: int = 20
+    bitrate: str = '8000k'
+    preset: str = 'medium'
+    audio_bitrate: int = 128_000
+    passlog_directory: str = './cache/passlogs'
+
+    @classmethod
+    def from_config(cls, config_manager) -> 'RateControl':
+        settings = config_manager.snapshot.rate_control
+        return cls(
+            mode=settings.mode,
+            max_bytes=config_manager.max_video_bytes,
+            crf=settings.crf,
+            bitrate=settings.bitrate,
+            preset=settings.preset,
+            audio_bitrate=settings.audio_bitrate_kbps * 1000,
+            passlog_directory=settings.passlog_directory,
+        )
+
+    def video_args(self, duration: Optional[float]) -> Tuple[str, ...]:
+        """libx264 arguments for a finished video of duration seconds"""
+        args = ('-c:v', 'libx264', '-preset', self.preset)
+        if self.mode == 'bitrate' or not duration:
+            return args + ('-b:v', self.bitrate, '-pix_fmt', 'yuv420p')
+        if self.mode == 'two_pass':
+            return args + ('-crf', _MEZZANINE_CRF, '-pix_fmt', 'yuv420p')
+        rate = target_bitrate(self.max_bytes, duration, self.audio_bitrate)
+        return args + ('-crf', str(self.crf), '-maxrate', str(rate), '-bufsize', str(rate * 2), '-pix_fmt', 'yuv420p')
+
+    def audio_args(self) -> Tuple[str, ...]:
+        return ('-c:a', 'aac', '-b:a', str(self.audio_bitrate))
+
+    def passlog_prefix(self, input_path: str) -> str:
+        """Cached first-pass statistics for input_path.
+
+        The first pass runs at constant quality, so its statistics do not depend on the target
+        bitrate and serve any budget.
+        """
+        key = hashlib.sha256(f'{content_hash(input_path)}:libx264:{self.preset}:{self.crf}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.passlog_directory, key[:32])
+
+    def first_pass(self, input_path: str, threads: int = 1) -> str:
+        """Run (or reuse) the analysis pass and return its passlog prefix"""
+        prefix = self.passlog_prefix(input_path)
+        if os.path.exists(prefix + '-0.log'):
+            return prefix
+        os.makedirs(self.passlog_directory, exist_ok=True)
+        temporary = os.path.join(self.passlog_directory, f'.tmp-{uuid.uuid4().hex}')
+        cmd = [
+            'ffmpeg', '-y', '-v', 'error', '-i', input_path, '-map', '0:v:0', '-an',
+            '-c:v', 'libx264', '-preset', self.preset, '-crf', str(self.crf),
+            '-pass', '1', '-passlogfile', temporary, '-pix_fmt', 'yuv420p', '-threads', str(threads),
+            '-f', 'null', os.devnull,
+        ]
+        try:
+            tracer.run(cmd, name='ffmpeg.first_pass', check=True)
+            # The statistics file is published last, since its presence marks the entry complete
+            if os.path.exists(temporary + '-0.log.mbtree'):
+                os.replace(temporary + '-0.log.mbtree', prefix + '-0.log.mbtree')
+            os.replace(temporary + '-0.log', prefix + '-0.log')
+        finally:
+            for suffix in ('-0.log', '-0.log.mbtree', '-0.log.temp', '-0.log.mbtree.temp'):
+                if os.path.exists(temporary + suffix):
+                    os.remove(temporary + suffix)
+        return prefix
+
+    def encode_to_size(self, input_path: str, output_path: str, duration: float, threads: int = 1) -> str:
+        """Two-pass encode input_path so output_path fits in max_bytes.
+
+        If the result still overshoots, the second pass is repeated at a proportionally lower
+        bitrate; the cached first pass makes each retry a single encode.
+        """
+        rate = target_bitrate(self.max_bytes, duration, self.audio_bitrate)
+        with tracer.span('rate_control.encode_to_size', category='subprocess', budget=self.max_bytes) as span:
+            prefix = self.first_pass(input_path, threads)
+            for attempt in range(3):
+                cmd = [
+                    'ffmpeg', '-y', '-v', 'error', '-i', input_path, '-map', '0:v:0', '-map', '0:a:0?',
+                    '-c:v', 'libx264', '-preset', self.preset, '-b:v', str(rate),
+                    '-maxrate', str(rate * 2), '-bufsize', str(rate * 2),
+                    '-pass', '2', '-passlogfile', prefix, '-pix_fmt', 'yuv420p',
+                    *self.audio_args(), '-movflags', '+faststart', '-threads', str(threads), output_path,
+                ]
+                tracer.run(cmd, name='ffmpeg.second_pass', check=True)
+                size = os.path.getsize(output_path)
+                if size <= self.max_bytes or rate <= _MIN_VIDEO_BITRATE:
+                    break
+                rate = max(_MIN_VIDEO_BITRATE, int(rate * self.max_bytes / size * (1 - _SIZE_MARGIN)))
+            span.set(bitrate=rate, size=size, attempts=attempt + 1)
+        print(f"Encoded {output_path} to {size / 1024 / 1024:.1f} MB (budget {self.max_bytes / 1024 / 1024:.1f} MB)")
+        return output_path
@@ -0,0 +1,126 @@
+import math
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from src.instrumentation import tracer
+
+# Pixel count that one encoder thread handles comfortably (640x360)
+_PIXELS_PER_THREAD = 640 * 360
+_MAX_ENCODER_THREADS = 8
+
+
+def _detect_memory_mb() -> int:
+    try:
+        return int(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024))
+    except (ValueError, OSError, AttributeError):
+        return 8192
+
+
+class TaskCost:
+    """CPU threads and memory (MB) a task is expected to need"""
+    __slots__ = ('threads', 'memory_mb')
+
+    def __init__(self, threads: int, memory_mb: int):
+        self.threads = max(1, int(threads))
+        self.memory_mb = max(0, int(memory_mb))
+
+    def __repr__(self):
+        return f"TaskCost(threads={self.threads}, memory_mb={self.memory_mb})"
+
+
+class Grant:
+    """Resources handed to a running task; pass grant.threads to ffmpeg/encoders"""
+    __slots__ = ('threads', 'memory_mb')
+
+    def __init__(self, threads: int, memory_mb: int):
+        self.threads = threads
+        self.memory_mb = memory_mb
+
+    @property
+    def ffmpeg_args(self) -> str:
+        return f'-threads {self.threads}'
+
+
+class ResourceScheduler:
+    """Hands out CPU-thread and memory tokens to heavy subprocesses and model calls.
+
+    Tasks that do not fit in the remaining capacity wait in FIFO order, so concurrent jobs
+    queue instead of oversubscribing the machine. A task larger than the whole machine is
+    clamped to the full capacity and runs alone.
+    """
+    def __init__(self, cpu_threads: int = 0, memory_mb: int = 0):
+        self._condition = threading.Condition()
+        self.configure(cpu_threads, memory_mb)
+
+    def configure(self, cpu_threads: int = 0, memory_mb: int = 0):
+        """Set capacity; 0 means detect from the machine. Call before any work is scheduled."""
+        with self._condition:
+            self.cpu_threads = cpu_threads or os.cpu_count() or 1
+            self.memory_mb = memory_mb or _detect_memory_mb()
+            self.available_threads = self.cpu_threads
+            self.available_memory_mb = self.memory_mb
+            self._waiting = deque()
+            self._condition.notify_all()
+
+    def estimate_video(self, width: int, height: int, duration: float) -> TaskCost:
+        """Cost of decoding/encoding a video at the given resolution and length"""
+        threads = math.ceil(width * height / _PIXELS_PER_THREAD)
+        if duration and duration < 2:
+            # Very short clips are dominated by startup, extra threads only add contention
+            threads = min(threads, 2)
+        threads = min(threads, _MAX_ENCODER_THREADS)
+        frame_mb = width * height * 1.5 / (1024 * 1024)
+        # Lookahead plus a couple of frames in flight per thread
+        memory_mb = 150 + frame_mb * (40 + 4 * threads)
+        return TaskCost(threads, memory_mb)
+
+    def estimate_audio(self, duration: float = 0) -> TaskCost:
+        """Cost of an ffmpeg audio decode/resample/encode"""
+        return TaskCost(1, 64 + (duration or 0) * 0.5)
+
+    def estimate_separation(self, duration: float) -> TaskCost:
+        """Cost of demucs stem separation over a track of the given length"""
+        return TaskCost(min(self.cpu_threads, 8), 1500 + (duration or 0) * 12)
+
+    def estimate_download(self) -> TaskCost:
+        """Cost of a yt-dlp download (mostly network, plus ffmpeg remuxing)"""
+        return TaskCost(1, 200)
+
+    def _fits(self, cost: TaskCost) -> bool:
+        return cost.threads <= self.available_threads and cost.memory_mb <= self.available_memory_mb
+
+    @contextmanager
+    def acquire(self, cost: TaskCost, name: str = 'task'):
+        """Block until `cost` fits, then yield a Grant and release it when the block exits"""
+        # Clamp oversize tasks so they can still run once the machine is idle
+        cost = TaskCost(min(cost.threads, self.cpu_threads), min(cost.memory_mb, self.memory_mb))
+        ticket = object()
+        with self._condition:
+            self._waiting.append(ticket)
+            with tracer.span(f'scheduler.wait.{name}', category='scheduler',
+                             threads=cost.threads, memory_mb=cost.memory_mb):
+                while self._waiting[0] is not ticket or not self._fits(cost):
+                    self._condition.wait()
+            self._waiting.popleft()
+            self.available_threads -= cost.threads
+            self.available_memory_mb -= cost.memory_mb
+            # The next task in line may fit in what is left
+            self._condition.notify_all()
+        try:
+            yield Grant(cost.threads, cost.memory_mb)
+        finally:
+            with self._condition:
+                self.available_threads += cost.threads
+                self.available_memory_mb += cost.memory_mb
+                self._condition.notify_all()
+
+
+# Process-wide scheduler shared by every stage and daemon worker
+scheduler = ResourceScheduler()
+
+
+def configure_scheduler(config_manager) -> ResourceScheduler:
+    scheduler.configure(config_manager.resource_cpu_threads, config_manager.resource_memory_mb)
+    return scheduler
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from src.instrumentation import tracer
+
+# Bytes hashed from the start, middle and end of a file for its content hash
+_SAMPLE_BYTES = 1 << 20
+
+_content_hashes: Dict[Tuple[str, int, int], str] = {}
+_content_hashes_lock = threading.Lock()
+
+
+def content_hash(path: str) -> str:
+    """Hash of a media file's size plus sampled head, middle and tail bytes.
+
+    Re-downloads and copies of a clip hash the same, so cached work follows the content
+    rather than the path. Results are memoized by (path, size, mtime) for the process.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, int(stat.st_mtime_ns))
+    with _content_hashes_lock:
+        if memo_key in _content_hashes:
+            return _content_hashes[memo_key]
+
+    digest = hashlib.sha256(str(stat.st_size).encode('utf-8'))
+    with open(path, 'rb') as f:
+        for offset in sorted({0, max(0, stat.st_size // 2 - _SAMPLE_BYTES // 2), max(0, stat.st_size - _SAMPLE_BYTES)}):
+            f.seek(offset)
+            digest.update(f.read(_SAMPLE_BYTES))
+    value = digest.hexdigest()
+    with _content_hashes_lock:
+        _content_hashes[memo_key] = value
+    return value
+
+
+def segment_key(source_hash: str, start: float, frames: int, profile: Sequence, encoder_args: Sequence[str]) -> str:
+    """Cache key for one rendered slice: source content, trim range, normalization profile and encoder settings"""
+    canonical = json.dumps({
+        'source': source_hash,
+        'start': round(start, 3),
+        'frames': frames,
+        'profile': list(profile),
+        'encoder': list(encoder_args),
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class SegmentCache:
+    """Rendered segments kept on disk between runs, evicted least-recently-used above max_bytes.
+
+    Entries are files named by their key, so concurrent jobs and processes can share a cache
+    directory: writes land in a temporary name and are moved into place atomically, and a hit
+    refreshes the file's mtime, which is what eviction orders by. Segments fetched or stored
+    with hold=True are kept out of eviction until release(), so a job's evict() never
+    removes segments another job is about to join.
+    """
+    def __init__(self, directory: str, max_bytes: int, extension: str = '.mp4'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._holds: Dict[str, int] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config_manager) -> Optional['SegmentCache']:
+        settings = config_manager.snapshot.segment_cache
+        if not settings.enabled:
+            return None
+        return get_segment_cache(settings.directory, settings.max_size_mb * 1024 * 1024)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.extension)
+
+    def _hold(self, path: str):
+        self._holds[path] = self._holds.get(path, 0) + 1
+
+    def get(self, key: str, hold: bool = False) -> Optional[str]:
+        path = self.path_for(key)
+        # Under the lock, so evict() cannot remove the file between the hit and the hold
+        with self._lock:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if hold:
+                self._hold(path)
+        return path
+
+    def temp_path(self) -> str:
+        """Scratch path inside the cache directory, so put() is an atomic rename"""
+        return os.path.join(self.directory, f'.tmp-{uuid.uuid4().hex}{self.extension}')
+
+    def put(self, key: str, produced_path: str, hold: bool = False) -> str:
+        """Move a freshly rendered file into the cache.
+
+        Eviction is left to evict(), which callers run once the segments they are assembling
+        are no longer needed, so a large render never evicts its own earlier segments.
+        """
+        path = self.path_for(key)
+        with self._lock:
+            os.replace(produced_path, path)
+            if hold:
+                self._hold(path)
+        return path
+
+    def release(self, paths: Iterable[str]):
+        """Drop holds taken by get(hold=True) or put(hold=True)"""
+        with self._lock:
+            for path in paths:
+                users = self._holds.get(path, 0) - 1
+                if users > 0:
+                    self._holds[path] = users
+                else:
+                    self._holds.pop(path, None)
+
+    def get_or_render(self, key: str, render: Callable[[str], None]) -> str:
+        """Return the cached segment for key, calling render(output_path) to create it on a miss"""
+        path = self.get(key)
+        if path is not None:
+            return path
+        temp_path = self.temp_path()
+        try:
+            render(temp_path)
+            return self.put(key, temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def entries(self):
+        """(mtime, size, path) of every cached segment, oldest first"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.extension) and not entry.name.startswith('.tmp-'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used segments until the cache fits in max_bytes"""
+        with self._lock, tracer.span('segment_cache.evict', category='cache') as span:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path in self._holds:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            span.set(removed=removed, size=total)
+
+
+@lru_cache(maxsize=None)
+def get_segment_cache(directory: str, max_bytes: int) -> SegmentCache:
+    """One shared cache per directory for the whole process, so eviction respects every job's holds"""
+    return SegmentCache(directory, max_bytes)
@@ -1,17 +1,23 @@
 import os
 import hashlib
 import secrets
-import requests
 from typing import Optional
 from typing_extensions import Tuple
+from src.transport import transport
 from .config import TIKTOK_API_KEY, TIKTOK_API_SECRET, TIKTOK_REDIRECT_URI
 
+# Largest file the Content Posting API accepts as a FILE_UPLOAD
+TIKTOK_MAX_VIDEO_BYTES = 4 * 1024 * 1024 * 1024
+# Seconds allowed for the video upload itself
+UPLOAD_TIMEOUT = 600.0
+
 class TikTokAPI:
-    def __init__(self):
+    def __init__(self, max_video_bytes: int = TIKTOK_MAX_VIDEO_BYTES):
         self.auth_url = 'https://tiktok.com/v2/auth/authorize/'
         self.post_url = 'https://tiktokapis.com/v2/post/publish/video/init/'
         self.status_url = 'https://tiktokapis.com/v2/post/publish/status/fetch/'
         self.access_token: Optional[str] = None
+        self.max_video_bytes = min(max_video_bytes, TIKTOK_MAX_VIDEO_BYTES)
         
     def generate_auth_params(self) -> Tuple[str, str, str]:
         """Generate PKCE parameters for TikTok authentication"""
@@ -62,7 +68,7 @@ class TikTokAPI:
             'code_verifier': self.code_verifier
         }
         
-        response = requests.post(token_url, data=data)
+        response = transport.post(token_url, data=data, span_name='http.tiktok.token')
         if response.status_code == 200:
             self.access_token = response.json()['access_token']
             return True
@@ -73,8 +79,11 @@ class TikTokAPI:
         if not self.access_token:
             raise ValueError("Not authenticated - call handle_callback first")
 
-        # Get video file size
+        # Get video file size; an oversized file is rejected before any request is made
         video_size = os.path.getsize(video_path)
+        if video_size > self.max_video_bytes:
+            print(f"Video is {video_size} bytes, over the {self.max_video_bytes} byte upload limit")
+            return None
         
         # Initialize video upload
         headers = {
@@ -99,7 +108,7 @@ class TikTokAPI:
         }
         
         # Initialize upload
-        response = requests.post(self.post_url, headers=headers, json=init_data)
+        response = transport.post(self.post_url, headers=headers, json=init_data, span_name='http.tiktok.init_upload')
         if response.status_code != 200:
             return None
             
@@ -116,7 +125,9 @@ class TikTokAPI:
             'Content-Range': f'bytes 0-{video_size-1}/{video_size}'
         }
         
-        upload_response = requests.put(upload_url, headers=upload_headers, data=video_data)
+        # Uploads get a longer read/write window than ordinary API calls
+        upload_response = transport.put(upload_url, headers=upload_headers, content=video_data,
+                                        timeout=UPLOAD_TIMEOUT, span_name='http.tiktok.upload')
         if upload_response.status_code != 200:
             return None
             
@@ -133,15 +144,21 @@ class TikTokAPI:
         }
         
         data = {'publish_id': publish_id}
-        response = requests.post(self.status_url, headers=headers, json=data)
+        response = transport.post(self.status_url, headers=headers, json=data, span_name='http.tiktok.status')
         
         if response.status_code == 200:
             return response.json()['data']
         return {'status': 'error'}
 
-def post_to_tiktok(video_path: str, title: str = "Check out this video!") -> bool:
+def post_to_tiktok(video_path: str, title: str = "Check out this video!",
+                   max_video_bytes: int = TIKTOK_MAX_VIDEO_BYTES) -> bool:
     """Main function to handle TikTok video posting"""
-    tiktok = TikTokAPI()
+    tiktok = TikTokAPI(max_video_bytes)
+    
+    # Check the size before asking the user to authorize an upload that would fail
+    if os.path.getsize(video_path) > tiktok.max_video_bytes:
+        print(f"Video exceeds the {tiktok.max_video_bytes} byte upload limit")
+        return False
     
     # Get authorization URL - in a real app, redirect user to this URL
     auth_url = tiktok.get_auth_url()
@@ -0,0 +1,259 @@
+import bisect
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from src.instrumentation import tracer
+from src.scheduler import TaskCost, scheduler
+
+# A transcription result: [{'start': 0.0, 'end': 2.5, 'text': '...'}, ...]
+Segments = List[Dict[str, Any]]
+
+SAMPLE_RATE = 16000
+# Whisper's context window; speech is grouped into clips no longer than this
+_CHUNK_SECONDS = 30
+
+
+class TranscriptionBackend:
+    """Turns a 16 kHz mono audio file into timestamped segments"""
+    name = 'base'
+
+    def transcribe(self, audio_path: str, language: Optional[str] = 'en', prompt: Optional[str] = None) -> Segments:
+        raise NotImplementedError
+
+
+def _field(item, name, default=None):
+    # The OpenAI SDK returns objects in some versions and dicts in others
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """Hosted Whisper (whisper-1) through the OpenAI API"""
+    name = 'openai'
+
+    def __init__(self, model: str = 'whisper-1'):
+        self.model = model
+
+    def transcribe(self, audio_path: str, language: Optional[str] = 'en', prompt: Optional[str] = None) -> Segments:
+        from src.audio_processing import get_openai_client
+
+        client = get_openai_client()
+        options = {'language': language} if language else {}
+        if prompt:
+            options['prompt'] = prompt
+        with open(audio_path, "rb") as audio_file, \
+                tracer.span('http.openai.transcribe', category='http', model=self.model):
+            response = client.audio.transcriptions.create(
+                file=audio_file,
+                model=self.model,
+                response_format="verbose_json",
+                timestamp_granularities=["segment"],
+                **options
+            )
+        return [
+            {
+                'start': float(_field(segment, 'start', 0.0)),
+                'end': float(_field(segment, 'end', 0.0)),
+                'text': _field(segment, 'text', '').strip(),
+            }
+            for segment in (_field(response, 'segments') or [])
+        ]
+
+
+class _Request:
+    def __init__(self, audio, clips: List[Dict[str, int]], language: Optional[str], prompt: Optional[str]):
+        self.audio = audio  # float32 samples at SAMPLE_RATE
+        self.clips = clips  # voice segments as {'start': sample, 'end': sample}
+        self.language = language
+        self.prompt = prompt
+        self.future: Future = Future()
+
+
+def _speech_clips(audio_path: str):
+    """Decode audio_path to 16 kHz mono and find its voice segments with Silero VAD"""
+    from faster_whisper import decode_audio
+    from faster_whisper.vad import VadOptions, get_speech_timestamps, merge_segments
+
+    audio = decode_audio(audio_path, sampling_rate=SAMPLE_RATE)
+    options = VadOptions(max_speech_duration_s=_CHUNK_SECONDS, min_silence_duration_ms=160)
+    clips = merge_segments(get_speech_timestamps(audio, options), options)
+    return audio, [{'start': clip['start'], 'end': clip['end']} for clip in clips]
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """CPU Whisper via faster-whisper (CTranslate2) with int8 weights.
+
+    One model instance is shared by every caller in the process. Each caller decodes its file
+    and finds the voice segments on its own thread, then queues them to a single inference
+    thread. That thread waits up to batch_window seconds for other jobs (at most
+    max_batch_jobs), lays their audio end to end and decodes the voice segments of all of
+    them together in batches of batch_size, so concurrent jobs fill each other's batches.
+    """
+    name = 'local'
+
+    def __init__(self, model: str = 'small', compute_type: str = 'int8', threads: int = 4,
+                 batch_size: int = 8, max_batch_jobs: int = 4, batch_window: float = 0.05, engine=None,
+                 speech_clips=_speech_clips):
+        self.model_name = model
+        self.compute_type = compute_type
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_batch_jobs = max_batch_jobs
+        self.batch_window = batch_window
+        self._engine = engine
+        self._speech_clips = speech_clips
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._engine_lock = threading.Lock()
+
+    def _load_engine(self):
+        with self._engine_lock:
+            return self._load_engine_locked()
+
+    def _load_engine_locked(self):
+        if self._engine is None:
+            from faster_whisper import BatchedInferencePipeline, WhisperModel
+
+            with tracer.span('whisper.load_model', category='model', model=self.model_name):
+                model = WhisperModel(
+                    self.model_name,
+                    device='cpu',
+                    compute_type=self.compute_type,
+                    cpu_threads=self.threads,
+                )
+            self._engine = BatchedInferencePipeline(model=model)
+        return self._engine
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='whisper-batcher', daemon=True)
+                self._worker.start()
+
+    def _next_batch(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch_jobs:
+            try:
+                batch.append(self._queue.get(timeout=self.batch_window))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._serve_batch(batch)
+            except Exception as e:
+                # A failure outside one group's decode (model load, scheduling, tracing) fails the
+                # batch's remaining jobs; the thread lives on for the next batch
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _serve_batch(self, batch: List[_Request]):
+        engine = self._load_engine()
+        # Jobs share a decoder prompt, so only jobs with the same language and prompt batch together
+        groups: Dict[tuple, List[_Request]] = {}
+        for request in batch:
+            if request.future.set_running_or_notify_cancel():
+                groups.setdefault((request.language, request.prompt), []).append(request)
+        # CTranslate2 was created with self.threads workers, so reserve exactly that many
+        with scheduler.acquire(TaskCost(self.threads, 1500), 'whisper'), \
+                tracer.span('whisper.batch', category='model', jobs=len(batch), groups=len(groups)):
+            for requests in groups.values():
+                try:
+                    results = self._transcribe_together(engine, requests)
+                except Exception as e:
+                    for request in requests:
+                        request.future.set_exception(e)
+                    continue
+                for request, segments in zip(requests, results):
+                    request.future.set_result(segments)
+
+    def _transcribe_together(self, engine, requests: List[_Request]) -> List[Segments]:
+        """Decode the voice segments of several files in shared batches and split the results per file"""
+        import numpy as np
+
+        # One second of silence between files keeps rounded timestamps on the right side of each boundary
+        gap = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        pieces, clips, starts, position = [], [], [], 0
+        for request in requests:
+            starts.append(position)
+            clips += [{'start': clip['start'] + position, 'end': clip['end'] + position} for clip in request.clips]
+            pieces += [request.audio, gap]
+            position += len(request.audio) + len(gap)
+        results: List[Segments] = [[] for _ in requests]
+        if not clips:
+            return results
+
+        segments, _ = engine.transcribe(
+            np.concatenate(pieces),
+            language=requests[0].language,
+            initial_prompt=requests[0].prompt,
+            clip_timestamps=clips,
+            vad_filter=False,
+            batch_size=self.batch_size,
+        )
+        # faster-whisper yields segments lazily; materialize them on the inference thread
+        offsets = [start / SAMPLE_RATE for start in starts]
+        for segment in segments:
+            index = max(0, bisect.bisect_right(offsets, float(segment.start)) - 1)
+            results[index].append({
+                'start': float(segment.start) - offsets[index],
+                'end': float(segment.end) - offsets[index],
+                'text': segment.text.strip(),
+            })
+        return results
+
+    def transcribe(self, audio_path: str, language: Optional[str] = 'en', prompt: Optional[str] = None) -> Segments:
+        # Decoding and voice detection run on the caller's thread, overlapping other jobs' inference
+        audio, clips = self._speech_clips(audio_path)
+        request = _Request(audio, clips, language, prompt)
+        self._ensure_worker()
+        self._queue.put(request)
+        return request.future.result()
+
+
+BACKENDS = {
+    OpenAIWhisperBackend.name: OpenAIWhisperBackend,
+    LocalWhisperBackend.name: LocalWhisperBackend,
+}
+
+_backends: Dict[tuple, TranscriptionBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_transcription_backend(config_manager=None) -> TranscriptionBackend:
+    """Return the backend chosen in config.yaml, shared per process so models stay loaded"""
+    settings = config_manager.get_transcription_config() if config_manager else {}
+    name = settings.get('backend', 'openai')
+    if name not in BACKENDS:
+        raise ValueError(f"Invalid transcription backend: {name}")
+
+    if name == 'local':
+        options = {
+            'model': settings.get('model', 'small'),
+            'compute_type': settings.get('compute_type', 'int8'),
+            'threads': settings.get('threads', 4),
+            'batch_size': settings.get('batch_size', 8),
+            'max_batch_jobs': settings.get('max_batch_jobs', 4),
+            'batch_window': settings.get('batch_window', 0.05),
+        }
+    else:
+        options = {'model': settings.get('openai_model', 'whisper-1')}
+
+    key = (name,) + tuple(sorted(options.items()))
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = BACKENDS[name](**options)
+        return _backends[key]
+
+
+def segments_to_text(segments: Segments) -> str:
+    """Join segment texts into the plain lyrics used by the overlay"""
+    return "\n".join(segment['text'] for segment in segments if segment['text'])
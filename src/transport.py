@@ -0,0 +1,273 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+import httpx
+
+from src.instrumentation import tracer
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Responses worth retrying: rate limiting and transient server-side failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Methods that can be sent twice without side effects
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+# Longest wait between attempts, including a server's Retry-After
+_MAX_BACKOFF = 30.0
+
+
+class Transport:
+    """Pooled HTTP clients shared by every network call in the process.
+
+    One keep-alive httpx.Client (and one AsyncClient per event loop) serves YouTube, OpenAI,
+    TikTok and thumbnail requests, negotiating HTTP/2 when h2 is installed. Every request
+    gets the same timeouts, retries with jittered exponential backoff, and a per-host limit
+    on concurrent requests. POSTs are only retried when the request never reached the
+    server or was rate limited.
+    """
+    def __init__(self, timeout: float = 30.0, connect_timeout: float = 10.0, retries: int = 3,
+                 backoff: float = 0.5, max_connections: int = 32, per_host: int = 8, http2: bool = True):
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = weakref.WeakKeyDictionary()
+        self.configure(timeout, connect_timeout, retries, backoff, max_connections, per_host, http2)
+
+    def configure(self, timeout: float = 30.0, connect_timeout: float = 10.0, retries: int = 3,
+                  backoff: float = 0.5, max_connections: int = 32, per_host: int = 8, http2: bool = True):
+        """Apply new settings; open clients are closed and recreated on next use"""
+        with self._lock:
+            self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+            self.retries = retries
+            self.backoff = backoff
+            self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            self.per_host = per_host
+            self.http2 = http2 and HTTP2_AVAILABLE
+            self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+            self._async_host_slots: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]' = weakref.WeakKeyDictionary()
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(http2=self.http2, limits=self.limits, timeout=self.timeout)
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """AsyncClient for the running event loop (async connections cannot cross loops)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout)
+                self._async_clients[loop] = client
+            return client
+
+    def _slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _async_slot(self, host: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            slots = self._async_host_slots.setdefault(loop, {})
+            if host not in slots:
+                slots[host] = asyncio.Semaphore(self.per_host)
+            return slots[host]
+
+    def _retry_delay(self, method: str, attempt: int, retries: int, response: Optional[httpx.Response],
+                     error: Optional[Exception]) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None if the outcome is final"""
+        if attempt >= retries:
+            return None
+        if error is not None:
+            # A POST is only resent when it provably never reached the server
+            if method not in IDEMPOTENT_METHODS and not isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+                return None
+        elif response.status_code not in RETRY_STATUSES:
+            return None
+        elif method not in IDEMPOTENT_METHODS and response.status_code != 429:
+            return None
+        delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return min(delay, _MAX_BACKOFF)
+
+    def request(self, method: str, url: str, span_name: str = 'http.request',
+                retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """Send a request through the shared pool, retrying transient failures"""
+        return self._with_policy(method, url, span_name, retries,
+                                 lambda client: client.request(method.upper(), url, **kwargs))
+
+    def send(self, request: httpx.Request, span_name: str = 'http.request',
+             retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """Send an already built request through the shared pool under the same policy as request()"""
+        # Buffer the body so a retry can send it again
+        request.read()
+        # Keep the caller's timeout (e.g. the SDK's long upload timeout); fill in the shared one otherwise
+        request.extensions.setdefault('timeout', self.timeout.as_dict())
+        return self._with_policy(request.method, str(request.url), span_name, retries,
+                                 lambda client: client.send(request, **kwargs))
+
+    def _with_policy(self, method: str, url: str, span_name: str, retries: Optional[int],
+                     send: Callable[[httpx.Client], httpx.Response]) -> httpx.Response:
+        method = method.upper()
+        retries = self.retries if retries is None else retries
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            response, error = None, None
+            with self._slot(host), tracer.span(span_name, category='http', host=host, attempt=attempt) as span:
+                try:
+                    response = send(self.client)
+                    span.set(status_code=response.status_code, http_version=response.http_version)
+                except httpx.TransportError as e:
+                    error = e
+                    span.set(error=type(e).__name__)
+            delay = self._retry_delay(method, attempt, retries, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    async def arequest(self, method: str, url: str, span_name: str = 'http.request',
+                       retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """Async counterpart of request(), sharing its timeouts, retry policy and host limits"""
+        method = method.upper()
+        retries = self.retries if retries is None else retries
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            response, error = None, None
+            async with self._async_slot(host):
+                with tracer.span(span_name, category='http', host=host, attempt=attempt) as span:
+                    try:
+                        response = await self.async_client.request(method, url, **kwargs)
+                        span.set(status_code=response.status_code, http_version=response.http_version)
+                    except httpx.TransportError as e:
+                        error = e
+                        span.set(error=type(e).__name__)
+            delay = self._retry_delay(method, attempt, retries, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> httpx.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def get_many(self, urls: Sequence[str], span_name: str = 'http.request') -> List[Optional[httpx.Response]]:
+        """GET several URLs concurrently (within the per-host limits); failures come back as None"""
+        def fetch(url: str) -> Optional[httpx.Response]:
+            try:
+                return self.get(url, span_name=span_name)
+            except httpx.HTTPError as e:
+                print(f"Warning: request to {url} failed: {str(e)}")
+                return None
+
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(urls), self.per_host)) as pool:
+            return list(pool.map(fetch, urls))
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+class HttplibAdapter:
+    """httplib2-style request() over the shared transport, for googleapiclient.
+
+    googleapiclient calls http.request(uri, method, body, headers) and expects an
+    (httplib2.Response, bytes) pair; routing it here gives the YouTube API the same pool,
+    HTTP/2, timeouts and retries as everything else.
+    """
+    def __init__(self, transport: 'Transport', span_name: str = 'http.googleapis'):
+        self.transport = transport
+        self.span_name = span_name
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        import httplib2
+        response = self.transport.request(method, uri, span_name=self.span_name, content=body,
+                                          headers=headers, follow_redirects=redirections > 0)
+        # httpx has already decoded the body, so its encoding and length headers no longer apply
+        info = {key.lower(): value for key, value in response.headers.items()
+                if key.lower() not in ('content-encoding', 'content-length')}
+        info['status'] = str(response.status_code)
+        return httplib2.Response(info), response.content
+
+
+class HttpxAdapter(httpx.BaseTransport):
+    """httpx transport that hands every request to the shared Transport.
+
+    SDKs that take their own httpx.Client (such as OpenAI) get one built on this adapter, so
+    their calls use the shared pool, timeouts, retries and per-host limits. The client is
+    looked up on every request, so it survives Transport.configure() replacing the pool.
+    """
+    def __init__(self, transport: 'Transport', span_name: str = 'http.request'):
+        self.transport = transport
+        self.span_name = span_name
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = self.transport.send(request, span_name=self.span_name)
+        # The shared client has already decoded the body, so its encoding and length headers no longer apply
+        headers = [(key, value) for key, value in response.headers.multi_items()
+                   if key.lower() not in ('content-encoding', 'content-length')]
+        return httpx.Response(response.status_code, headers=headers, content=response.content,
+                              extensions={'http_version': response.http_version.encode('ascii')})
+
+
+# Process-wide transport shared by every client and daemon worker
+transport = Transport()
+
+
+def configure_transport(config_manager) -> Transport:
+    settings = config_manager.snapshot.transport
+    transport.configure(
+        timeout=settings.timeout,
+        connect_timeout=settings.connect_timeout,
+        retries=settings.retries,
+        backoff=settings.backoff,
+        max_connections=settings.max_connections,
+        per_host=settings.per_host,
+        http2=settings.http2,
+    )
+    return transport
@@ -1,4 +1,5 @@
 import os
+from src.audio_cache import AudioCache
 from src.video_processing import download_audio_from_youtube
 
 def get_user_input(config_manager):
@@ -27,7 +28,9 @@ def get_user_input(config_manager):
     # Handle audio source
     if config_manager.audio_source_method == "youtube":
         if config_manager.audio_youtube_link:
-            audio_path = download_audio_from_youtube(config_manager.audio_youtube_link)
+            audio_path = download_audio_from_youtube(
+                config_manager.audio_youtube_link, AudioCache.from_config(config_manager)
+            )
         else:
             raise ValueError("YouTube link for audio not provided in configuration")
     else:  # file method
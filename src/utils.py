@@ -1,7 +1,18 @@
 import os
+import threading
+from typing import Optional
+
+class JobCancelled(Exception):
+    """Raised between stages when a job has been cancelled"""
+
+def check_cancelled(cancel_event: Optional[threading.Event]):
+    """Stop the current job if its cancel event has been set"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled("Job was cancelled")
 
 def cleanup_files(files):
     """Remove temporary files after processing"""
     for file in files:
         if os.path.exists(file):
             os.remove(file) 
+
@@ -1,13 +1,25 @@
+from functools import lru_cache
 from googleapiclient.discovery import build
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, AudioFileClip, ColorClip
-from moviepy.config import change_settings
 from src.audio_processing import get_duration
 import os
 from mvgen.mvgen import MVGen
-import tempfile
 from .config_manager import ConfigManager
 import subprocess
 import shutil
+import json
+from typing import Optional
+from src.instrumentation import tracer
+from src.scheduler import scheduler
+from src.dedupe import Deduplicator
+from src.audio_asset import detect_beats, get_audio_asset, load_audio_asset, release_audio_asset
+from src.rate_control import RateControl
+from src.workspace import current_workspace
+from src.audio_cache import AudioCache, download_bestaudio
+from src.transport import HttplibAdapter, transport
+from src.frame_engine import BeatFlash, BeatZoom, ColorGrade, DEFAULT_VIDEO_ARGS, render_video, text_overlay
+from src.cut_plan import RenderProfile, estimate_beat_length, plan_cuts, render_cut_plan
+from src.segment_cache import SegmentCache
+from src.library import iter_video_files, library_from_config
 
 class SimpleNotifier:
     def notify(self, message):
@@ -19,37 +31,74 @@ class SimpleNotifier:
             print(f"MVGen Status: {message}")
 
 def search_youtube(prompt, api_key, max_results=5):
+    return [candidate['id'] for candidate in search_youtube_candidates(prompt, api_key, max_results)]
+
+@lru_cache(maxsize=None)
+def youtube_client(api_key: str):
+    """YouTube Data API client built once per key from the bundled discovery document.
+
+    Its requests go through the shared transport instead of a private httplib2 connection.
+    """
+    with tracer.span('youtube.build'):
+        return build('youtube', 'v3', developerKey=api_key, http=HttplibAdapter(transport),
+                     static_discovery=True, cache_discovery=False)
+
+def search_youtube_candidates(prompt, api_key, max_results=5) -> list:
+    """Search YouTube and return short videos with the metadata used for dedupe"""
     print(f"Searching YouTube for: {prompt}")
-    youtube = build('youtube', 'v3', developerKey=api_key)
+    youtube = youtube_client(api_key)
     request = youtube.search().list(
         part='snippet',
         q=prompt,
         type='video',
         videoDuration='short',
         maxResults=max_results,
-        fields='items(id/videoId)'
+        fields='items(id/videoId,snippet(title,channelTitle,thumbnails/default/url))'
     )
-    response = request.execute()
+    with tracer.span('http.youtube.search', category='http'):
+        response = request.execute()
     
     # Get video IDs directly from search results
     video_ids = [item['id']['videoId'] for item in response['items']]
+    snippets = {item['id']['videoId']: item.get('snippet', {}) for item in response['items']}
     
     # Get duration information
     videos_request = youtube.videos().list(
         part='contentDetails',
         id=','.join(video_ids)
     )
-    videos_response = videos_request.execute()
+    with tracer.span('http.youtube.videos', category='http'):
+        videos_response = videos_request.execute()
     
     # Filter videos under 2 minutes
-    filtered_ids = []
+    candidates = []
     for item in videos_response['items']:
         duration = item['contentDetails']['duration']
         seconds = parse_duration(duration)
         if seconds <= 120:  # 2 minutes = 120 seconds
-            filtered_ids.append(item['id'])
+            snippet = snippets.get(item['id'], {})
+            candidates.append({
+                'id': item['id'],
+                'title': snippet.get('title', ''),
+                'channel': snippet.get('channelTitle', ''),
+                'thumbnail_url': snippet.get('thumbnails', {}).get('default', {}).get('url'),
+                'duration': seconds,
+            })
     
-    return filtered_ids
+    return candidates
+
+def fetch_thumbnail(url: str) -> bytes:
+    """Download a search-result thumbnail for dedupe"""
+    response = transport.get(url, span_name='http.youtube.thumbnail')
+    response.raise_for_status()
+    return response.content
+
+def prefetch_thumbnails(candidates: list) -> dict:
+    """Fetch every candidate's thumbnail concurrently; returns url -> image bytes"""
+    urls = list(dict.fromkeys(c['thumbnail_url'] for c in candidates if c.get('thumbnail_url')))
+    responses = transport.get_many(urls, span_name='http.youtube.thumbnail')
+    return {url: response.content for url, response in zip(urls, responses)
+            if response is not None and response.status_code == 200}
 
 def extract_video_dimensions(embed_html):
     """Extract width and height from YouTube embed HTML"""
@@ -67,38 +116,63 @@ def parse_duration(duration):
     import isodate
     return int(isodate.parse_duration(duration).total_seconds())
 
-def fit_to_vertical(clip):
-    """Fit video clip to 9:16 ratio by cropping and adding black bars"""
-    target_ratio = 9/16
-    current_ratio = clip.w / clip.h
+def vertical_crop(width: int, height: int, target_ratio: float = 9/16) -> tuple:
+    """Centered (crop_width, crop_height, x, y) box with the target ratio, in even pixels for yuv420p"""
+    if width / height > target_ratio:  # Too wide: keep the height
+        crop_width, crop_height = int(height * target_ratio), height
+    else:  # Too tall: keep the width
+        crop_width, crop_height = width, int(width / target_ratio)
+    crop_width, crop_height = max(2, crop_width - crop_width % 2), max(2, crop_height - crop_height % 2)
+    return crop_width, crop_height, (width - crop_width) // 2, (height - crop_height) // 2
+
+def probe_video(file_path: str) -> dict:
+    """Get width, height, fps and duration of a video file using ffprobe"""
+    cmd = [
+        'ffprobe', '-v', 'quiet', '-print_format', 'json',
+        '-select_streams', 'v:0', '-show_entries', 'stream=width,height,r_frame_rate:format=duration', file_path
+    ]
+    result = tracer.run(cmd, name='ffprobe.video', capture_output=True, text=True)
+    data = json.loads(result.stdout or '{}')
+    stream = (data.get('streams') or [{}])[0]
+    rate = stream.get('r_frame_rate', '0/1').split('/')
+    return {
+        'width': int(stream.get('width', 0)),
+        'height': int(stream.get('height', 0)),
+        'fps': float(rate[0]) / float(rate[1]) if len(rate) == 2 and float(rate[1]) else 0.0,
+        'duration': float(data.get('format', {}).get('duration', 0)),
+    }
+
+def normalize_clip(input_path: str, output_path: str) -> str:
+    """Fit a downloaded clip to 9:16 and re-encode it at a consistent framerate"""
+    info = probe_video(input_path)
+    if not info['width'] or not info['height']:
+        raise ValueError(f"No video stream found in {input_path}")
+    width, height, x, y = vertical_crop(info['width'], info['height'])
+    
+    # Crop, framerate and encode all happen inside ffmpeg; no frames pass through Python
+    with scheduler.acquire(scheduler.estimate_video(width, height, info['duration']), 'normalize_clip') as grant, \
+            tracer.span('ffmpeg.normalize_clip', category='subprocess', source=os.path.basename(input_path)):
+        render_video(
+            input_path, output_path, width, height, fps=30,  # Ensure consistent framerate
+            video_filter=f'crop={width}:{height}:{x}:{y}',
+            threads=grant.threads
+        )
     
-    if current_ratio > target_ratio:  # Video is too wide (e.g., 16:9)
-        # Calculate new width to maintain aspect ratio
-        new_width = int(clip.h * target_ratio)
-        # Center crop the width
-        x_center = clip.w // 2
-        x1 = x_center - (new_width // 2)
-        cropped = clip.crop(x1=x1, y1=0, width=new_width, height=clip.h)
-        return cropped
-    elif current_ratio < target_ratio:  # Video is too tall
-        # Calculate new height to maintain aspect ratio
-        new_height = int(clip.w / target_ratio)
-        # Center crop the height
-        y_center = clip.h // 2
-        y1 = y_center - (new_height // 2)
-        cropped = clip.crop(x1=0, y1=y1, width=clip.w, height=new_height)
-        return cropped
-    return clip
-
-def download_youtube_clips(video_ids):
-    """Download YouTube clips using yt-dlp and fit to 9:16 ratio"""
+    return output_path
+
+def download_youtube_clips(video_ids, deduplicator=None):
+    """Download YouTube clips using yt-dlp and fit to 9:16 ratio.
+
+    With a deduplicator, re-uploads of an already downloaded clip are dropped before the
+    expensive normalization step.
+    """
     import yt_dlp
-    from moviepy.editor import VideoFileClip, ColorClip, CompositeVideoClip
     
+    workspace = current_workspace()
     clips = []
     for vid_id in video_ids:
-        output_path = f'clip_{vid_id}.mp4'
-        final_path = f'vertical_clip_{vid_id}.mp4'
+        output_path = workspace.path(f'clip_{vid_id}.mp4')
+        final_path = workspace.path(f'vertical_clip_{vid_id}.mp4')
         
         # Download the clip with more robust options
         ydl_opts = {
@@ -114,7 +188,9 @@ def download_youtube_clips(video_ids):
         max_attempts = 3
         for attempt in range(max_attempts):
             try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl, \
+                        scheduler.acquire(scheduler.estimate_download(), 'yt-dlp'), \
+                        tracer.span('yt-dlp.download', category='download', video_id=vid_id):
                     url = f'https://youtube.com/watch?v={vid_id}'
                     print(f"Downloading {url} (Attempt {attempt + 1}/{max_attempts})")
                     ydl.download([url])
@@ -130,42 +206,19 @@ def download_youtube_clips(video_ids):
         # Process the clip if download was successful
         if os.path.exists(output_path):
             try:
-                with VideoFileClip(output_path) as clip:
-                    processed_clip = fit_to_vertical(clip)
-                    
-                    target_height = processed_clip.h
-                    target_width = int(target_height * 9/16)
-                    
-                    bg = ColorClip(size=(target_width, target_height), 
-                                 color=(0,0,0),
-                                 duration=processed_clip.duration)
-                    
-                    x_center = (target_width - processed_clip.w) // 2
-                    y_center = (target_height - processed_clip.h) // 2
-                    
-                    final_clip = CompositeVideoClip([
-                        bg,
-                        processed_clip.set_position((x_center, y_center))
-                    ])
-                    
-                    final_clip.write_videofile(
-                        final_path,
-                        codec='libx264',
-                        audio_codec='aac',
-                        preset='medium',
-                        fps=30,  # Ensure consistent framerate
-                        bitrate='8000k',  # Higher bitrate for better quality
-                        threads=4  # Parallel processing
-                    )
-                    
-                    clips.append(final_path)
-                    
-                    # Clean up original clip
-                    os.remove(output_path)
+                duplicate_of = deduplicator.duplicate_of(vid_id, output_path) if deduplicator else None
+                if duplicate_of is not None:
+                    print(f"Skipping {vid_id}: same footage as {duplicate_of}")
+                    workspace.release(output_path)
+                    continue
+                
+                clips.append(normalize_clip(output_path, final_path))
+                
+                # Clean up original clip
+                workspace.release(output_path)
             except Exception as e:
                 print(f"Error processing {vid_id}: {str(e)}")
-                if os.path.exists(output_path):
-                    os.remove(output_path)
+                workspace.release(output_path)
                 continue
     
     return clips
@@ -180,8 +233,13 @@ def generate_music_video(clips, audio_file, config_manager=None):
         
     if not os.path.exists(audio_file):
         raise FileNotFoundError(f"Audio file not found at path: {audio_file}")
+    
+    if config_manager is not None and config_manager.renderer == 'native':
+        return render_native_music_video(clips, audio_file, config_manager)
 
-    with tempfile.TemporaryDirectory() as temp_dir:
+    workspace = current_workspace()
+    temp_dir = workspace.directory('mvgen')
+    try:
         # Create directory structure expected by MVGen
         temp_dir_abs = os.path.abspath(temp_dir)
         raw_dir = os.path.join(temp_dir_abs, 'raw')
@@ -207,6 +265,12 @@ def generate_music_video(clips, audio_file, config_manager=None):
             except (IOError, OSError) as e:
                 raise ValueError(f"Error copying clip {clip}: {str(e)}")
 
+        # mvgen renders at the source resolution for the length of the song
+        first_clip = probe_video(clips[0])
+        render_cost = scheduler.estimate_video(
+            first_clip['width'] or 1080, first_clip['height'] or 1920, get_duration(audio_file)
+        )
+        
         # Initialize MVGen with proper directory structure
         notifier = SimpleNotifier()
         mvgen = MVGen(
@@ -215,18 +279,21 @@ def generate_music_video(clips, audio_file, config_manager=None):
         )
         
         # Add this line before generate
-        mvgen.load_audio(audio_file)
+        with tracer.span('mvgen.load_audio'):
+            mvgen.load_audio(audio_file)
         
         # Simplified generate call with only required parameters
-        mvgen.generate(
-            duration=2,
-            sources=sources,
-            src_directory=raw_dir
-        )
+        with scheduler.acquire(render_cost, 'mvgen.generate'), tracer.span('mvgen.generate'):
+            mvgen.generate(
+                duration=2,
+                sources=sources,
+                src_directory=raw_dir
+            )
         
         # Create and process the final video
-        mvgen.make_join_file()
-        output_path = mvgen.join()
+        with scheduler.acquire(render_cost, 'mvgen.join'), tracer.span('mvgen.join'):
+            mvgen.make_join_file()
+            output_path = mvgen.join()
         
         # Get output configuration
         output_dir = os.path.abspath(config_manager.output_directory)
@@ -237,10 +304,11 @@ def generate_music_video(clips, audio_file, config_manager=None):
         final_output = os.path.join(output_dir, output_filename)
         
         # Finalize the video
-        mvgen.finalize(
-            ready_directory=ready_dir,
-            delete_work_dir=False
-        )
+        with tracer.span('mvgen.finalize'):
+            mvgen.finalize(
+                ready_directory=ready_dir,
+                delete_work_dir=False
+            )
         
         # List files in ready directory to find the output
         ready_files = os.listdir(ready_dir)
@@ -251,34 +319,143 @@ def generate_music_video(clips, audio_file, config_manager=None):
         # Use the first (and should be only) MP4 file
         source_video = os.path.join(ready_dir, mp4_files[0])
         
-        # When setting root_output
-        root_output = os.path.join(os.getcwd(), "exports", output_filename)
-        os.makedirs(os.path.dirname(root_output), exist_ok=True, mode=0o755)
-        
-        # Then copy
-        shutil.copy2(source_video, root_output)
+        # Extra output profiles are cropped from mvgen's render in a single decode
+        if config_manager.output_profiles:
+            final_output = render_profile_variants(source_video, profile_outputs(config_manager),
+                                                   RateControl.from_config(config_manager))[0]
+        else:
+            shutil.copy2(source_video, final_output)
         
         # Verification step
-        print(f"Root output path: {os.path.abspath(root_output)}")
-        if not os.path.exists(root_output):
-            print(f"File missing at: {root_output}")
-            print(f"Current working directory: {os.getcwd()}")
-            print(f"Directory contents: {os.listdir(os.path.dirname(root_output))}")
-            raise RuntimeError(f"Copy failed - verify permissions for {os.path.dirname(root_output)}")
+        print(f"Output path: {final_output}")
+        if not os.path.exists(final_output):
+            print(f"File missing at: {final_output}")
+            print(f"Directory contents: {os.listdir(output_dir)}")
+            raise RuntimeError(f"Copy failed - verify permissions for {output_dir}")
         
         return final_output
+    finally:
+        # mvgen's work tree holds a full copy of every clip; drop it as soon as the render is out
+        workspace.release(temp_dir)
+
+def profile_outputs(config_manager: ConfigManager) -> list:
+    """(RenderProfile, output path) for every rendition; the first one is the primary video"""
+    settings = config_manager.snapshot.video_processing
+    output_dir = os.path.abspath(config_manager.output_directory)
+    if not config_manager.output_profiles:
+        profile = RenderProfile(
+            settings.render_width - settings.render_width % 2,
+            settings.render_height - settings.render_height % 2,
+            settings.render_fps
+        )
+        return [(profile, os.path.join(output_dir, config_manager.get_output_config()['music_video_filename']))]
+    return [
+        (RenderProfile(profile.width, profile.height, settings.render_fps, profile.name),
+         os.path.join(output_dir, profile.filename))
+        for profile in config_manager.output_profiles
+    ]
+
+def render_profile_variants(source_video: str, outputs: list, rate_control: Optional[RateControl] = None) -> list:
+    """Decode a finished video once and split it into a crop/scale/encode branch per profile"""
+    info = probe_video(source_video)
+    video_args = rate_control.video_args(info['duration']) if rate_control else DEFAULT_VIDEO_ARGS
+    branches = ''.join(f'[in{i}]' for i in range(len(outputs)))
+    graph = [f'[0:v]split={len(outputs)}{branches}']
+    for i, (profile, _) in enumerate(outputs):
+        width, height, x, y = vertical_crop(info['width'], info['height'], profile.width / profile.height)
+        graph.append(f'[in{i}]crop={width}:{height}:{x}:{y},scale={profile.width}:{profile.height},setsar=1[out{i}]')
+    
+    widest = max(profile.width for profile, _ in outputs)
+    cost = scheduler.estimate_video(widest, sum(profile.height for profile, _ in outputs), info['duration'])
+    with scheduler.acquire(cost, 'profile_variants') as grant:
+        cmd = ['ffmpeg', '-y', '-v', 'error', '-i', source_video, '-filter_complex', ';'.join(graph)]
+        for i, (_, output_path) in enumerate(outputs):
+            cmd += ['-map', f'[out{i}]', '-map', '0:a:0?', *video_args, '-c:a', 'copy',
+                    '-threads', str(grant.threads), output_path]
+        tracer.run(cmd, name='ffmpeg.profile_variants', check=True)
+    return [output_path for _, output_path in outputs]
+
+def render_native_music_video(clips, audio_file, config_manager):
+    """Cut the clips to the song's beat and rhythm patterns, reusing cached segments where possible.
+
+    Every configured output profile is rendered from the same decode of each shot.
+    """
+    outputs = profile_outputs(config_manager)
+    
+    song_duration, beats = song_beats(audio_file)
+    beat_length = estimate_beat_length(beats)
+    print(f"Estimated tempo: {60 / beat_length:.1f} BPM")
+    
+    library = library_from_config(config_manager)
+    sources, crops = [], {}
+    for clip in clips:
+        # Indexed local clips are not probed again
+        record = library.lookup(clip) if library else None
+        info = record.as_probe() if record else probe_video(clip)
+        if not info['width'] or not info['height']:
+            print(f"Warning: Skipping clip without a video stream: {clip}")
+            continue
+        crops[clip] = {}
+        for profile, _ in outputs:
+            width, height, x, y = vertical_crop(info['width'], info['height'], profile.width / profile.height)
+            crops[clip][profile.name] = f'crop={width}:{height}:{x}:{y}'
+        sources.append((clip, info['duration']))
+    
+    settings = config_manager.snapshot.video_processing
+    cuts = plan_cuts(
+        sources, song_duration, beat_length, config_manager.snapshot.pattern_at,
+        settings.render_fps, settings.beats_per_cut, settings.variant_seed
+    )
+    print(f"Cut plan: {len(cuts)} shots from {len(sources)} clips, {len(outputs)} output profiles")
+    
+    os.makedirs(os.path.abspath(config_manager.output_directory), exist_ok=True, mode=0o755)
+    # Only the song's AAC encode and the join lists live here; the segments are in the cache
+    workspace = current_workspace()
+    work_directory = workspace.directory(hot=True, size_hint=int(song_duration * 24000))
+    try:
+        paths = render_cut_plan(cuts, audio_file, outputs, crops, work_directory,
+                                SegmentCache.from_config(config_manager))
+    finally:
+        workspace.release(work_directory)
+    return paths[0]
+
+def select_local_clips(config_manager: ConfigManager, paths: list) -> list:
+    """Expand file_paths (files or directories) and pick clips through the library index"""
+    library = library_from_config(config_manager)
+    if library is None:
+        return list(iter_video_files(paths))
+    
+    settings = config_manager.snapshot.library
+    with tracer.span('library.select'):
+        library.scan(paths)
+        records = library.query(
+            paths,
+            min_duration=settings.min_duration or None,
+            max_aspect=settings.max_aspect or None,
+            min_motion=settings.min_motion or None,
+            order_by='motion' if settings.min_motion else 'path',
+            limit=settings.max_clips or None
+        )
+    print(f"Selected {len(records)} clips from the library")
+    return [record.path for record in records]
 
 def prepare_video_clips(config_manager: ConfigManager, prompt: str = None, video_paths: list = None, api_key: str = None) -> list:
     """Prepare video clips based on configuration"""
     method = config_manager.video_source_method
+    deduplicator = Deduplicator.from_config(config_manager)
     
     if method == "youtube_search":
         if not api_key:
             raise ValueError("YouTube API key is required when using YouTube search")
-        video_ids = search_youtube(prompt, api_key, max_results=config_manager.max_youtube_results)
+        candidates = search_youtube_candidates(prompt, api_key, max_results=config_manager.max_youtube_results)
+        if deduplicator:
+            with tracer.span('dedupe.search_results'):
+                thumbnails = prefetch_thumbnails(candidates)
+                candidates = deduplicator.filter_candidates(candidates, thumbnails.__getitem__)
+        video_ids = [candidate['id'] for candidate in candidates]
         if not video_ids:
             raise ValueError("No suitable video clips found for the given search prompt")
-        return download_youtube_clips(video_ids)
+        return download_youtube_clips(video_ids, deduplicator)
     
     elif method == "youtube_links":
         links = config_manager.youtube_links
@@ -286,7 +463,7 @@ def prepare_video_clips(config_manager: ConfigManager, prompt: str = None, video
             raise ValueError("No YouTube links provided in configuration")
         # Extract video IDs from links
         video_ids = [link.split('v=')[-1] for link in links]
-        return download_youtube_clips(video_ids)
+        return download_youtube_clips(video_ids, deduplicator)
     
     elif method == "file_paths":
         paths = config_manager.file_paths
@@ -296,7 +473,10 @@ def prepare_video_clips(config_manager: ConfigManager, prompt: str = None, video
         for path in paths:
             if not os.path.exists(path):
                 raise ValueError(f"Video file not found: {path}")
-        return paths
+        clips = select_local_clips(config_manager, paths)
+        if not clips:
+            raise ValueError("No local clips match the library filters")
+        return clips
     
     elif method == "combination":
         clips = []
@@ -305,15 +485,17 @@ def prepare_video_clips(config_manager: ConfigManager, prompt: str = None, video
         links = config_manager.youtube_links
         if links:
             video_ids = [link.split('v=')[-1] for link in links]
-            clips.extend(download_youtube_clips(video_ids))
+            clips.extend(download_youtube_clips(video_ids, deduplicator))
             
         # Process local files if any
-        paths = config_manager.file_paths
-        for path in paths:
+        paths = []
+        for path in config_manager.file_paths:
             if os.path.exists(path):
-                clips.append(path)
-            else:
+                paths.append(path)
+            elif path:
                 print(f"Warning: Skipping non-existent file: {path}")
+        if paths:
+            clips.extend(select_local_clips(config_manager, paths))
         
         if not clips:
             raise ValueError("No valid video sources found in combination configuration")
@@ -323,92 +505,122 @@ def prepare_video_clips(config_manager: ConfigManager, prompt: str = None, video
     else:
         raise ValueError(f"Invalid video source method: {method}")
 
-def add_lyrics_overlay(video_path: str, lyrics: str, config: dict) -> str:
+def song_beats(audio_file: str) -> tuple:
+    """(duration, beat times) of a song, from its shared decoded buffer"""
+    asset = get_audio_asset(audio_file)
+    owned = asset is None
+    if owned:
+        asset = load_audio_asset(audio_file)
+    try:
+        with tracer.span('detect_beats'):
+            return asset.duration, detect_beats(asset)
+    finally:
+        if owned:
+            release_audio_asset(audio_file)
+
+def build_effects(config_manager: ConfigManager, audio_file: str = None) -> list:
+    """Frame effects configured in the effects section; beat effects follow the song's onsets"""
+    settings = config_manager.snapshot.effects
+    effects = []
+    grade = ColorGrade(settings.contrast, settings.brightness, settings.gamma, settings.warmth)
+    if not grade.is_identity:
+        effects.append(grade)
+    
+    if (settings.beat_flash or settings.beat_zoom) and audio_file:
+        _, beats = song_beats(audio_file)
+        print(f"Detected {len(beats)} beats for frame effects")
+        if settings.beat_zoom:
+            effects.append(BeatZoom(beats, settings.beat_zoom))
+        if settings.beat_flash:
+            effects.append(BeatFlash(beats, settings.beat_flash))
+    return effects
+
+def _render_effects(video_path: str, output_path: str, effects: list, name: str,
+                    workers: int = 0, batch_frames: int = 8, rate_control: Optional[RateControl] = None) -> str:
+    """Run the NumPy frame engine over a finished video, copying its audio through"""
+    info = probe_video(video_path)
+    video_args = rate_control.video_args(info['duration']) if rate_control else DEFAULT_VIDEO_ARGS
+    width, height = info['width'], info['height']
+    cost = scheduler.estimate_video(width, height, info['duration'])
+    with scheduler.acquire(cost, name) as grant, tracer.span(f'ffmpeg.{name}', category='subprocess'):
+        render_video(
+            video_path, output_path, width, height, fps=round(info['fps'], 3) or 30,
+            effects=effects,
+            threads=grant.threads,
+            workers=min(workers, grant.threads),
+            batch_frames=batch_frames,
+            video_args=video_args,
+            audio_args=('-c:a', 'copy')
+        )
+    return output_path
+
+def apply_effects(video_path: str, effects: list, output_path: str, workers: int = 0, batch_frames: int = 8,
+                  rate_control: Optional[RateControl] = None) -> str:
+    """Apply frame effects (color grade, beat flashes/zooms) without a lyrics overlay"""
+    print(f"Applying {len(effects)} frame effects to: {video_path}")
+    return _render_effects(video_path, output_path, effects, 'frame_effects', workers, batch_frames, rate_control)
+
+def add_lyrics_overlay(video_path: str, lyrics: str, config: dict, effects: list = (),
+                       workers: int = 0, batch_frames: int = 8, rate_control: Optional[RateControl] = None) -> str:
+    """Burn lyrics (and any other frame effects) into the video"""
     print(f"Adding lyrics overlay to video: {video_path}")
     print(f"Lyrics content: {lyrics[:100]}...")  # Print first 100 chars
     
-    # Configure MoviePy to use ImageMagick
-    if os.name == 'nt':  # Windows
-        change_settings({"IMAGEMAGICK_BINARY": r"C:\\Program Files\\ImageMagick-7.0.10-Q16\\magick.exe"})
-    else:  # macOS/Linux
-        change_settings({"IMAGEMAGICK_BINARY": "convert"})
-    
     if not lyrics or lyrics.strip() == "":
         print("Warning: No lyrics provided for overlay")
         return video_path
     
-    video = VideoFileClip(video_path)
-    print(f"Video loaded. Duration: {video.duration}s")
+    info = probe_video(video_path)
+    print(f"Video loaded. Duration: {info['duration']}s")
     
+    # Rendered once with Pillow, then alpha-blended into every frame by the frame engine
+    overlay = text_overlay(
+        lyrics,
+        info['width'],
+        info['height'],
+        fontsize=config.get('fontsize', 24),
+        color=config.get('text_color', 'white'),
+        position=config.get('text_position', 'bottom')
+    )
+    
+    output_path = config.get('final_video_filename', "final_video.mp4")
+    print(f"Writing final video to: {output_path}")
     try:
-        # Create text clip with proper font
-        txt_clip = TextClip(
-            lyrics, 
-            fontsize=config.get('fontsize', 24),
-            color=config.get('text_color', 'white'),
-            font='Arial',
-            size=(video.w * 0.8, None),  # Wrap text to 80% of video width
-            method='caption'  # Use caption method for better text wrapping
-        )
-        print("Text clip created successfully")
-        
-        # Position the text
-        position = config.get('text_position', 'bottom')
-        if position == 'bottom':
-            txt_clip = txt_clip.set_position(('center', 0.8)).set_duration(video.duration)
-        elif position == 'top':
-            txt_clip = txt_clip.set_position(('center', 0.1)).set_duration(video.duration)
-        else:
-            txt_clip = txt_clip.set_position('center').set_duration(video.duration)
-        
-        # Combine video and text
-        final_clip = CompositeVideoClip([video, txt_clip])
-        
-        # Write output with preserved quality
-        output_path = config.get('final_video_filename', "final_video.mp4")
-        print(f"Writing final video to: {output_path}")
-        final_clip.write_videofile(
-            output_path,
-            codec='libx264',
-            audio_codec='aac',
-            bitrate='8000k',
-            preset='medium',  # Changed from 'slow' for faster processing during debug
-            remove_temp=True,
-            threads=4
-        )
-        
-        return output_path
+        return _render_effects(video_path, output_path, [*effects, overlay], 'lyrics_overlay', workers, batch_frames,
+                               rate_control)
     except Exception as e:
         print(f"Error in lyrics overlay: {str(e)}")
         raise
+
+def fit_to_size(video_path: str, rate_control: RateControl) -> str:
+    """Re-encode a finished video in place so it fits the rate control byte budget.
+
+    two_pass always runs the final two-pass encode; the other modes only fall back to it
+    when the video came out over budget.
+    """
+    size = os.path.getsize(video_path)
+    if rate_control.mode != 'two_pass' and size <= rate_control.max_bytes:
+        return video_path
+    print(f"Fitting {video_path} ({size / 1024 / 1024:.1f} MB) into {rate_control.max_bytes / 1024 / 1024:.1f} MB")
+    info = probe_video(video_path)
+    stem, extension = os.path.splitext(video_path)
+    temporary = f'{stem}.sized{extension}'
+    cost = scheduler.estimate_video(info['width'], info['height'], info['duration'])
+    try:
+        with scheduler.acquire(cost, 'fit_to_size') as grant:
+            rate_control.encode_to_size(video_path, temporary, info['duration'], grant.threads)
+        os.replace(temporary, video_path)
     finally:
-        # Clean up
-        video.close()
-        if 'txt_clip' in locals():
-            txt_clip.close()
-        if 'final_clip' in locals():
-            final_clip.close()
-
-def download_audio_from_youtube(youtube_link: str) -> str:
-    """Download audio from YouTube video"""
-    import yt_dlp
-    
-    # Create temporary file for audio
-    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-        output_path = temp_file.name
-    
-    # Configure yt-dlp for audio download
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'wav',
-        }],
-        'outtmpl': output_path,
-    }
-    
-    # Download audio
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([youtube_link])
-    
-    return output_path
\ No newline at end of file
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return video_path
+
+def download_audio_from_youtube(youtube_link: str, cache: Optional[AudioCache] = None) -> str:
+    """Download a song's original audio stream (no WAV conversion; stages derive what they need).
+
+    With a cache the stream is kept by video ID and later runs reuse it without a download;
+    otherwise it lives in the current workspace and is removed with it.
+    """
+    if cache is not None:
+        return cache.fetch(youtube_link)
+    return download_bestaudio(youtube_link, current_workspace().directory())
\ No newline at end of file
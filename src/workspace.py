@@ -0,0 +1,247 @@
+import atexit
+import contextvars
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from src.instrumentation import tracer
+
+_PREFIX = 'mvgen-job-'
+_OWNER_FILE = '.owner.json'
+# Workspaces without an owner file (killed while being created) are swept after this long
+_ORPHAN_GRACE_SECONDS = 3600
+
+_current: contextvars.ContextVar[Optional['Workspace']] = contextvars.ContextVar('workspace', default=None)
+_live: 'weakref.WeakSet[Workspace]' = weakref.WeakSet()
+_default: Optional['Workspace'] = None
+_default_lock = threading.Lock()
+
+
+class QuotaExceeded(RuntimeError):
+    """Raised when a job's intermediates would exceed its disk quota"""
+
+
+def _tree_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def _memory_directory(path: Optional[str]) -> Optional[str]:
+    """path if it is a writable directory (normally a tmpfs such as /dev/shm), else None"""
+    if path and os.path.isdir(path) and os.access(path, os.W_OK):
+        return path
+    return None
+
+
+class Workspace:
+    """Scratch space that owns every intermediate file of one job.
+
+    Hot, short-lived files go to a tmpfs directory while they fit in memory_bytes and spill
+    to the disk directory beyond that. Disk usage is checked against disk_quota_bytes on every
+    allocation and at stage boundaries. Both directories are removed on cleanup(), when the
+    job's context exits (including on errors) and at interpreter exit; workspaces left behind
+    by killed processes are removed by sweep_workspaces().
+    """
+    def __init__(self, directory: Optional[str] = None, memory_directory: Optional[str] = '/dev/shm',
+                 memory_bytes: int = 0, disk_quota_bytes: int = 0, job_id: Optional[str] = None):
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.memory_bytes = memory_bytes
+        self.disk_quota_bytes = disk_quota_bytes
+        self.disk_root = self._create(directory or tempfile.gettempdir())
+        memory_directory = _memory_directory(memory_directory) if memory_bytes > 0 else None
+        self.memory_root = self._create(memory_directory) if memory_directory else None
+        # Allocated path -> bytes its caller expects to write, counted until the file is bigger
+        self._allocations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.closed = False
+        _live.add(self)
+
+    @classmethod
+    def from_config(cls, config_manager, job_id: Optional[str] = None) -> 'Workspace':
+        settings = config_manager.snapshot.workspace
+        return cls(
+            directory=settings.directory or None,
+            memory_directory=settings.memory_directory,
+            memory_bytes=settings.memory_mb * 1024 * 1024,
+            disk_quota_bytes=settings.disk_quota_mb * 1024 * 1024,
+            job_id=job_id,
+        )
+
+    def _create(self, parent: str) -> str:
+        path = os.path.join(os.path.abspath(parent), f'{_PREFIX}{self.job_id}')
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, _OWNER_FILE), 'w') as f:
+            json.dump({'host': socket.gethostname(), 'pid': os.getpid(), 'created': time.time()}, f)
+        return path
+
+    def _usage(self, root: Optional[str]) -> int:
+        if root is None:
+            return 0
+        allocated = 0
+        for path, hint in self._allocations.items():
+            if path.startswith(root + os.sep):
+                allocated += max(hint, _tree_size(path)) if os.path.exists(path) else hint
+        return max(allocated, _tree_size(root))
+
+    def usage(self) -> Dict[str, int]:
+        """Bytes held (or reserved) in memory and on disk"""
+        with self._lock:
+            return {'memory': self._usage(self.memory_root), 'disk': self._usage(self.disk_root)}
+
+    def check_quota(self, extra_bytes: int = 0):
+        """Raise QuotaExceeded if disk usage plus extra_bytes is over the job's quota"""
+        if not self.disk_quota_bytes:
+            return
+        used = self.usage()['disk']
+        if used + extra_bytes > self.disk_quota_bytes:
+            raise QuotaExceeded(
+                f"Job {self.job_id} needs {(used + extra_bytes) / 1024 / 1024:.1f} MB of scratch space, "
+                f"over its {self.disk_quota_bytes / 1024 / 1024:.1f} MB quota"
+            )
+
+    def path(self, name: Optional[str] = None, suffix: str = '', hot: bool = False, size_hint: int = 0) -> str:
+        """Allocate a file path; hot files are placed in memory while they fit the budget.
+
+        name defaults to a unique name ending in suffix. size_hint is the number of bytes the
+        caller expects to write; it is counted against the budgets until the file is written.
+        """
+        if self.closed:
+            raise RuntimeError(f"Workspace {self.job_id} has been cleaned up")
+        name = name or f'{uuid.uuid4().hex[:12]}{suffix}'
+        with self._lock:
+            root = self.disk_root
+            if hot and self.memory_root and self._usage(self.memory_root) + size_hint <= self.memory_bytes:
+                root = self.memory_root
+        if root == self.disk_root:
+            self.check_quota(size_hint)
+        path = os.path.join(root, name)
+        with self._lock:
+            self._allocations[path] = size_hint
+        return path
+
+    def directory(self, name: Optional[str] = None, hot: bool = False, size_hint: int = 0) -> str:
+        """Allocate and create a directory (see path())"""
+        path = self.path(name, hot=hot, size_hint=size_hint)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def release(self, path: str):
+        """Delete an intermediate as soon as it is no longer needed; paths outside the workspace are left alone"""
+        if not self.owns(path):
+            return
+        with self._lock:
+            self._allocations.pop(path, None)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def owns(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        return any(root and path.startswith(root + os.sep) for root in (self.disk_root, self.memory_root))
+
+    def cleanup(self):
+        if self.closed:
+            return
+        self.closed = True
+        with tracer.span('workspace.cleanup', category='io', job_id=self.job_id):
+            for root in (self.memory_root, self.disk_root):
+                if root:
+                    shutil.rmtree(root, ignore_errors=True)
+
+    def __enter__(self) -> 'Workspace':
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+def current_workspace() -> Workspace:
+    """The active job's workspace, or a process-wide one removed at exit outside of a job"""
+    workspace = _current.get()
+    if workspace is not None and not workspace.closed:
+        return workspace
+    global _default
+    with _default_lock:
+        if _default is None or _default.closed:
+            _default = Workspace()
+        return _default
+
+
+@contextmanager
+def job_workspace(config_manager, job_id: Optional[str] = None) -> Iterator[Workspace]:
+    """Create a workspace for one job, make it current for this thread and remove it afterwards.
+
+    Nested inside another job_workspace() on the same thread, the enclosing job's workspace is
+    reused, so work done before the pipeline starts (e.g. downloads) belongs to the same job.
+    """
+    enclosing = _current.get()
+    if enclosing is not None and not enclosing.closed and job_id in (None, enclosing.job_id):
+        yield enclosing
+        return
+    settings = config_manager.snapshot.workspace
+    sweep_workspaces(settings.directory or tempfile.gettempdir(), settings.memory_directory)
+    workspace = Workspace.from_config(config_manager, job_id)
+    token = _current.set(workspace)
+    try:
+        yield workspace
+    finally:
+        _current.reset(token)
+        workspace.cleanup()
+
+
+def _owner_is_gone(path: str) -> bool:
+    try:
+        with open(os.path.join(path, _OWNER_FILE)) as f:
+            owner = json.load(f)
+    except (OSError, ValueError):
+        return time.time() - os.path.getmtime(path) > _ORPHAN_GRACE_SECONDS
+    if owner.get('host') != socket.gethostname():
+        return False  # A shared directory; only that host can tell whether the job is alive
+    try:
+        os.kill(int(owner['pid']), 0)
+    except ProcessLookupError:
+        return True
+    except (PermissionError, KeyError, ValueError):
+        return False
+    return False
+
+
+def sweep_workspaces(*directories: Optional[str]) -> int:
+    """Remove workspaces whose process no longer exists; returns how many were removed"""
+    removed = 0
+    for directory in directories:
+        if not directory or not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            try:
+                if entry.name.startswith(_PREFIX) and entry.is_dir() and _owner_is_gone(entry.path):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    if removed:
+        print(f"Removed {removed} orphaned workspaces")
+    return removed
+
+
+@atexit.register
+def _cleanup_at_exit():
+    for workspace in list(_live):
+        workspace.cleanup()
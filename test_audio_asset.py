@@ -0,0 +1,83 @@
+import shutil
+import subprocess
+
+import pytest
+
+np = pytest.importorskip('numpy')
+if shutil.which('ffmpeg') is None:
+    pytest.skip('ffmpeg is required', allow_module_level=True)
+
+from src.audio_asset import get_audio_asset, load_audio_asset, release_audio_asset
+
+
+@pytest.fixture
+def song(tmp_path):
+    path = str(tmp_path / 'song.wav')
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=3',
+                    '-ac', '2', '-ar', '44100', path], check=True)
+    return path
+
+
+def test_decode_once_and_share_views(song, tmp_path):
+    asset = load_audio_asset(song, str(tmp_path / 'decoded'))
+    try:
+        assert get_audio_asset(song) is asset
+        assert asset.duration == pytest.approx(3.0, abs=0.05)
+        assert asset.samples.dtype == np.float32
+        view = asset.view(1.0, 2.0)
+        assert view.shape == (44100, 2)
+        assert np.shares_memory(view, asset.samples)
+        assert sum(len(block) for _, block in asset.iter_blocks(0.5)) == asset.frames
+    finally:
+        release_audio_asset(song)
+    assert get_audio_asset(song) is None
+
+
+def test_export_pipes_buffer_to_ffmpeg(song, tmp_path):
+    asset = load_audio_asset(song, str(tmp_path / 'decoded'))
+    try:
+        chunk = asset.export(str(tmp_path / 'chunk.wav'), 0.5, 1.5, sample_rate=16000, channels=1)
+        probe = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                                '-of', 'csv=p=0', chunk], capture_output=True, text=True, check=True)
+        assert float(probe.stdout) == pytest.approx(1.0, abs=0.05)
+    finally:
+        release_audio_asset(song)
+
+
+def test_decode_runs_outside_the_registry_lock(song, tmp_path, monkeypatch):
+    import threading
+    from src import audio_asset
+
+    other = str(tmp_path / 'other.wav')
+    shutil.copy(song, other)
+    decode = audio_asset.decode_audio
+    calls = []
+    started, resume = threading.Event(), threading.Event()
+
+    def slow_decode(source_path, directory):
+        calls.append(source_path)
+        if source_path == song:
+            started.set()
+            resume.wait(5)
+        return decode(source_path, directory)
+
+    monkeypatch.setattr(audio_asset, 'decode_audio', slow_decode)
+    loaded = []
+    threads = [threading.Thread(target=lambda: loaded.append(load_audio_asset(song, str(tmp_path / 'decoded'))))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    try:
+        assert started.wait(5)
+        # A different song decodes while the first is still in progress
+        load_audio_asset(other, str(tmp_path / 'decoded'))
+        release_audio_asset(other)
+        resume.set()
+        for thread in threads:
+            thread.join(5)
+        assert calls.count(song) == 1
+        assert len(loaded) == 2 and loaded[0] is loaded[1]
+    finally:
+        resume.set()
+        for _ in loaded:
+            release_audio_asset(song)
@@ -0,0 +1,101 @@
+import json
+import os
+import time
+
+import pytest
+
+from src import audio_cache
+from src.audio_cache import AudioCache, youtube_video_id
+
+
+@pytest.mark.parametrize('link', [
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42',
+    'https://youtu.be/dQw4w9WgXcQ?si=abc',
+    'youtube.com/shorts/dQw4w9WgXcQ',
+    'dQw4w9WgXcQ',
+])
+def test_youtube_video_id(link):
+    assert youtube_video_id(link) == 'dQw4w9WgXcQ'
+
+
+def test_video_id_missing():
+    assert youtube_video_id('https://www.youtube.com/results?search_query=song') is None
+
+
+def test_fetch_downloads_once_and_derived_formats_are_cached(tmp_path, monkeypatch):
+    downloads = []
+
+    def fake_download(link, directory):
+        downloads.append(link)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'source.webm')
+        with open(path, 'wb') as f:
+            f.write(b'opus')
+        return path
+
+    monkeypatch.setattr(audio_cache, 'download_bestaudio', fake_download)
+    cache = AudioCache(str(tmp_path / 'audio'), 1 << 20)
+
+    first = cache.fetch('https://youtu.be/dQw4w9WgXcQ')
+    second = cache.fetch('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+
+    assert first == second == os.path.join(cache.entry('dQw4w9WgXcQ'), 'source.webm')
+    assert downloads == ['https://youtu.be/dQw4w9WgXcQ']
+    assert cache.owns(first) and not cache.owns(str(tmp_path / 'song.mp3'))
+    with open(os.path.join(cache.entry('dQw4w9WgXcQ'), 'source.json')) as f:
+        assert json.load(f)['filename'] == 'source.webm'
+
+    produced = []
+
+    def produce(output_path):
+        produced.append(output_path)
+        with open(output_path, 'wb') as f:
+            f.write(b'pcm')
+
+    vocals = cache.derived(first, 'vocals-transcription.wav', produce)
+    assert cache.derived(first, 'vocals-transcription.wav', produce) == vocals
+    assert len(produced) == 1
+    assert sorted(os.listdir(cache.entry('dQw4w9WgXcQ'))) == ['source.json', 'source.webm', 'vocals-transcription.wav']
+
+
+def _add_entry(cache, video_id, size, last_used):
+    entry = cache.entry(video_id)
+    os.makedirs(entry)
+    with open(os.path.join(entry, 'source.webm'), 'wb') as f:
+        f.write(b'x' * size)
+    with open(os.path.join(entry, 'source.json'), 'w') as f:
+        json.dump({'filename': 'source.webm'}, f)
+    os.utime(os.path.join(entry, 'source.json'), (last_used, last_used))
+    return os.path.join(entry, 'source.webm')
+
+
+def test_evict_removes_least_recently_used_entries_but_not_held_ones(tmp_path):
+    cache = AudioCache(str(tmp_path), 300)
+    now = time.time()
+    oldest = _add_entry(cache, 'aaaaaaaaaaa', 100, now - 300)
+    _add_entry(cache, 'bbbbbbbbbbb', 100, now - 200)
+    _add_entry(cache, 'ccccccccccc', 100, now - 100)
+
+    with cache.hold(oldest):
+        cache.evict()
+
+    assert sorted(os.listdir(tmp_path)) == ['aaaaaaaaaaa', 'ccccccccccc']
+    assert cache.source('aaaaaaaaaaa') == oldest
+
+
+def test_stale_staging_files_are_swept_on_startup(tmp_path):
+    cache = AudioCache(str(tmp_path), 1 << 20)
+    _add_entry(cache, 'aaaaaaaaaaa', 10, time.time())
+    stale_download = tmp_path / '.tmp-killed'
+    stale_download.mkdir()
+    stale_derive = tmp_path / 'aaaaaaaaaaa' / '.tmp-killed.wav'
+    stale_derive.write_bytes(b'pcm')
+    fresh = tmp_path / '.tmp-running'
+    fresh.mkdir()
+    for path in (stale_download, stale_derive):
+        os.utime(path, (time.time() - 7200, time.time() - 7200))
+
+    AudioCache(str(tmp_path), 1 << 20)
+
+    assert not stale_download.exists() and not stale_derive.exists()
+    assert fresh.exists() and cache.source('aaaaaaaaaaa')
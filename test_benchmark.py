@@ -0,0 +1,76 @@
+import json
+import urllib.request
+
+from src.benchmark import BenchmarkRunner, StubServer, compare_to_baseline, load_baseline, save_results
+
+
+def test_regressions_respect_threshold_and_noise_floor():
+    baseline = {
+        'split_audio.song_15s': {'wall_time': 1.0},
+        'compress_audio.song_15s': {'wall_time': 0.02},
+        'upload': {'wall_time': 0.5},
+    }
+    results = {
+        'split_audio.song_15s': {'wall_time': 1.5},      # +50%: regression
+        'compress_audio.song_15s': {'wall_time': 0.04},  # +100% but only 20ms: noise
+        'upload': {'wall_time': 0.55},                   # +10%: within threshold
+        'generate_music_video': {'skipped': 'mvgen not installed'},
+    }
+
+    regressions = compare_to_baseline(results, baseline, threshold=0.25)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith('split_audio.song_15s')
+
+
+def test_baselined_stages_without_a_measurement_fail():
+    baseline = {
+        'split_audio.song_15s': {'wall_time': 1.0},
+        'compress_audio.song_15s': {'wall_time': 0.5},
+        'upload': {'wall_time': 0.5},
+    }
+    results = {
+        'split_audio.song_15s': {'failed': 'CalledProcessError: ffmpeg exited 1'},
+        'upload': {'wall_time': 0.5},
+    }
+
+    regressions = compare_to_baseline(results, baseline)
+    assert [message.split(':')[0] for message in regressions] == ['compress_audio.song_15s', 'split_audio.song_15s']
+    assert 'ffmpeg exited 1' in regressions[1]
+    # Stages left out of a filtered run are not expected
+    assert compare_to_baseline({'upload': {'wall_time': 0.5}}, baseline, stages=['upload']) == []
+
+
+def test_errors_fail_and_missing_tools_skip(tmp_path):
+    runner = BenchmarkRunner(str(tmp_path), repeat=1)
+    events = []
+
+    def broken():
+        raise ValueError('bad clip')
+
+    runner.measure('broken', broken, requires=(), setup=lambda: events.append('setup'),
+                   teardown=lambda: events.append('teardown'))
+    runner.measure('no_tool', lambda: None, requires=('definitely-not-installed-tool',))
+
+    assert runner.results['broken'] == {'failed': 'ValueError: bad clip'}
+    assert events == ['setup', 'teardown']
+    assert runner.results['no_tool'] == {'skipped': 'definitely-not-installed-tool not installed'}
+
+
+def test_results_round_trip_as_baseline(tmp_path):
+    path = str(tmp_path / 'benchmarks' / 'baseline.json')
+    save_results(path, {'upload': {'wall_time': 0.1}})
+
+    assert load_baseline(path) == {'upload': {'wall_time': 0.1}}
+    assert load_baseline(str(tmp_path / 'missing.json')) == {}
+
+
+def test_stub_server_serves_tiktok_upload_flow():
+    with StubServer() as stub:
+        request = urllib.request.Request(f'{stub.url}/init', data=b'{}', method='POST')
+        with urllib.request.urlopen(request) as response:
+            upload_url = json.load(response)['data']['upload_url']
+
+        request = urllib.request.Request(upload_url, data=b'x' * 1024, method='PUT')
+        with urllib.request.urlopen(request) as response:
+            assert response.status == 200
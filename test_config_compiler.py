@@ -0,0 +1,118 @@
+import dataclasses
+
+import pytest
+
+from src.config_compiler import ConfigError, compile_config
+from src.config_manager import ConfigManager
+
+
+def test_shipped_config_compiles():
+    manager = ConfigManager('config.yaml')
+
+    assert manager.video_source_method == 'youtube_search'
+    assert manager.get_video_processing_config()['final_video_filename'] == 'final_video.mp4'
+
+
+def test_snapshot_is_immutable_and_slotted():
+    snapshot = compile_config({'output': {'post_to_social': True}})
+
+    assert snapshot.output.post_to_social is True
+    assert snapshot.output.output_directory == './output'
+    assert not hasattr(snapshot.output, '__dict__')
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        snapshot.output.post_to_social = False
+    with pytest.raises(TypeError):
+        snapshot.sections['output']['post_to_social'] = False
+
+
+def test_section_values_are_immutable_all_the_way_down():
+    snapshot = compile_config({
+        'video_source': {'file_paths': ['a.mp4'], 'sources': [{'type': 'file', 'path': 'a.mp4'}]},
+        'rhythm_patterns': [{'timestamp': 0, 'pattern': '1/8'}],
+        'output_profiles': [{'name': 'square', 'width': 1080, 'height': 1080}],
+    })
+    fingerprints = dict(snapshot.fingerprints)
+
+    assert snapshot.sections['video_source']['file_paths'] == ('a.mp4',)
+    with pytest.raises(AttributeError):
+        snapshot.sections['video_source']['file_paths'].append('b.mp4')
+    with pytest.raises(TypeError):
+        snapshot.sections['video_source']['sources'][0]['path'] = 'b.mp4'
+    with pytest.raises(TypeError):
+        snapshot.sections['rhythm_patterns']['patterns'][0]['pattern'] = '1/4'
+    with pytest.raises(AttributeError):
+        snapshot.sections['output_profiles']['profiles'].clear()
+    assert dict(snapshot.fingerprints) == fingerprints
+
+
+def test_all_errors_are_reported_together():
+    raw = {
+        'video_source': {'method': 'ftp', 'max_youtube_results': 'five'},
+        'video_processing': {'fontsize': True, 'colour': 'red'},
+        'daemon': {'port': 70000},
+        'rhythm_patterns': [{'timestamp': -1, 'pattern': '1/4'}, {'timestamp': 2, 'pattern': 'fast'}],
+        'audio_source': {'method': 'youtube'},
+        'unknown_section': {},
+    }
+
+    with pytest.raises(ConfigError) as info:
+        compile_config(raw)
+
+    message = str(info.value)
+    for expected in ('video_source.method', 'video_source.max_youtube_results', 'video_processing.fontsize',
+                     'video_processing.colour', 'daemon.port', 'rhythm_patterns[0].timestamp',
+                     'rhythm_patterns[1].pattern', 'audio_source.youtube_link', 'unknown_section'):
+        assert expected in message
+    assert len(info.value.errors) == 9
+
+
+def test_rhythm_patterns_are_sorted_once_and_looked_up_by_bisect():
+    manager = ConfigManager.from_dict({'rhythm_patterns': [
+        {'timestamp': 15.7, 'pattern': '1/4'},
+        {'timestamp': 5.3, 'pattern': '1/8'},
+        {'timestamp': 30.2, 'pattern': '1/16'},
+    ]})
+
+    assert [p.timestamp for p in manager.rhythm_patterns] == [5.3, 15.7, 30.2]
+    assert manager.get_pattern_at_timestamp(0) == '1/4'
+    assert manager.get_pattern_at_timestamp(5.3) == '1/8'
+    assert manager.get_pattern_at_timestamp(20) == '1/4'
+    assert manager.get_pattern_at_timestamp(99) == '1/16'
+
+
+def test_fingerprints_are_stable_and_per_section():
+    base = {'output': {'output_directory': './a'}, 'video_processing': {'fontsize': 30}}
+    changed = {'output': {'output_directory': './b'}, 'video_processing': {'fontsize': 30}}
+    defaults_spelled_out = {'output': {'output_directory': './a', 'post_to_social': False},
+                            'video_processing': {'fontsize': 30}}
+
+    first, second = compile_config(base), compile_config(changed)
+
+    assert first.fingerprints['video_processing'] == second.fingerprints['video_processing']
+    assert first.fingerprints['output'] != second.fingerprints['output']
+    assert compile_config(defaults_spelled_out).fingerprint() == first.fingerprint()
+    assert first.fingerprint('video_processing') == second.fingerprint('video_processing')
+
+
+def test_output_profiles_default_filenames_and_validation():
+    snapshot = compile_config({
+        'output': {'music_video_filename': 'video.mp4'},
+        'output_profiles': [
+            {'name': 'tiktok', 'width': 1080, 'height': 1920},
+            {'name': 'square', 'width': 1080, 'height': 1080},
+        ],
+    })
+
+    assert [(p.name, p.filename) for p in snapshot.output_profiles] == [('tiktok', 'video.mp4'), ('square', 'video_square.mp4')]
+    assert snapshot.output_profiles[1].aspect == 1.0
+    assert compile_config({}).output_profiles == ()
+
+    with pytest.raises(ConfigError) as info:
+        compile_config({'output_profiles': [
+            {'name': 'wide', 'width': 1921, 'height': 1080},
+            {'name': 'a', 'width': 2, 'height': 2},
+            {'name': 'a', 'width': 2, 'height': 2},
+        ]})
+    message = str(info.value)
+    assert 'output_profiles[0] width and height must be even' in message
+    assert 'output_profiles[2].name must be unique' in message
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from src.cut_plan import Cut, RenderProfile, _segment_command, estimate_beat_length, plan_cuts
+
+SOURCES = [('a.mp4', 20.0), ('b.mp4', 12.0), ('c.mp4', 0.5)]
+
+
+def _pattern(timestamp):
+    return '1/8' if timestamp >= 5 else '1/4'
+
+
+def test_estimate_beat_length_folds_into_tempo_range():
+    assert estimate_beat_length([0, 0.5, 1.0, 1.5, 2.0]) == pytest.approx(0.5)
+    assert estimate_beat_length([0, 3.0, 6.0, 9.0, 12.0]) == pytest.approx(0.75)
+    assert estimate_beat_length([0, 0.2, 0.4, 0.6, 0.8]) == pytest.approx(0.4)
+    assert estimate_beat_length([0, 1]) == 0.5
+
+
+def test_plan_covers_song_on_the_frame_grid():
+    cuts = plan_cuts(SOURCES, 10.0, 0.5, _pattern, fps=30, beats_per_cut=2)
+
+    assert sum(cut.frames for cut in cuts) == 300
+    # Shots halve in length once the 1/8 pattern starts at 5 s
+    assert cuts[0].frames == 30 and cuts[-2].frames == 15
+    assert all(a.source != b.source for a, b in zip(cuts, cuts[1:]))
+    for cut in cuts:
+        duration = dict(SOURCES)[cut.source]
+        length = 1.0 if cut.frames == 30 else 0.5
+        assert cut.start == pytest.approx(round(cut.start / length) * length)
+        assert cut.start == 0 or cut.start + cut.frames / 30 <= duration
+
+
+def test_variants_reuse_the_same_slices():
+    first = plan_cuts(SOURCES, 30.0, 0.5, _pattern, fps=30, seed=1)
+    second = plan_cuts(SOURCES, 30.0, 0.5, _pattern, fps=30, seed=2)
+
+    assert first != second
+    assert plan_cuts(SOURCES, 30.0, 0.5, _pattern, fps=30, seed=1) == first
+    assert len(set(first) & set(second)) > len(first) // 4
+
+
+def test_segment_command_splits_one_decode_into_each_profile():
+    cut = Cut('clip.mp4', 1.5, 12)
+    square, wide = RenderProfile(8, 8, 10, 'square'), RenderProfile(16, 8, 10, 'wide')
+
+    cmd = _segment_command(cut, [(square, 'crop=4:4:0:0', 'a.mp4'), (wide, 'crop=8:4:0:0', 'b.mp4')], 2)
+
+    assert cmd.count('-i') == 1
+    graph = cmd[cmd.index('-filter_complex') + 1]
+    assert graph.startswith('[0:v]split=2[in0][in1];')
+    assert '[in1]crop=8:4:0:0,scale=16:8' in graph
+    assert cmd[-1] == 'b.mp4' and cmd.count('-frames:v') == 2
@@ -0,0 +1,142 @@
+import os
+import threading
+
+import pytest
+
+from src.daemon import (
+    AdmissionError, CANCELLED, DaemonClient, FAILED, JobManager, SUCCEEDED, absolutize_paths, make_server
+)
+
+
+def _serve(manager, **kwargs):
+    server = make_server(manager, port=0, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def test_queue_admission_and_cancellation():
+    release = threading.Event()
+    manager = JobManager(workers=1, max_queued=1, runner=lambda job: release.wait(5) and 'out.mp4')
+
+    running = manager.submit({}, 'prompt', 'song.wav')
+    queued = manager.submit({}, 'prompt', 'song.wav')
+    with pytest.raises(AdmissionError):
+        manager.submit({}, 'prompt', 'song.wav')
+
+    assert manager.cancel(queued.id).status == CANCELLED
+    release.set()
+    running.future.result(timeout=5)
+    assert running.status == SUCCEEDED
+    assert running.artifact == 'out.mp4'
+    manager.shutdown()
+
+
+def test_job_api_over_tcp(tmp_path):
+    artifact = tmp_path / 'video.mp4'
+    artifact.write_bytes(b'video-bytes')
+
+    def runner(job):
+        if job.input_data == 'bad':
+            raise ValueError('no clips')
+        return str(artifact)
+
+    manager = JobManager(workers=2, max_queued=4, runner=runner)
+    server = _serve(manager)
+    client = DaemonClient(port=server.server_address[1])
+    try:
+        assert client.is_alive()
+        job = client.wait(client.submit({'output': {}}, 'good', 'song.wav')['id'], poll_interval=0.01)
+        assert job['status'] == SUCCEEDED
+        destination = client.fetch_artifact(job['id'], str(tmp_path / 'out' / 'copy.mp4'))
+        assert open(destination, 'rb').read() == b'video-bytes'
+
+        failed = client.wait(client.submit({}, 'bad', 'song.wav')['id'], poll_interval=0.01)
+        assert failed['status'] == FAILED
+        assert failed['error'] == 'no clips'
+        with pytest.raises(RuntimeError):
+            client.fetch_artifact(failed['id'], str(tmp_path / 'missing.mp4'))
+    finally:
+        server.shutdown()
+        server.server_close()
+        manager.shutdown()
+
+
+def test_every_rendition_is_fetched(tmp_path):
+    renditions = []
+    for name, content in (('video.mp4', b'landscape'), ('video_vertical.mp4', b'vertical')):
+        path = tmp_path / 'daemon' / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(content)
+        renditions.append(str(path))
+
+    manager = JobManager(workers=1, max_queued=1, runner=lambda job: renditions)
+    server = _serve(manager)
+    client = DaemonClient(port=server.server_address[1])
+    try:
+        job = client.wait(client.submit({}, 'good', 'song.wav')['id'], poll_interval=0.01)
+        assert job['artifacts'] == ['video.mp4', 'video_vertical.mp4']
+        paths = client.fetch_artifacts(job, str(tmp_path / 'out'))
+        assert [open(path, 'rb').read() for path in paths] == [b'landscape', b'vertical']
+        assert os.path.basename(paths[1]) == 'video_vertical.mp4'
+    finally:
+        server.shutdown()
+        server.server_close()
+        manager.shutdown()
+
+
+def test_job_api_over_unix_socket(tmp_path):
+    socket_path = str(tmp_path / 'daemon.sock')
+    manager = JobManager(workers=1, max_queued=1, runner=lambda job: 'out.mp4')
+    server = _serve(manager, socket_path=socket_path)
+    try:
+        client = DaemonClient(socket_path=socket_path)
+        assert client.is_alive()
+        job = client.wait(client.submit({}, None, 'song.wav')['id'], poll_interval=0.01)
+        assert job['status'] == SUCCEEDED
+    finally:
+        server.shutdown()
+        server.server_close()
+        manager.shutdown()
+    assert not DaemonClient(socket_path=os.path.join(str(tmp_path), 'nothing.sock')).is_alive()
+
+
+def test_finished_jobs_expire_and_fetched_artifacts_are_deleted(tmp_path):
+    def runner(job):
+        job.artifact_directory = str(tmp_path / job.id)
+        os.makedirs(job.artifact_directory)
+        path = os.path.join(job.artifact_directory, 'video.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'video-bytes')
+        return path
+
+    manager = JobManager(workers=1, max_queued=2, runner=runner, retention=60)
+    server = _serve(manager)
+    client = DaemonClient(port=server.server_address[1])
+    try:
+        fetched = client.wait(client.submit({}, 'good', 'song.wav')['id'], poll_interval=0.01)
+        client.fetch_artifacts(fetched, str(tmp_path / 'out'))
+        assert not os.path.exists(tmp_path / fetched['id'])
+
+        # Unfetched artifacts go when the job expires
+        expired = client.wait(client.submit({}, 'good', 'song.wav')['id'], poll_interval=0.01)
+        manager.get(expired['id']).finished_at -= 120
+        assert manager.get(expired['id']) is None
+        assert not os.path.exists(tmp_path / expired['id'])
+    finally:
+        server.shutdown()
+        server.server_close()
+        manager.shutdown()
+
+
+def test_path_settings_are_absolutized_for_the_daemon():
+    config = {
+        'video_source': {'file_paths': ['clips', ''], 'prompt': 'clips'},
+        'output': {'output_directory': './output'},
+        'workspace': {'directory': ''},
+    }
+    resolved = absolutize_paths(config)
+    assert resolved['video_source'] == {'file_paths': [os.path.abspath('clips'), ''], 'prompt': 'clips'}
+    assert resolved['output']['output_directory'] == os.path.abspath('output')
+    assert resolved['workspace']['directory'] == ''
+    assert config['output']['output_directory'] == './output'
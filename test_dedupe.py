@@ -0,0 +1,68 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src import dedupe
+from src.dedupe import Deduplicator, HashIndex, dhash, hamming, popcount64
+
+
+def test_popcount_and_hamming_are_vectorized():
+    values = np.array([0, 1, 0xFF, 0xFFFFFFFFFFFFFFFF], dtype=np.uint64)
+
+    assert popcount64(values).tolist() == [0, 1, 8, 64]
+    assert hamming(values, np.uint64(0)).tolist() == [0, 1, 8, 64]
+
+
+def test_dhash_ignores_brightness_but_not_content():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 200, size=(8, 9)).astype(np.uint8)
+    brighter = frame + 40
+    other = rng.integers(0, 255, size=(8, 9)).astype(np.uint8)
+
+    hashes = dhash(np.stack([frame, brighter, other]))
+
+    assert hashes[0] == hashes[1]
+    assert hamming(hashes[0], hashes[2]) > 10
+
+
+def test_hash_index_finds_everything_within_distance():
+    rng = np.random.default_rng(1)
+    stored = rng.integers(0, 2 ** 63, size=500, dtype=np.uint64)
+    index = HashIndex(max_distance=6)
+    for position, value in enumerate(stored):
+        index.add(int(value), position)
+
+    probe = int(stored[42]) ^ 0b101101  # flip 4 bits
+    expected = {(i, int(d)) for i, d in enumerate(hamming(stored, np.uint64(probe))) if d <= 6}
+
+    assert set(index.query(probe)) == expected
+    assert (42, 4) in expected
+
+
+def test_search_results_with_matching_metadata_are_dropped():
+    deduplicator = Deduplicator()
+    candidates = [
+        {'id': 'a', 'title': 'Paris Fashion Week 2024 Runway', 'duration': 60},
+        {'id': 'b', 'title': 'paris fashion week 2024 runway (Official HD)', 'duration': 61},
+        {'id': 'c', 'title': 'Paris Fashion Week 2024 Runway', 'duration': 95},
+        {'id': 'd', 'title': 'Milan street style', 'duration': 60},
+    ]
+
+    kept = deduplicator.filter_candidates(candidates)
+
+    assert [candidate['id'] for candidate in kept] == ['a', 'c', 'd']
+
+
+def test_downloaded_clips_with_matching_frames_are_duplicates(monkeypatch):
+    rng = np.random.default_rng(2)
+    original = rng.integers(0, 2 ** 63, size=8, dtype=np.uint64)
+    reencoded = original ^ np.uint64(0b11)  # two bits of noise per frame
+    unrelated = rng.integers(0, 2 ** 63, size=8, dtype=np.uint64)
+    frames = {'a.mp4': original, 'b.mp4': reencoded, 'c.mp4': unrelated}
+    monkeypatch.setattr(dedupe, 'video_frame_hashes', lambda path, samples: frames[path])
+
+    deduplicator = Deduplicator(frame_distance=10)
+
+    assert deduplicator.duplicate_of('a', 'a.mp4') is None
+    assert deduplicator.duplicate_of('b', 'b.mp4') == 'a'
+    assert deduplicator.duplicate_of('c', 'c.mp4') is None
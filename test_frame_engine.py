@@ -0,0 +1,80 @@
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.frame_engine import BeatFlash, BeatZoom, ColorGrade, FrameEngine, Overlay
+
+WIDTH, HEIGHT, FPS = 16, 8, 10
+
+
+def _frames(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(count, HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def _setup(effect):
+    effect.setup(WIDTH, HEIGHT, FPS)
+    return effect
+
+
+def test_color_grade_applies_per_channel_table_in_place():
+    frames = _frames(3)
+    expected = frames.copy()
+    grade = _setup(ColorGrade(contrast=1.3, gamma=0.8, warmth=0.2))
+    table = grade.table()
+    for channel in range(3):
+        expected[..., channel] = table[channel][expected[..., channel]]
+
+    grade.apply(frames, 0, FPS)
+
+    assert np.array_equal(frames, expected)
+    assert ColorGrade().is_identity
+
+
+def test_beat_effects_only_touch_frames_near_a_beat():
+    frames = _frames(10)
+    original = frames.copy()
+    _setup(BeatFlash([0.5], strength=0.5, decay=0.05)).apply(frames, 0, FPS)
+    _setup(BeatZoom([0.5], amount=0.2, decay=0.05)).apply(frames, 0, FPS)
+
+    # Frame 5 is on the beat; frames 0-4 come before it and frame 9 is long after
+    assert np.array_equal(frames[:5], original[:5])
+    assert np.array_equal(frames[9], original[9])
+    assert frames[5].astype(int).mean() > original[5].astype(int).mean()
+
+
+def test_overlay_blends_only_inside_region_and_window():
+    frames = np.zeros((4, HEIGHT, WIDTH, 3), dtype=np.uint8)
+    image = np.zeros((4, 4, 4), dtype=np.uint8)
+    image[..., :3] = 200
+    image[..., 3] = 255
+    image[0, 0, 3] = 0
+    overlay = _setup(Overlay(image, x=14, y=2, start=0.1, end=0.3))
+
+    overlay.apply(frames, 0, FPS)
+
+    assert not frames[0].any() and not frames[3].any()
+    assert (frames[1, 3:6, 15] == 200).all()
+    assert not frames[1, 2, 14].any()  # transparent pixel
+    assert frames[1].sum() == 200 * 3 * 7  # clipped to 4x2 pixels inside the frame, one transparent
+
+
+@pytest.mark.parametrize('workers', [0, 1])
+def test_engine_streams_frames_in_order(tmp_path, workers):
+    source = _frames(13, seed=4)
+    source_path, output_path = tmp_path / 'in.raw', tmp_path / 'out.raw'
+    source.tofile(source_path)
+    decoder = [sys.executable, '-c', f'import shutil, sys; shutil.copyfileobj(open({str(source_path)!r}, "rb"), sys.stdout.buffer)']
+    encoder = [sys.executable, '-c', f'import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open({str(output_path)!r}, "wb"))']
+    grade = ColorGrade(contrast=1.5)
+
+    engine = FrameEngine(WIDTH, HEIGHT, FPS, [grade], workers=workers, batch_frames=4)
+    frames = engine.process(decoder, encoder)
+
+    expected = source.copy()
+    _setup(ColorGrade(contrast=1.5)).apply(expected, 0, FPS)
+    result = np.fromfile(output_path, dtype=np.uint8).reshape(-1, HEIGHT, WIDTH, 3)
+    assert frames == 13
+    assert np.array_equal(result, expected)
@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+
+from src.instrumentation import Tracer
+
+
+def test_disabled_tracer_records_nothing(tmp_path):
+    tracer = Tracer(enabled=False, output_directory=str(tmp_path))
+    with tracer.span('stage') as span:
+        span.set(ignored=True)
+    result = tracer.run([sys.executable, '-c', 'pass'])
+
+    assert result.returncode == 0
+    assert tracer.records == []
+    assert tracer.write_reports() is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_spans_and_subprocess_exit_codes_are_exported(tmp_path):
+    tracer = Tracer(enabled=True, output_directory=str(tmp_path))
+    with tracer.span('generate_music_video'):
+        tracer.run([sys.executable, '-c', 'raise SystemExit(3)'], name='ffmpeg.encode')
+
+    summary_path, trace_path = tracer.write_reports('test')
+    with open(summary_path) as f:
+        summary = json.load(f)
+    with open(trace_path) as f:
+        trace = json.load(f)
+
+    stages = summary['stages']
+    assert stages['ffmpeg.encode']['exit_codes'] == [3]
+    assert stages['generate_music_video']['wall_time'] >= stages['ffmpeg.encode']['wall_time']
+    assert {event['name'] for event in trace['traceEvents']} == {'generate_music_video', 'ffmpeg.encode'}
+    assert all(event['ph'] == 'X' for event in trace['traceEvents'])
+
+
+def test_profile_is_written_for_top_level_stages(tmp_path):
+    tracer = Tracer(enabled=True, output_directory=str(tmp_path), profile=True)
+    with tracer.span('outer'):
+        with tracer.span('inner'):
+            sum(range(1000))
+
+    profiles = {record['name']: record.get('profile') for record in tracer.records}
+    assert profiles['inner'] is None
+    assert os.path.exists(profiles['outer'])
+
+
+def test_span_metrics_are_per_span_not_process_wide(tmp_path):
+    import threading
+    import time
+
+    tracer = Tracer(enabled=True, output_directory=str(tmp_path))
+    busy = [sys.executable, '-c', 'import time\nend = time.process_time() + 0.3\nwhile time.process_time() < end: pass\nbuf = bytearray(64 << 20)']
+
+    def spin():
+        with tracer.span('spin'):
+            end = time.thread_time() + 0.3
+            while time.thread_time() < end:
+                pass
+
+    with tracer.span('encode'):
+        worker = threading.Thread(target=spin)
+        worker.start()
+        tracer.run(busy, name='ffmpeg.encode', check=True)
+        worker.join()
+    with tracer.span('idle'):
+        time.sleep(0.05)
+
+    records = {record['name']: record for record in tracer.records}
+    assert records['ffmpeg.encode']['cpu_time'] >= 0.25
+    assert records['ffmpeg.encode']['peak_rss'] >= 64 << 20
+    # The subprocess rolls up into its parent span, but the other thread's spin does not
+    assert records['encode']['cpu_time'] >= records['ffmpeg.encode']['cpu_time']
+    assert records['encode']['cpu_time'] < records['ffmpeg.encode']['cpu_time'] + 0.2
+    assert records['spin']['cpu_time'] >= 0.25
+    assert records['idle']['cpu_time'] < 0.05
+    assert 'peak_rss' in tracer.summary()['metrics']
+
+
+def test_job_reports_are_written_per_job_and_dropped(tmp_path):
+    import threading
+
+    tracer = Tracer(enabled=True, output_directory=str(tmp_path))
+
+    def shared_worker():
+        with tracer.span('whisper.batch'):
+            pass
+
+    with tracer.span('warm_up'):
+        pass
+    with tracer.job('a'):
+        with tracer.span('render'):
+            # A shared worker thread's span is untagged and attributed to the job it overlaps
+            worker = threading.Thread(target=shared_worker)
+            worker.start()
+            worker.join()
+
+    with open(tmp_path / 'job-a-summary.json') as f:
+        summary = json.load(f)
+    assert set(summary['stages']) == {'render', 'whisper.batch'}
+    assert all(span['job_id'] == 'a' for span in summary['spans'] if span['name'] == 'render')
+    # Nothing is left for a long-running process to accumulate
+    assert tracer.records == []
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from src import library as library_module
+from src.library import ClipLibrary
+
+# (width, height, duration, motion) per file name
+CLIPS = {
+    'tall_long.mp4': (1080, 1920, 8.0, 0.12),
+    'tall_short.mp4': (1080, 1920, 2.0, 0.20),
+    'wide_busy.mp4': (1920, 1080, 9.0, 0.30),
+    'tall_calm.mov': (720, 1280, 6.0, 0.01),
+}
+
+
+@pytest.fixture
+def clips(tmp_path, monkeypatch):
+    root = tmp_path / 'broll'
+    (root / 'nested').mkdir(parents=True)
+    for name in CLIPS:
+        folder = root / 'nested' if name.endswith('.mov') else root
+        (folder / name).write_bytes(name.encode() * 100)
+    (root / 'notes.txt').write_text('not a clip')
+
+    probes = []
+
+    def fake_probe(path):
+        probes.append(os.path.basename(path))
+        width, height, duration, _ = CLIPS[os.path.basename(path)]
+        return {'width': width, 'height': height, 'fps': 30.0, 'codec': 'h264', 'duration': duration}
+
+    monkeypatch.setattr(library_module, 'probe_clip', fake_probe)
+    monkeypatch.setattr(library_module, 'motion_score', lambda path: CLIPS[os.path.basename(path)][3])
+    return root, probes
+
+
+def test_scan_is_incremental(clips, tmp_path):
+    root, probes = clips
+    library = ClipLibrary(str(tmp_path / 'library.sqlite'), workers=2)
+
+    assert library.scan([str(root)]) == {'files': 4, 'indexed': 4, 'unchanged': 0, 'removed': 0}
+    assert library.scan([str(root)])['indexed'] == 0
+    assert len(probes) == 4
+
+    changed = root / 'tall_long.mp4'
+    changed.write_bytes(b'edited' * 500)
+    os.remove(root / 'wide_busy.mp4')
+    assert library.scan([str(root)]) == {'files': 3, 'indexed': 1, 'unchanged': 2, 'removed': 1}
+    assert library.lookup(str(changed)).size == 3000
+
+
+def test_query_portrait_friendly_long_high_motion(clips, tmp_path):
+    root, _ = clips
+    library = ClipLibrary(str(tmp_path / 'library.sqlite'))
+    library.scan([str(root)])
+
+    records = library.query([str(root)], min_duration=4, max_aspect=1.0, min_motion=0.08)
+    assert [os.path.basename(r.path) for r in records] == ['tall_long.mp4']
+
+    by_motion = library.query([str(root)], max_aspect=1.0, order_by='motion')
+    assert [os.path.basename(r.path) for r in by_motion] == ['tall_short.mp4', 'tall_long.mp4', 'tall_calm.mov']
+    assert library.query([str(root / 'nested')])[0].as_probe() == {
+        'width': 720, 'height': 1280, 'fps': 30.0, 'duration': 6.0}
+    assert library.query([str(tmp_path / 'elsewhere')]) == []
@@ -0,0 +1,37 @@
+import pytest
+
+from src.rate_control import RateControl, target_bitrate
+
+
+def test_target_bitrate_fits_budget_with_audio_and_margin():
+    rate = target_bitrate(10 * 1024 * 1024, 60.0, 128_000)
+
+    assert (rate + 128_000) * 60 / 8 < 10 * 1024 * 1024
+    assert (rate + 128_000) * 60 / 8 > 0.9 * 10 * 1024 * 1024
+    assert target_bitrate(1000, 600.0, 128_000) == 64_000
+    with pytest.raises(ValueError):
+        target_bitrate(1000, 0, 128_000)
+
+
+def test_video_args_per_mode():
+    capped = RateControl(max_bytes=50 * 1024 * 1024).video_args(120.0)
+    rate = target_bitrate(50 * 1024 * 1024, 120.0, 128_000)
+
+    assert capped[capped.index('-crf') + 1] == '20'
+    assert capped[capped.index('-maxrate') + 1] == str(rate)
+    assert ('-b:v', '8000k') == RateControl(mode='bitrate').video_args(120.0)[4:6]
+    assert '-maxrate' not in RateControl(mode='two_pass').video_args(120.0)
+    # Without a duration there is nothing to size against
+    assert '-b:v' in RateControl().video_args(None)
+
+
+def test_passlog_prefix_follows_content_not_budget(tmp_path):
+    video = tmp_path / 'a.mp4'
+    video.write_bytes(b'frames' * 100)
+    copy = tmp_path / 'b.mp4'
+    copy.write_bytes(b'frames' * 100)
+    small = RateControl(max_bytes=1024, passlog_directory=str(tmp_path))
+    large = RateControl(max_bytes=1024 * 1024, passlog_directory=str(tmp_path))
+
+    assert small.passlog_prefix(str(video)) == large.passlog_prefix(str(copy))
+    assert small.passlog_prefix(str(video)) != RateControl(preset='slow', passlog_directory=str(tmp_path)).passlog_prefix(str(video))
@@ -0,0 +1,51 @@
+import threading
+import time
+
+from src.scheduler import ResourceScheduler, TaskCost
+
+
+def test_estimates_scale_with_resolution():
+    scheduler = ResourceScheduler(cpu_threads=16, memory_mb=16000)
+
+    small = scheduler.estimate_video(640, 360, 10)
+    large = scheduler.estimate_video(1080, 1920, 10)
+
+    assert small.threads == 1
+    assert large.threads == 8
+    assert large.memory_mb > small.memory_mb
+    assert scheduler.estimate_video(1080, 1920, 1).threads == 2
+
+
+def test_tasks_beyond_capacity_wait_for_tokens():
+    scheduler = ResourceScheduler(cpu_threads=4, memory_mb=1000)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def task():
+        with scheduler.acquire(TaskCost(3, 100)) as grant:
+            with lock:
+                active.append(grant.threads)
+                peak.append(sum(active))
+            time.sleep(0.02)
+            with lock:
+                active.remove(grant.threads)
+
+    threads = [threading.Thread(target=task) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert max(peak) == 3
+    assert scheduler.available_threads == 4
+    assert scheduler.available_memory_mb == 1000
+
+
+def test_oversize_tasks_are_clamped_to_capacity():
+    scheduler = ResourceScheduler(cpu_threads=2, memory_mb=500)
+
+    with scheduler.acquire(TaskCost(16, 4000)) as grant:
+        assert grant.threads == 2
+        assert grant.ffmpeg_args == '-threads 2'
+        assert scheduler.available_memory_mb == 0
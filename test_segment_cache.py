@@ -0,0 +1,84 @@
+import os
+import time
+
+from src.segment_cache import SegmentCache, content_hash, segment_key
+
+
+def _render(data: bytes):
+    def render(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return render
+
+
+def test_renders_once_then_hits(tmp_path):
+    cache = SegmentCache(str(tmp_path / 'cache'), max_bytes=1024)
+    key = segment_key('abc', 1.0, 30, ('center-crop', 1080, 1920, 30), ('-crf', '18'))
+
+    first = cache.get_or_render(key, _render(b'x' * 10))
+    second = cache.get_or_render(key, lambda path: (_ for _ in ()).throw(AssertionError('re-rendered')))
+
+    assert first == second and open(first, 'rb').read() == b'x' * 10
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert not [name for name in os.listdir(cache.directory) if name.startswith('.tmp-')]
+
+
+def test_key_covers_trim_profile_and_encoder():
+    base = segment_key('abc', 1.0, 30, ('center-crop', 1080, 1920, 30), ('-crf', '18'))
+
+    assert base == segment_key('abc', 1.0004, 30, ('center-crop', 1080, 1920, 30), ('-crf', '18'))
+    assert base != segment_key('abd', 1.0, 30, ('center-crop', 1080, 1920, 30), ('-crf', '18'))
+    assert base != segment_key('abc', 1.5, 30, ('center-crop', 1080, 1920, 30), ('-crf', '18'))
+    assert base != segment_key('abc', 1.0, 31, ('center-crop', 1080, 1920, 30), ('-crf', '18'))
+    assert base != segment_key('abc', 1.0, 30, ('center-crop', 1080, 1080, 30), ('-crf', '18'))
+    assert base != segment_key('abc', 1.0, 30, ('center-crop', 1080, 1920, 30), ('-crf', '23'))
+
+
+def test_evicts_least_recently_used_above_budget(tmp_path):
+    cache = SegmentCache(str(tmp_path / 'cache'), max_bytes=250)
+    for name in ('a', 'b', 'c'):
+        cache.get_or_render(name, _render(b'x' * 100))
+    # Stagger mtimes, then touch 'a' so 'b' becomes the oldest
+    for offset, name in enumerate(('a', 'b', 'c')):
+        os.utime(cache.path_for(name), (time.time() - 100 + offset, time.time() - 100 + offset))
+    assert cache.get('a')
+
+    cache.evict()
+
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c')
+    assert cache.size() <= 250
+
+
+def test_content_hash_follows_content_not_path(tmp_path):
+    one, two, other = tmp_path / 'one.mp4', tmp_path / 'two.mp4', tmp_path / 'other.mp4'
+    one.write_bytes(b'same clip' * 1000)
+    two.write_bytes(b'same clip' * 1000)
+    other.write_bytes(b'other clip' * 1000)
+
+    assert content_hash(str(one)) == content_hash(str(two))
+    assert content_hash(str(one)) != content_hash(str(other))
+
+
+def test_held_segments_are_not_evicted_until_released(tmp_path):
+    cache = SegmentCache(str(tmp_path / 'cache'), max_bytes=150)
+    for name in ('a', 'b'):
+        cache.get_or_render(name, _render(b'x' * 100))
+    os.utime(cache.path_for('a'), (time.time() - 100, time.time() - 100))
+    held = cache.get('a', hold=True)
+    os.utime(held, (time.time() - 100, time.time() - 100))
+
+    cache.evict()
+    assert os.path.exists(held) and not os.path.exists(cache.path_for('b'))
+
+    cache.release([held])
+    cache.get_or_render('c', _render(b'x' * 100))
+    cache.evict()
+    assert not os.path.exists(held)
+
+
+def test_config_shares_one_cache_per_directory(tmp_path):
+    from src.config_manager import ConfigManager
+
+    config = {'segment_cache': {'directory': str(tmp_path / 'cache')}}
+    assert SegmentCache.from_config(ConfigManager.from_dict(config)) is SegmentCache.from_config(ConfigManager.from_dict(config))
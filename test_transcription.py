@@ -1,18 +1,20 @@
-from src.audio_processing import transcribe_audio
-from src.config import OPENAI_API_KEY
 import os
+import pytest
 
+# Live test against the Whisper API; point TRANSCRIPTION_TEST_AUDIO at a local song to run it
+AUDIO_FILE = os.environ.get("TRANSCRIPTION_TEST_AUDIO")
+
+@pytest.mark.skipif(
+    not AUDIO_FILE or not os.environ.get("OPENAI_API_KEY"),
+    reason="needs TRANSCRIPTION_TEST_AUDIO and OPENAI_API_KEY (calls the live API)"
+)
 def test_transcription():
-    # Set OpenAI API key
-    os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+    from src.audio_processing import transcribe_audio
 
-    # Audio file path from your config
-    audio_file = "/Users/leoasatoorian/Documents/UP.wav"
+    audio_file = AUDIO_FILE
 
     # Verify file exists
-    if not os.path.exists(audio_file):
-        print(f"Error: Audio file not found at {audio_file}")
-        return
+    assert os.path.exists(audio_file), f"Audio file not found at {audio_file}"
 
     # Test transcription
     print("\n=== Starting Transcription Test ===")
@@ -38,4 +40,4 @@ def test_transcription():
         raise
 
 if __name__ == "__main__":
-    test_transcription()
\ No newline at end of file
+    test_transcription()
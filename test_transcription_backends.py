@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from src.config_manager import ConfigManager
+from src.transcription import (
+    LocalWhisperBackend, OpenAIWhisperBackend, get_transcription_backend, segments_to_text
+)
+
+
+class FakeEngine:
+    """Emits one segment per clip, labelled with the clip's first sample value"""
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+
+    def transcribe(self, audio, language=None, initial_prompt=None, clip_timestamps=None, vad_filter=True,
+                   batch_size=None):
+        self.calls.append((len(clip_timestamps), batch_size, initial_prompt))
+        self.threads.add(threading.get_ident())
+        if initial_prompt == 'broken':
+            raise RuntimeError('decode failed')
+        segments = [
+            SimpleNamespace(start=clip['start'] / 16000, end=clip['end'] / 16000,
+                            text=f" job{int(audio[clip['start']])} ")
+            for clip in clip_timestamps
+        ]
+        return iter(segments), None
+
+
+def fake_speech_clips(np):
+    def speech_clips(audio_path):
+        # Two seconds of audio filled with the job number, with speech from 0.5 s to 1.5 s
+        number = int(audio_path[3:-4])
+        return np.full(32000, number, dtype=np.float32), [{'start': 8000, 'end': 24000}]
+    return speech_clips
+
+
+def test_local_backend_batches_concurrent_jobs_into_one_engine_call():
+    np = pytest.importorskip('numpy')
+    engine = FakeEngine()
+    backend = LocalWhisperBackend(batch_size=4, max_batch_jobs=6, batch_window=0.5, engine=engine,
+                                  speech_clips=fake_speech_clips(np))
+    results = {}
+
+    def job(name):
+        results[name] = backend.transcribe(name)
+
+    threads = [threading.Thread(target=job, args=(f'job{i}.wav',)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    for i in range(6):
+        assert results[f'job{i}.wav'] == [{'start': 0.5, 'end': 1.5, 'text': f'job{i}'}]
+    assert sum(clips for clips, _, _ in engine.calls) == 6
+    assert len(engine.calls) < 6
+    assert all(batch_size == 4 for _, batch_size, _ in engine.calls)
+    assert len(engine.threads) == 1
+
+    with pytest.raises(RuntimeError):
+        backend.transcribe('job7.wav', prompt='broken')
+
+
+def test_inference_thread_survives_a_failed_batch(monkeypatch):
+    np = pytest.importorskip('numpy')
+    from src import transcription
+
+    acquire = transcription.scheduler.acquire
+    failures = [RuntimeError('scheduler unavailable')]
+
+    def flaky_acquire(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return acquire(*args, **kwargs)
+
+    monkeypatch.setattr(transcription.scheduler, 'acquire', flaky_acquire)
+    backend = LocalWhisperBackend(batch_window=0.01, engine=FakeEngine(), speech_clips=fake_speech_clips(np))
+
+    # A dead inference thread would leave callers waiting forever, so bound each call
+    caller = ThreadPoolExecutor(max_workers=1)
+    try:
+        with pytest.raises(RuntimeError, match='scheduler unavailable'):
+            caller.submit(backend.transcribe, 'job1.wav').result(timeout=5)
+        worker = backend._worker
+        result = caller.submit(backend.transcribe, 'job2.wav').result(timeout=5)
+    finally:
+        caller.shutdown(wait=False)
+    assert result == [{'start': 0.5, 'end': 1.5, 'text': 'job2'}]
+    assert backend._worker is worker and worker.is_alive()
+
+
+def test_backend_is_chosen_from_config_and_shared():
+    local = ConfigManager.from_dict({'transcription': {'backend': 'local', 'threads': 2}})
+    backend = get_transcription_backend(local)
+
+    assert isinstance(backend, LocalWhisperBackend)
+    assert backend.threads == 2
+    assert backend.max_batch_jobs == 4 and backend.batch_window == 0.05
+    assert get_transcription_backend(local) is backend
+    assert isinstance(get_transcription_backend(ConfigManager.from_dict({})), OpenAIWhisperBackend)
+    with pytest.raises(ValueError):
+        get_transcription_backend(SimpleNamespace(get_transcription_config=lambda: {'backend': 'nope'}))
+
+
+def test_segments_to_text_skips_empty_segments():
+    segments = [{'text': 'first line'}, {'text': ''}, {'text': 'second line'}]
+    assert segments_to_text(segments) == 'first line\nsecond line'
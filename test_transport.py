@@ -0,0 +1,117 @@
+import asyncio
+import json
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+pytest.importorskip('httpx')
+
+from src.benchmark import StubServer
+from src.transport import HttplibAdapter, HttpxAdapter, Transport
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    failures = {}
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        remaining = self.failures.get(self.path, 0)
+        if remaining:
+            self.failures[self.path] = remaining - 1
+            self._reply(503, {'error': 'busy'})
+        else:
+            self._reply(200, {'path': self.path, 'client_port': self.client_address[1]})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply(503, {'error': 'busy'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_connections_are_reused_and_transient_errors_retried():
+    transport = Transport(retries=2, backoff=0, http2=False)
+    _FlakyHandler.failures = {'/flaky': 2}
+    with StubServer(_FlakyHandler) as stub:
+        first = transport.get(f'{stub.url}/a').json()
+        second = transport.get(f'{stub.url}/b').json()
+        flaky = transport.get(f'{stub.url}/flaky')
+        # POSTs that reached the server are not resent
+        posted = transport.post(f'{stub.url}/submit', json={})
+    transport.close()
+
+    assert first['client_port'] == second['client_port']
+    assert flaky.status_code == 200 and _FlakyHandler.failures['/flaky'] == 0
+    assert posted.status_code == 503
+
+
+def test_async_requests_share_the_retry_policy():
+    transport = Transport(retries=1, backoff=0, http2=False)
+    _FlakyHandler.failures = {'/async': 1}
+
+    async def fetch_all(url):
+        responses = await asyncio.gather(*(transport.arequest('GET', f'{url}/async') for _ in range(3)))
+        await transport.aclose()
+        return responses
+
+    with StubServer(_FlakyHandler) as stub:
+        responses = asyncio.run(fetch_all(stub.url))
+
+    assert [r.status_code for r in responses] == [200, 200, 200]
+
+
+def test_httplib_adapter_returns_httplib2_responses():
+    httplib2 = pytest.importorskip('httplib2')
+    transport = Transport(http2=False)
+    with StubServer(_FlakyHandler) as stub:
+        response, content = HttplibAdapter(transport).request(f'{stub.url}/discovery')
+    transport.close()
+
+    assert isinstance(response, httplib2.Response) and response.status == 200
+    assert json.loads(content)['path'] == '/discovery'
+
+
+def test_httpx_adapter_applies_the_retry_policy_and_survives_reconfigure():
+    import httpx
+
+    transport = Transport(retries=2, backoff=0, http2=False)
+    client = httpx.Client(transport=HttpxAdapter(transport))
+    _FlakyHandler.failures = {'/sdk': 1}
+    with StubServer(_FlakyHandler) as stub:
+        first = client.get(f'{stub.url}/sdk')
+        transport.configure(retries=2, backoff=0, http2=False)
+        second = client.get(f'{stub.url}/after')
+    transport.close()
+
+    assert first.status_code == 200 and _FlakyHandler.failures['/sdk'] == 0
+    assert second.json()['path'] == '/after'
+
+
+def test_send_keeps_the_callers_timeout():
+    import httpx
+
+    class RecordingClient:
+        timeouts = []
+
+        def send(self, request, **kwargs):
+            self.timeouts.append(request.extensions.get('timeout'))
+            return httpx.Response(200, request=request)
+
+    transport = Transport(timeout=30.0, http2=False)
+    transport._client = RecordingClient()
+    upload = httpx.Request('POST', 'https://api.example.com/v1/audio', content=b'wav',
+                           extensions={'timeout': httpx.Timeout(600.0).as_dict()})
+    transport.send(upload)
+    transport.send(httpx.Request('GET', 'https://api.example.com/v1/models'))
+
+    assert RecordingClient.timeouts[0]['read'] == 600.0
+    assert RecordingClient.timeouts[1]['read'] == 30.0
@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.config_manager import ConfigManager
+from src.workspace import QuotaExceeded, Workspace, current_workspace, job_workspace, sweep_workspaces
+
+
+def test_hot_files_spill_to_disk_above_memory_budget(tmp_path):
+    memory = tmp_path / 'shm'
+    memory.mkdir()
+    with Workspace(str(tmp_path / 'disk'), str(memory), memory_bytes=1000) as workspace:
+        first = workspace.path('a.wav', hot=True, size_hint=600)
+        second = workspace.path('b.wav', hot=True, size_hint=600)
+        cold = workspace.path('c.mp4', size_hint=10)
+
+        assert first.startswith(workspace.memory_root)
+        assert second.startswith(workspace.disk_root)
+        assert cold.startswith(workspace.disk_root)
+
+        # Releasing the first file frees its share of the budget
+        workspace.release(first)
+        assert workspace.path('d.wav', hot=True, size_hint=600).startswith(workspace.memory_root)
+
+    assert not os.path.exists(workspace.disk_root) and not os.path.exists(workspace.memory_root)
+
+
+def test_disk_quota_is_enforced(tmp_path):
+    with Workspace(str(tmp_path), None, disk_quota_bytes=1000) as workspace:
+        with open(workspace.path('clip.mp4'), 'wb') as f:
+            f.write(b'x' * 900)
+
+        workspace.check_quota()
+        with pytest.raises(QuotaExceeded):
+            workspace.path('next.mp4', size_hint=200)
+        with pytest.raises(QuotaExceeded):
+            workspace.check_quota(extra_bytes=200)
+
+
+def test_workspace_is_removed_on_error_and_default_exists_outside_jobs(tmp_path):
+    with pytest.raises(ValueError):
+        with Workspace(str(tmp_path), None) as workspace:
+            workspace.directory('mvgen')
+            raise ValueError("render failed")
+
+    assert os.listdir(tmp_path) == []
+    assert not current_workspace().closed
+
+
+def test_nested_job_workspace_reuses_the_enclosing_one(tmp_path):
+    config_manager = ConfigManager.from_dict({'workspace': {'directory': str(tmp_path), 'memory_mb': 0}})
+    with job_workspace(config_manager) as outer:
+        download = outer.directory('download')
+        with job_workspace(config_manager) as inner:
+            assert inner is outer and current_workspace() is outer
+        # The pipeline's exit must not remove what the caller downloaded
+        assert os.path.isdir(download)
+    assert outer.closed and os.listdir(tmp_path) == []
+
+
+def test_sweeper_removes_only_workspaces_of_dead_processes(tmp_path):
+    live = Workspace(str(tmp_path), None)
+    dead = Workspace(str(tmp_path), None)
+    pid = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                         capture_output=True, text=True, check=True).stdout.strip()
+    owner_path = os.path.join(dead.disk_root, '.owner.json')
+    with open(owner_path) as f:
+        owner = json.load(f)
+    owner['pid'] = int(pid)
+    with open(owner_path, 'w') as f:
+        json.dump(owner, f)
+
+    assert sweep_workspaces(str(tmp_path)) == 1
+    assert os.path.exists(live.disk_root) and not os.path.exists(dead.disk_root)
+    live.cleanup()